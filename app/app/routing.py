@@ -1,20 +1,32 @@
-from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.routing import ChannelNameRouter, ProtocolTypeRouter, URLRouter
+from django.core.asgi import get_asgi_application
 from django.urls import path, re_path
 
-from chats.consumers import ChatConsumer
+from chats.consumers import ChatConsumer, GroupChatConsumer
 from chats.middlewares import TokenAuthMiddleware
+from users.consumers import LoginConsumer, ThumbnailConsumer
+from users.thumbnails import THUMBNAIL_CHANNEL
+
+websocket_urlpatterns = [
+    re_path(
+        r"ws/chat/group/(?P<thread_id>[0-9]+)/$",
+        GroupChatConsumer.as_asgi(),
+    ),
+    re_path(
+        r"ws/chat/(?P<username>[a-zA-Z0-9-_=]+)/$",
+        ChatConsumer.as_asgi(),
+    ),
+]
+
+http_urlpatterns = [
+    path("v1/users/token/async/", LoginConsumer.as_asgi()),
+    re_path(r"", get_asgi_application()),
+]
 
 application = ProtocolTypeRouter(
     {
-        "websocket": TokenAuthMiddleware(
-            URLRouter(
-                [
-                    re_path(
-                        r"ws/chat/(?P<username>[a-zA-Z0-9-_=]+)/$",
-                        ChatConsumer.as_asgi(),
-                    ),
-                ]
-            )
-        )
+        "http": URLRouter(http_urlpatterns),
+        "websocket": TokenAuthMiddleware(URLRouter(websocket_urlpatterns)),
+        "channel": ChannelNameRouter({THUMBNAIL_CHANNEL: ThumbnailConsumer.as_asgi()}),
     }
 )
@@ -0,0 +1,73 @@
+"""
+Daphne server negotiating permessage-deflate compression on websockets.
+
+Run it like the ``daphne`` command, for example::
+
+    python -m app.server -b 0.0.0.0 -p 8000 app.routing:application
+"""
+
+import atexit
+import logging
+import os
+import sys
+
+import django
+from autobahn.websocket.compress import (PerMessageDeflateOffer,
+                                         PerMessageDeflateOfferAccept)
+from daphne import cli, server
+from django.conf import settings
+from twisted.internet import reactor
+
+logger = logging.getLogger(__name__)
+
+
+def accept_deflate(offers):
+    """Accept the first permessage-deflate offer of a websocket handshake
+
+    The server side window and memory level come from settings, as every
+    compressing socket keeps its zlib state for the whole connection.
+    """
+    for offer in offers:
+        if not isinstance(offer, PerMessageDeflateOffer):
+            continue
+        window_bits = settings.WEBSOCKET_COMPRESSION_WINDOW_BITS
+        if offer.request_max_window_bits:
+            # The client asked for a smaller window, autobahn rejects a larger one
+            window_bits = min(window_bits, offer.request_max_window_bits)
+        # Positional, the keyword names differ between autobahn versions
+        return PerMessageDeflateOfferAccept(
+            offer,
+            False,
+            0,
+            None,
+            window_bits,
+            settings.WEBSOCKET_COMPRESSION_MEM_LEVEL,
+        )
+    return None
+
+
+class Server(server.Server):
+    """Daphne server enabling permessage-deflate with WEBSOCKET_COMPRESSION"""
+
+    def run(self):
+        if settings.WEBSOCKET_COMPRESSION:
+            # The websocket factory is built by run() right before the reactor
+            reactor.callWhenRunning(self.enable_compression)
+        super().run()
+
+    def enable_compression(self):
+        self.ws_factory.setProtocolOptions(perMessageCompressionAccept=accept_deflate)
+        logger.info("Negotiating permessage-deflate on websockets")
+
+
+class CommandLineInterface(cli.CommandLineInterface):
+    server_class = Server
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+    django.setup()
+    from core.metrics import mark_process_dead
+
+    atexit.register(mark_process_dead)
+    CommandLineInterface().run(sys.argv[1:])
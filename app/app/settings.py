@@ -66,6 +66,7 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "core.metrics.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -101,20 +102,84 @@ ASGI_APPLICATION = "app.routing.application"
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# Seconds a worker thread keeps its database connection open for reuse,
+# 0 closes it after every request and every consumer database call
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 0))
+# Size of the per process connection pool, 0 disables the pooled backend
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", 0))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "core.backends.postgresql_pool"
+        if DB_POOL_MAX_SIZE
+        else "django.db.backends.postgresql",
         "HOST": os.environ["DB_HOST"],
         "NAME": os.environ["DB_NAME"],
         "USER": os.environ["DB_USER"],
         "PASSWORD": os.environ["DB_PASS"],
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "POOL": {
+            "MAX_SIZE": DB_POOL_MAX_SIZE,
+            # Seconds to wait for a free connection before failing
+            "TIMEOUT": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            # Idle seconds after which a connection is pinged before reuse
+            "HEALTH_CHECK_INTERVAL": float(
+                os.environ.get("DB_POOL_HEALTH_CHECK_INTERVAL", 30)
+            ),
+        },
     }
 }
 
+# Comma separated hosts of read replicas of the default database. History,
+# inbox and user directory reads are spread over them
+DB_REPLICA_HOSTS = list(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")))
+for index, host in enumerate(DB_REPLICA_HOSTS):
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "TEST": {"MIRROR": "default"},
+    }
+REPLICA_DATABASES = [f"replica_{index}" for index in range(len(DB_REPLICA_HOSTS))]
+# Seconds a user's reads stay on the primary after they write, long enough
+# to cover replication lag. Pins live in REPLICA_PIN_CACHE
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+
+# Monthly message partitions kept created ahead of the current month
+MESSAGE_PARTITION_MONTHS_AHEAD = int(
+    os.environ.get("MESSAGE_PARTITION_MONTHS_AHEAD", 3)
+)
+# Age in days after which archive_messages moves messages to cold storage
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.environ.get("MESSAGE_ARCHIVE_AFTER_DAYS", 365))
+MESSAGE_ARCHIVE_BLOCK_SIZE = int(os.environ.get("MESSAGE_ARCHIVE_BLOCK_SIZE", 500))
+
+# Render profile thumbnails on `manage.py runworker thumbnails` workers
+# through the channel layer instead of a local thread pool
+THUMBNAIL_WORKER = os.environ.get("THUMBNAIL_WORKER", False)
+THUMBNAIL_THREADS = int(os.environ.get("THUMBNAIL_THREADS", 2))
+THUMBNAIL_QUALITY = int(os.environ.get("THUMBNAIL_QUALITY", 80))
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 PASSWORD_LENGTH = 8
 
+# PBKDF2 iterations of new password hashes, existing hashes are rehashed
+# with it on the next login
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get("PASSWORD_PBKDF2_ITERATIONS", 180000))
+
+PASSWORD_HASHERS = [
+    "core.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+]
+
+# Threads hashing passwords for the async token endpoint and the number of
+# logins allowed to wait for them before it answers 503
+LOGIN_HASH_THREADS = int(os.environ.get("LOGIN_HASH_THREADS", os.cpu_count()))
+LOGIN_HASH_QUEUE_SIZE = int(os.environ.get("LOGIN_HASH_QUEUE_SIZE", 256))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -142,6 +207,9 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
     "EXCEPTION_HANDLER": "core.utils.custom_exception_handler",
+    # Proxies in front of the app (1 on Heroku), client addresses are taken
+    # from the X-Forwarded-For entry the outermost of them appended
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", 0)),
 }
 
 # Internationalization
@@ -192,6 +260,101 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Persist websocket messages in batches instead of one INSERT per frame
+CHAT_WRITE_BEHIND = os.environ.get("CHAT_WRITE_BEHIND", False)
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.environ.get("CHAT_WRITE_BEHIND_BATCH_SIZE", 100))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(
+    os.environ.get("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", 0.5)
+)
+# Pending messages past which senders wait for a flush, and get its error
+CHAT_WRITE_BEHIND_MAX_PENDING = int(
+    os.environ.get("CHAT_WRITE_BEHIND_MAX_PENDING", 10000)
+)
+
+# Latest messages kept per thread in Redis for history reads, 0 disables it.
+# Pages larger than this (ChatView defaults to 50) are read from the database.
+RECENT_MESSAGES_CACHE_SIZE = int(os.environ.get("RECENT_MESSAGES_CACHE_SIZE", 0))
+RECENT_MESSAGES_CACHE_TIMEOUT = int(
+    os.environ.get("RECENT_MESSAGES_CACHE_TIMEOUT", 60 * 60 * 24)
+)
+RECENT_MESSAGES_REDIS_URL = os.environ.get(
+    "RECENT_MESSAGES_REDIS_URL",
+    f"redis://{get_env_variable('REDIS_NETWORK')}:{os.environ.get('REDIS_PORT', 6379)}/1",
+)
+# Per-thread counters numbering write-behind messages before they are stored
+CHAT_SEQ_REDIS_URL = os.environ.get("CHAT_SEQ_REDIS_URL", RECENT_MESSAGES_REDIS_URL)
+
+# Seconds a websocket counts as online without a heartbeat frame
+PRESENCE_TTL = int(os.environ.get("PRESENCE_TTL", 60))
+PRESENCE_REDIS_URL = os.environ.get("PRESENCE_REDIS_URL", RECENT_MESSAGES_REDIS_URL)
+# Minimum seconds between two typing events relayed for one websocket
+CHAT_TYPING_THROTTLE = float(os.environ.get("CHAT_TYPING_THROTTLE", 2))
+# Negotiate permessage-deflate on websockets served by `python -m app.server`.
+# Each compressing socket keeps a zlib state sized by the window bits and
+# memory level for the life of the connection. "", "0" and "false" turn it off.
+WEBSOCKET_COMPRESSION = os.environ.get(
+    "WEBSOCKET_COMPRESSION", "true"
+).lower() not in ("", "0", "false")
+WEBSOCKET_COMPRESSION_WINDOW_BITS = int(
+    os.environ.get("WEBSOCKET_COMPRESSION_WINDOW_BITS", 11)
+)
+WEBSOCKET_COMPRESSION_MEM_LEVEL = int(
+    os.environ.get("WEBSOCKET_COMPRESSION_MEM_LEVEL", 4)
+)
+# Seconds room frames are held to be sent together as one batch frame, off
+# when 0. Clients must unpack {"type": "batch"} frames when it is set.
+CHAT_BATCH_WINDOW = float(os.environ.get("CHAT_BATCH_WINDOW", 0))
+# Most messages replayed to a reconnecting websocket, past it the client is
+# told to refetch the history
+CHAT_RESUME_MAX_MESSAGES = int(os.environ.get("CHAT_RESUME_MAX_MESSAGES", 500))
+# Token bucket limits as "tokens per second/burst", an empty string disables
+# one: frames of a websocket, frames of a user across sockets, ChatView
+# requests of a user and token requests of a client address
+RATE_LIMITS = {
+    "chat_socket": os.environ.get("RATE_LIMIT_CHAT_SOCKET", "10/30"),
+    "chat_user": os.environ.get("RATE_LIMIT_CHAT_USER", "20/60"),
+    "chats": os.environ.get("RATE_LIMIT_CHATS", "10/50"),
+    "login": os.environ.get("RATE_LIMIT_LOGIN", "1/20"),
+}
+# "local" keeps the buckets in each process, "redis" shares them between
+# servers and falls back to local ones while Redis is unreachable
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "local")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", RECENT_MESSAGES_REDIS_URL)
+# Consecutive throttled frames after which a websocket is closed
+CHAT_THROTTLE_CLOSE_AFTER = int(os.environ.get("CHAT_THROTTLE_CLOSE_AFTER", 50))
+# Bearer token Prometheus must send to scrape /metrics, not served when empty
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000))},
+    },
+}
+# Redis cache seen by every web and websocket process, for entries one
+# process writes and the others must see or drop
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", "")
+if SHARED_CACHE_URL:
+    CACHES["shared"] = {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": SHARED_CACHE_URL,
+    }
+
+# Cache of users resolved from websocket tokens. Saving or deleting a user
+# drops their entry, which only reaches the Daphne processes when the cache
+# is shared; a process local cache serves them until the timeout, as do
+# queryset updates, which skip the invalidation.
+WS_USER_CACHE = os.environ.get(
+    "WS_USER_CACHE", "shared" if SHARED_CACHE_URL else "default"
+)
+WS_USER_CACHE_TIMEOUT = int(os.environ.get("WS_USER_CACHE_TIMEOUT", 60))
+# Cache of replica pins, which the process serving a write sets for the
+# process serving the next read. Reads never go to replicas while it is
+# process local.
+REPLICA_PIN_CACHE = os.environ.get(
+    "REPLICA_PIN_CACHE", "shared" if SHARED_CACHE_URL else "default"
+)
+
 if os.environ.get("IS_CLOUDINARY", False):
     CLOUDINARY_STORAGE = {
         "CLOUD_NAME": get_env_variable("CLOUDINARY_CLOUD_NAME"),
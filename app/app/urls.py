@@ -20,8 +20,11 @@ from django.urls import include, path
 from rest_framework.documentation import include_docs_urls
 from rest_framework.schemas import get_schema_view
 
+from core.views import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("v1/users/", include("users.urls")),
     path("v1/chats/", include("chats.urls")),
     path(
@@ -0,0 +1,171 @@
+import datetime
+import json
+import zlib
+
+from django.db import transaction
+from django.db.models import F
+
+from chats.caches import recent_messages
+from core.models import Message, MessageArchive, Thread, User
+
+# Fields of a Message stored in an archive block
+ARCHIVED_FIELDS = (
+    "id",
+    "seq",
+    "sender_id",
+    "text",
+    "is_bot",
+    "created_at",
+    "updated_at",
+)
+ARCHIVED_SENDER_FIELDS = (
+    "id",
+    "first_name",
+    "last_name",
+    "profile_picture",
+    "profile_thumbnail_small",
+    "profile_thumbnail_medium",
+    "username",
+    "created_on",
+)
+
+
+def compress_rows(rows):
+    for row in rows:
+        row["created_at"] = row["created_at"].isoformat()
+        row["updated_at"] = row["updated_at"].isoformat()
+    return zlib.compress(json.dumps(rows).encode())
+
+
+def decompress_rows(data):
+    rows = json.loads(zlib.decompress(data))
+    for row in rows:
+        row["created_at"] = datetime.datetime.fromisoformat(row["created_at"])
+        row["updated_at"] = datetime.datetime.fromisoformat(row["updated_at"])
+    return rows
+
+
+def archive_thread_messages(thread_id, before, block_size):
+    """Move the messages of a thread created before a datetime into
+    compressed archive blocks of up to ``block_size`` messages
+    """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Message.objects.filter(thread_id=thread_id, created_at__lt=before)
+                .order_by("created_at", "id")
+                .values(*ARCHIVED_FIELDS)[:block_size]
+            )
+            if not rows:
+                break
+            MessageArchive.objects.create(
+                thread_id=thread_id,
+                first_message_id=rows[0]["id"],
+                last_message_id=rows[-1]["id"],
+                first_created_at=rows[0]["created_at"],
+                last_created_at=rows[-1]["created_at"],
+                message_count=len(rows),
+                data=compress_rows(rows),
+            )
+            Message.objects.filter(id__in=[row["id"] for row in rows]).delete()
+            Thread.objects.filter(id=thread_id).update(
+                archived_count=F("archived_count") + len(rows)
+            )
+        archived += len(rows)
+    if archived:
+        recent_messages.invalidate(thread_id)
+    return archived
+
+
+def archive_messages(before, block_size):
+    """Archive every message created before a datetime, thread by thread"""
+    thread_ids = (
+        Message.objects.filter(created_at__lt=before)
+        .order_by()
+        .values_list("thread_id", flat=True)
+        .distinct()
+    )
+    return sum(
+        archive_thread_messages(thread_id, before, block_size)
+        for thread_id in list(thread_ids)
+    )
+
+
+def find_archived_message(thread_id, message_id):
+    """(created_at, id) key of an archived message, None when not archived"""
+    blocks = MessageArchive.objects.filter(
+        thread_id=thread_id,
+        first_message_id__lte=message_id,
+        last_message_id__gte=message_id,
+    )
+    for block in blocks:
+        for row in decompress_rows(block.data):
+            if row["id"] == int(message_id):
+                return row["created_at"], row["id"]
+    return None
+
+
+def archived_message_rows(thread_id, limit, before=None, after=None):
+    """Up to ``limit`` archived messages of a thread in chronological order
+
+    ``before`` and ``after`` are (created_at, id) keys; without ``after``
+    the newest archived messages before the key are returned. Rows have the
+    shape of ``Message.objects.values(*MESSAGE_ROW_FIELDS)``.
+    """
+    blocks = MessageArchive.objects.filter(thread_id=thread_id)
+    if after is not None:
+        blocks = blocks.filter(last_created_at__gte=after[0]).order_by(
+            "first_created_at", "first_message_id"
+        )
+    else:
+        if before is not None:
+            blocks = blocks.filter(first_created_at__lte=before[0])
+        blocks = blocks.order_by("-last_created_at", "-last_message_id")
+
+    rows = []
+    for block in blocks.iterator():
+        block_rows = decompress_rows(block.data)
+        if after is not None:
+            rows += [
+                row for row in block_rows if (row["created_at"], row["id"]) > after
+            ]
+        else:
+            if before is not None:
+                block_rows = [
+                    row for row in block_rows if (row["created_at"], row["id"]) < before
+                ]
+            rows = block_rows + rows
+        if len(rows) >= limit:
+            break
+
+    rows = rows[:limit] if after is not None else rows[-limit:]
+    return with_sender_fields(thread_id, rows)
+
+
+def with_sender_fields(thread_id, rows):
+    """Join archived rows with their senders, dropping deleted senders"""
+    senders = {
+        sender["id"]: sender
+        for sender in User.objects.filter(
+            id__in={row["sender_id"] for row in rows}
+        ).values(*ARCHIVED_SENDER_FIELDS)
+    }
+    return [
+        {
+            "id": row["id"],
+            "seq": row.get("seq"),
+            "thread_id": thread_id,
+            "text": row["text"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "is_bot": row["is_bot"],
+            "sender_id": row["sender_id"],
+            **{
+                f"sender__{field}": senders[row["sender_id"]][field]
+                for field in ARCHIVED_SENDER_FIELDS[1:]
+            },
+        }
+        for row in rows
+        if row["sender_id"] in senders
+    ]
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from prometheus_client import Histogram
+
+from core.metrics import GROUP_SEND_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the batch size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+BATCH_SIZES = Histogram(
+    "chat_room_batch_frames",
+    "Frames per room batch sent",
+    buckets=BATCH_SIZE_BUCKETS,
+)
+
+
+class BatchStats:
+    """Counters of the batches sent to rooms by this process"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.frames = 0
+        self.max_size = 0
+        self.buckets = dict.fromkeys(BATCH_SIZE_BUCKETS + (float("inf"),), 0)
+
+    def record(self, size):
+        self.batches += 1
+        self.frames += size
+        self.max_size = max(self.max_size, size)
+        for bound in self.buckets:
+            if size <= bound:
+                self.buckets[bound] += 1
+                break
+
+    def summary(self):
+        mean = self.frames / self.batches if self.batches else 0
+        buckets = ", ".join(
+            f"<={bound}: {count}"
+            for bound, count in self.buckets.items()
+            if count and bound != float("inf")
+        )
+        if self.buckets[float("inf")]:
+            buckets += f", >{BATCH_SIZE_BUCKETS[-1]}: {self.buckets[float('inf')]}"
+        return (
+            f"{self.frames} frames in {self.batches} batches, "
+            f"mean {mean:.1f} max {self.max_size} ({buckets})"
+        )
+
+
+class RoomBatcher:
+    """Process wide coalescing of the frames sent to each room
+
+    Frames sent to a room within ``CHAT_BATCH_WINDOW`` seconds of the first
+    pending one go out as a single ``chat.batch`` group event, in order, so
+    every member gets one channel layer message and one websocket frame for
+    the whole batch.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.timers = {}
+        self.stats = BatchStats()
+
+    async def send(self, channel_layer, room_name, text, sender_channel=None):
+        """Queue a frame for a room, skipping the socket of ``sender_channel``"""
+        self.pending.setdefault(room_name, []).append([text, sender_channel])
+        timer = self.timers.get(room_name)
+        if timer is None or timer.done():
+            self.timers[room_name] = asyncio.ensure_future(
+                self.flush_later(channel_layer, room_name)
+            )
+
+    async def flush_later(self, channel_layer, room_name):
+        await asyncio.sleep(settings.CHAT_BATCH_WINDOW)
+        frames = self.pending.pop(room_name, [])
+        del self.timers[room_name]
+        if not frames:
+            return
+        try:
+            with GROUP_SEND_LATENCY.time():
+                await channel_layer.group_send(
+                    room_name, {"type": "chat.batch", "frames": frames}
+                )
+        except Exception:
+            # Nothing awaits this task, the error would otherwise be lost
+            logger.exception(f"Failed to send {len(frames)} frames to {room_name}")
+            return
+        self.stats.record(len(frames))
+        BATCH_SIZES.observe(len(frames))
+
+
+def batch_frame(texts):
+    """One JSON text frame holding already encoded JSON frames"""
+    return '{"type": "batch", "frames": [' + ", ".join(texts) + "]}"
+
+
+room_batcher = RoomBatcher()
@@ -0,0 +1,135 @@
+import asyncio
+import atexit
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import router, transaction
+
+from chats.caches import recent_messages
+from chats.serializers import serialize_message
+from core import models
+from core.routers import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+# Longest wait, in seconds, between retries of a failing timed flush
+MAX_RETRY_DELAY = 30
+
+
+class MessageWriteBuffer:
+    """Process wide write-behind buffer persisting chat messages in batches
+
+    Messages are flushed with a single ``bulk_create`` once
+    ``CHAT_WRITE_BEHIND_BATCH_SIZE`` are pending or
+    ``CHAT_WRITE_BEHIND_FLUSH_INTERVAL`` seconds after the first one was
+    queued. Flushes are serialized so batches are written in arrival order.
+
+    Messages come numbered by chats.sequences. The transaction inserting a
+    batch also moves ``Thread.last_seq`` up to the highest seq of each of
+    its threads.
+
+    A failed flush is retried by the timer with exponential backoff. Past
+    ``CHAT_WRITE_BEHIND_MAX_PENDING`` messages, ``wait_for_room`` flushes
+    inline, so while the database is down senders get the error instead of
+    the buffer growing.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self._lock = None
+        self._timer = None
+
+    async def wait_for_room(self):
+        """Flush first when too many messages are pending, raising its error"""
+        if len(self.pending) >= settings.CHAT_WRITE_BEHIND_MAX_PENDING:
+            await self.flush()
+
+    async def add(self, message):
+        self.pending.append(message)
+        if len(self.pending) < settings.CHAT_WRITE_BEHIND_BATCH_SIZE:
+            self._schedule()
+            return
+        try:
+            await self.flush()
+        except Exception:
+            # Logged and left to the timer
+            pass
+
+    def _schedule(self):
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        delay = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL
+        # Also covers messages queued while this timer was flushing
+        while self.pending:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+            except Exception:
+                delay = min(max(delay, 0.1) * 2, MAX_RETRY_DELAY)
+            else:
+                delay = settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL
+
+    async def flush(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+            try:
+                await database_sync_to_async(self.write)(batch)
+            except Exception:
+                # write() logged it and put the batch back
+                self._schedule()
+                raise
+
+    def flush_sync(self):
+        """Write pending messages from synchronous code, e.g. on shutdown"""
+        batch, self.pending = self.pending, []
+        if batch:
+            self.write(batch)
+
+    def write(self, batch):
+        try:
+            with transaction.atomic(using=router.db_for_write(models.Message)):
+                models.Message.objects.bulk_create(batch)
+                self.update_last_seqs(batch)
+        except Exception:
+            # Put the batch back in front so ordering survives a retry
+            self.pending[:0] = batch
+            logger.exception(f"Failed to flush {len(batch)} messages")
+            raise
+        logger.info(f"Flushed {len(batch)} messages")
+        # The senders' next history reads must see their messages
+        for sender in {message.sender for message in batch}:
+            pin_to_primary(sender)
+
+        for message in batch:
+            if message.pk is None:
+                # Backends that don't return ids from bulk_create
+                recent_messages.invalidate(message.thread_id)
+            else:
+                recent_messages.append(
+                    message.thread_id, serialize_message(message, with_senders=False)
+                )
+
+    def update_last_seqs(self, batch):
+        """Raise the last_seq of the threads of a batch to its messages"""
+        last_seqs = {}
+        for message in batch:
+            last_seqs[message.thread_id] = max(
+                message.seq, last_seqs.get(message.thread_id, 0)
+            )
+        # Lock thread rows in id order so concurrent flushes cannot deadlock
+        for thread_id, last_seq in sorted(last_seqs.items()):
+            models.Thread.objects.filter(id=thread_id, last_seq__lt=last_seq).update(
+                last_seq=last_seq
+            )
+
+
+message_buffer = MessageWriteBuffer()
+atexit.register(message_buffer.flush_sync)
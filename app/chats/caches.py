@@ -0,0 +1,98 @@
+import json
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Highest scored member marking a thread cache as filled from the database
+COMPLETE_MARKER = "complete"
+
+
+class RecentMessagesCache:
+    """Redis ring buffer of the latest serialized messages of each thread
+
+    Each thread is a sorted set of message JSON scored by message id and
+    trimmed to ``RECENT_MESSAGES_CACHE_SIZE`` entries. Writers always add
+    their message, while a read only counts as a hit once the set was
+    filled from the database and carries the complete marker, so a message
+    written during a fill is never lost.
+
+    Messages are cached with the sender id in place of the sender, see
+    chats.serializers.attach_senders, so profile changes show at once.
+    """
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def enabled(self):
+        return settings.RECENT_MESSAGES_CACHE_SIZE > 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                settings.RECENT_MESSAGES_REDIS_URL, decode_responses=True
+            )
+        return self._client
+
+    def key(self, thread_id):
+        return f"recent_messages:{thread_id}"
+
+    def get(self, thread_id):
+        """Return the cached messages of a thread oldest first, None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            members = self.client.zrange(self.key(thread_id), 0, -1)
+        except redis.RedisError:
+            logger.exception(f"Failed to read recent messages of {thread_id}")
+            return None
+
+        if not members or members[-1] != COMPLETE_MARKER:
+            return None
+        return [json.loads(member) for member in members[:-1]]
+
+    def append(self, thread_id, message_data):
+        """Add one serialized message to a thread"""
+        self.add(thread_id, [message_data])
+
+    def fill(self, thread_id, messages_data):
+        """Add messages loaded from the database and mark the thread complete"""
+        self.add(thread_id, messages_data, complete=True)
+
+    def add(self, thread_id, messages_data, complete=False):
+        if not self.enabled:
+            return
+        key = self.key(thread_id)
+        mapping = {
+            json.dumps(message_data): message_data["id"]
+            for message_data in messages_data
+        }
+        if complete:
+            mapping[COMPLETE_MARKER] = float("inf")
+
+        try:
+            pipeline = self.client.pipeline(transaction=True)
+            if mapping:
+                pipeline.zadd(key, mapping)
+            # Keep the newest messages plus the complete marker
+            pipeline.zremrangebyrank(key, 0, -(settings.RECENT_MESSAGES_CACHE_SIZE + 2))
+            pipeline.expire(key, settings.RECENT_MESSAGES_CACHE_TIMEOUT)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.exception(f"Failed to cache recent messages of {thread_id}")
+            self.invalidate(thread_id)
+
+    def invalidate(self, thread_id):
+        if not self.enabled:
+            return
+        try:
+            self.client.delete(self.key(thread_id))
+        except redis.RedisError:
+            logger.exception(f"Failed to invalidate recent messages of {thread_id}")
+
+
+recent_messages = RecentMessagesCache()
@@ -0,0 +1,68 @@
+import functools
+import json
+
+import msgpack
+
+# Websocket subprotocols a client may offer to pick the frame encoding,
+# without one frames are JSON text
+JSON_SUBPROTOCOL = "chat.json"
+MSGPACK_SUBPROTOCOL = "chat.msgpack"
+# Recently packed frames kept by each process
+PACKED_FRAMES_CACHE_SIZE = 1024
+
+
+class JSONCodec:
+    """JSON text frames, chat messages are sent as plain text"""
+
+    def encode(self, text):
+        return {"type": "websocket.send", "text": text}
+
+    def decode(self, event):
+        return event.get("text")
+
+
+@functools.lru_cache(maxsize=PACKED_FRAMES_CACHE_SIZE)
+def pack_frame(text):
+    """MessagePack bytes of a JSON frame
+
+    Every socket of a room gets the same frame, so a process packs it once
+    for all of its sockets.
+    """
+    return msgpack.packb(json.loads(text))
+
+
+class MessagePackCodec:
+    """Binary MessagePack frames
+
+    Outbound frames are built as JSON for a room and packed once by
+    pack_frame. Inbound, a packed string is a chat message and a packed map
+    a control frame.
+    """
+
+    def encode(self, text):
+        return {"type": "websocket.send", "bytes": pack_frame(text)}
+
+    def decode(self, event):
+        if event.get("bytes") is None:
+            return event.get("text")
+        try:
+            data = msgpack.unpackb(event["bytes"], raw=False)
+        except (TypeError, ValueError, msgpack.UnpackException):
+            return None
+        if isinstance(data, str):
+            return data
+        if isinstance(data, dict):
+            return json.dumps(data)
+        return None
+
+
+json_codec = JSONCodec()
+CODECS = {JSON_SUBPROTOCOL: json_codec, MSGPACK_SUBPROTOCOL: MessagePackCodec()}
+
+
+def negotiate(subprotocols):
+    """Codec and accepted subprotocol for the subprotocols a client offered"""
+    for subprotocol in subprotocols:
+        if subprotocol in CODECS:
+            return CODECS[subprotocol], subprotocol
+    return json_codec, None
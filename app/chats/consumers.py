@@ -1,53 +1,392 @@
 import json
 import logging
+import time
+from urllib.parse import parse_qs
 
-from asgiref.sync import async_to_sync
-from channels.consumer import SyncConsumer
+from asgiref.sync import sync_to_async
+from channels.consumer import AsyncConsumer
+from channels.db import database_sync_to_async
+from channels.exceptions import StopConsumer
+from django.conf import settings
+from django.db import DatabaseError
 
+from chats.batching import batch_frame, room_batcher
+from chats.buffers import message_buffer
+from chats.caches import recent_messages
+from chats.codecs import negotiate
+from chats.presence import presence
+from chats.resume import missed_messages
+from chats.sequences import message_seqs
+from chats.serializers import serialize_message
 from core import models
+from core.metrics import (GROUP_SEND_LATENCY, WEBSOCKET_FRAMES, WEBSOCKETS,
+                          channel_layer_sampler)
+from core.ratelimit import TokenBucket, get_limit, rate_limiter
+from core.routers import pin_to_primary
 
 logger = logging.getLogger(__name__)
 
+# Frame types handled by the consumer instead of being stored as messages
+CONTROL_EVENTS = ("typing", "heartbeat", "ack")
 
-class ChatConsumer(SyncConsumer):
-    def websocket_connect(self, event):
-        me = self.scope["user"]
 
-        other_username = self.scope["url_route"]["kwargs"]["username"]
-        other_user = models.User.objects.get(username=other_username)
+def get_control_event(text):
+    """Data of a JSON control frame, None for a plain chat message"""
+    if not text or not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(data, dict) and data.get("type") in CONTROL_EVENTS:
+        return data
+    return None
 
-        self.thread_obj = models.Thread.objects.get_or_create_personal_thread(
-            me, other_user
-        )
-        self.room_name = f"presonal_thread_{self.thread_obj.id}"
-        async_to_sync(self.channel_layer.group_add)(self.room_name, self.channel_name)
-        self.send({"type": "websocket.accept"})
+
+def get_resume_seq(scope):
+    """Seq of the ``resume`` handshake query param, None without it
+
+    ``resume=acked`` resumes after the last seq the user acknowledged.
+    """
+    values = parse_qs(scope.get("query_string", b"").decode("utf-8")).get("resume")
+    if not values:
+        return None
+    if values[-1] == "acked":
+        return "acked"
+    try:
+        return max(0, int(values[-1]))
+    except ValueError:
+        return None
+
+
+def message_frame(text, username, seq):
+    return json.dumps({"text": text, "username": username, "seq": seq})
+
+
+class ChatConsumer(AsyncConsumer):
+    """Chat websocket of a personal thread
+
+    Message frames carry the per-thread ``seq`` of their message. Clients
+    acknowledge them with ``{"type": "ack", "seq": N}``, stored when the
+    socket closes, and pass ``?resume=N`` (or ``resume=acked``) when
+    reconnecting to get the messages after N replayed before a
+    ``{"type": "resumed", "seq": N}`` frame. When too many were missed a
+    ``{"type": "resync"}`` frame asks the client to refetch the history.
+    Messages sent while replaying may arrive twice, clients drop frames
+    with a seq they already have.
+
+    Frames are JSON text unless the client offers the ``chat.msgpack``
+    subprotocol, see chats.codecs. With CHAT_BATCH_WINDOW set, room frames
+    sent close together arrive as one ``{"type": "batch", "frames": [...]}``
+    frame, see chats.batching.
+
+    Frames other than acks take a token from the "chat_socket" bucket of
+    the socket and the "chat_user" bucket of the user, see RATE_LIMITS.
+    Throttled frames are dropped, the first of a run answered with
+    ``{"type": "error", "code": "throttled", "retry_after": seconds}``, and
+    the socket is closed with code 1008 after CHAT_THROTTLE_CLOSE_AFTER of
+    them in a row. A message that could not be stored is dropped and
+    answered with ``{"type": "error", "code": "not_stored"}``.
+    """
+
+    room_prefix = "presonal_thread"
+
+    async def websocket_connect(self, event):
+        self.thread_obj = await self.get_thread()
+        if self.thread_obj is None:
+            logger.info(f"[{self.channel_name}] - Connection rejected")
+            await self.send({"type": "websocket.close"})
+            return
+
+        self.codec, subprotocol = negotiate(self.scope.get("subprotocols", ()))
+        self.room_name = f"{self.room_prefix}_{self.thread_obj.id}"
+        await self.channel_layer.group_add(self.room_name, self.channel_name)
+        await self.send({"type": "websocket.accept", "subprotocol": subprotocol})
+        WEBSOCKETS.labels(type(self).__name__).inc()
         logger.info(f"[{self.channel_name}] - You are connected")
 
-    def websocket_receive(self, event):
-        logger.info(f'[{self.channel_name}] - Recieved message - {event["text"]}')
+        self.last_typing_at = 0
+        self.acked_seq = self.stored_acked_seq = 0
+        limit = get_limit("chat_socket")
+        self.rate_bucket = TokenBucket(*limit) if limit else None
+        self.throttled_frames = 0
+        await self.set_online()
 
-        msg = json.dumps(
-            {"text": event.get("text"), "username": self.scope["user"].username}
-        )
+        resume_seq = get_resume_seq(self.scope)
+        if resume_seq is not None:
+            await self.replay(resume_seq)
 
-        self.store_message(event.get("text"))
+    async def websocket_receive(self, event):
+        WEBSOCKET_FRAMES.labels("in").inc()
+        channel_layer_sampler.sample()
+        text = self.codec.decode(event)
+        if text is None:
+            return
+        control_event = get_control_event(text)
+        control_type = control_event and control_event["type"]
+        if control_type != "ack":
+            wait = await self.get_throttle_wait()
+            if wait:
+                await self.throttled(wait)
+                return
+            self.throttled_frames = 0
+        if control_type == "typing":
+            await self.send_typing()
+            return
+        if control_type == "heartbeat":
+            await sync_to_async(presence.heartbeat, thread_sensitive=False)(
+                self.scope["user"].id, self.channel_name
+            )
+            return
+        if control_type == "ack":
+            if isinstance(control_event.get("seq"), int):
+                self.acked_seq = max(self.acked_seq, control_event["seq"])
+            return
 
-        async_to_sync(self.channel_layer.group_send)(
-            self.room_name, {"type": "websocket.message", "text": msg}
-        )
+        logger.info(f"[{self.channel_name}] - Recieved message - {text}")
+
+        await self.store_message(text)
+
+    async def send_message(self, message):
+        """Send a stored message to the room"""
+        msg = message_frame(message.text, self.scope["user"].username, message.seq)
+
+        if settings.CHAT_BATCH_WINDOW:
+            await room_batcher.send(self.channel_layer, self.room_name, msg)
+            return
+        with GROUP_SEND_LATENCY.time():
+            await self.channel_layer.group_send(
+                self.room_name, {"type": "websocket.message", "text": msg}
+            )
 
-    def websocket_message(self, event):
+    async def websocket_message(self, event):
         logger.info(f'[{self.channel_name}] - Message sent - {event["text"]}')
-        self.send({"type": "websocket.send", "text": event.get("text")})
+        await self.send(self.codec.encode(event["text"]))
 
-    def websocket_disconnect(self, event):
+    async def chat_event(self, event):
+        """Forward a typing or presence event to everyone but its sender"""
+        if event.get("sender_channel") != self.channel_name:
+            await self.send(self.codec.encode(event["text"]))
+
+    async def chat_batch(self, event):
+        """Send the frames of a room batch as a single websocket frame"""
+        texts = [
+            text
+            for text, sender_channel in event["frames"]
+            if sender_channel != self.channel_name
+        ]
+        if len(texts) == 1:
+            await self.send(self.codec.encode(texts[0]))
+        elif texts:
+            await self.send(self.codec.encode(batch_frame(texts)))
+
+    async def websocket_disconnect(self, event):
         logger.info(f"[{self.channel_name}] - Disonnected")
-        async_to_sync(self.channel_layer.group_discard)(
-            self.room_name, self.channel_name
+        if hasattr(self, "room_name"):
+            await self.channel_layer.group_discard(self.room_name, self.channel_name)
+            WEBSOCKETS.labels(type(self).__name__).dec()
+            await self.set_offline()
+            if self.acked_seq > self.stored_acked_seq:
+                await self.store_acked_seq()
+        if settings.CHAT_WRITE_BEHIND:
+            try:
+                await message_buffer.flush()
+            except DatabaseError:
+                # Logged, the buffer's timer retries it
+                pass
+        raise StopConsumer()
+
+    async def send_chat_event(self, data):
+        if settings.CHAT_BATCH_WINDOW:
+            await room_batcher.send(
+                self.channel_layer,
+                self.room_name,
+                json.dumps(data),
+                sender_channel=self.channel_name,
+            )
+            return
+        with GROUP_SEND_LATENCY.time():
+            await self.channel_layer.group_send(
+                self.room_name,
+                {
+                    "type": "chat.event",
+                    "text": json.dumps(data),
+                    "sender_channel": self.channel_name,
+                },
+            )
+
+    async def get_throttle_wait(self):
+        """Seconds until a frame would be allowed, 0 when it is"""
+        if self.rate_bucket is not None:
+            wait = self.rate_bucket.consume()
+            if wait:
+                return wait
+        return await rate_limiter.aconsume("chat_user", self.scope["user"].id)
+
+    async def throttled(self, wait):
+        """Drop a frame over the rate limits, closing sockets that keep going"""
+        self.throttled_frames += 1
+        if self.throttled_frames == 1:
+            await self.send_json(
+                {"type": "error", "code": "throttled", "retry_after": round(wait, 3)}
+            )
+        elif self.throttled_frames == settings.CHAT_THROTTLE_CLOSE_AFTER:
+            logger.info(f"[{self.channel_name}] - Closing, too many frames")
+            await self.send({"type": "websocket.close", "code": 1008})
+
+    async def send_typing(self):
+        """Relay a typing event, at most once per CHAT_TYPING_THROTTLE seconds
+
+        Typing events only go through the channel layer, never the database.
+        """
+        now = time.monotonic()
+        if now - self.last_typing_at < settings.CHAT_TYPING_THROTTLE:
+            return
+        self.last_typing_at = now
+        await self.send_chat_event(
+            {"type": "typing", "username": self.scope["user"].username}
         )
 
-    def store_message(self, text):
-        models.Message.objects.create(
+    async def set_online(self):
+        """Register this socket and exchange presence with the room"""
+        me = self.scope["user"]
+        came_online = await sync_to_async(presence.connect, thread_sensitive=False)(
+            me.id, self.channel_name
+        )
+        online_ids = await sync_to_async(presence.online, thread_sensitive=False)(
+            self.members
+        )
+        await self.send_json(
+            {
+                "type": "presence",
+                "users": {
+                    username: user_id in online_ids
+                    for user_id, username in self.members.items()
+                },
+            }
+        )
+        if came_online:
+            await self.send_chat_event(
+                {"type": "presence", "users": {me.username: True}}
+            )
+
+    async def replay(self, after_seq):
+        """Send the messages numbered after a seq that this client missed"""
+        if settings.CHAT_WRITE_BEHIND:
+            await message_buffer.flush()
+        if after_seq == "acked":
+            after_seq = self.stored_acked_seq = await self.get_acked_seq()
+        missed = await database_sync_to_async(missed_messages)(
+            self.thread_obj.id, after_seq, settings.CHAT_RESUME_MAX_MESSAGES
+        )
+        if missed is None:
+            await self.send_json({"type": "resync"})
+            return
+        for message in missed:
+            await self.send(
+                self.codec.encode(
+                    message_frame(
+                        message["text"], message["sender"]["username"], message["seq"]
+                    )
+                )
+            )
+        await self.send_json(
+            {"type": "resumed", "seq": missed[-1]["seq"] if missed else after_seq}
+        )
+
+    async def send_json(self, data):
+        await self.send(self.codec.encode(json.dumps(data)))
+
+    async def send(self, message):
+        if message["type"] == "websocket.send":
+            WEBSOCKET_FRAMES.labels("out").inc()
+        await super().send(message)
+
+    async def set_offline(self):
+        me = self.scope["user"]
+        went_offline = await sync_to_async(presence.disconnect, thread_sensitive=False)(
+            me.id, self.channel_name
+        )
+        if went_offline:
+            await self.send_chat_event(
+                {"type": "presence", "users": {me.username: False}}
+            )
+
+    @database_sync_to_async
+    def get_thread(self):
+        """Resolve the other user and their personal thread in one DB hop"""
+        me = self.scope["user"]
+        other_username = self.scope["url_route"]["kwargs"]["username"]
+        other_user = models.User.objects.get(username=other_username)
+        self.members = {me.id: me.username, other_user.id: other_user.username}
+        thread, _ = models.Thread.objects.get_or_create_personal_thread(me, other_user)
+        return thread
+
+    async def store_message(self, text):
+        """Store a message of this socket's user and send it to the room"""
+        message = models.Message(
             thread=self.thread_obj, sender=self.scope["user"], text=text
         )
+        try:
+            if settings.CHAT_WRITE_BEHIND:
+                # Refuse before taking a seq, so a dropped message leaves no gap
+                await message_buffer.wait_for_room()
+                message.seq = await message_seqs.anext(self.thread_obj.id)
+                await message_buffer.add(message)
+            else:
+                await self.save_message(message)
+        except DatabaseError:
+            logger.warning(f"[{self.channel_name}] - Message not stored", exc_info=True)
+            await self.send_json({"type": "error", "code": "not_stored"})
+            return
+        await self.send_message(message)
+
+    @database_sync_to_async
+    def get_acked_seq(self):
+        marker = models.ThreadReadMarker.objects.filter(
+            thread=self.thread_obj, user=self.scope["user"]
+        ).first()
+        return marker.delivered_seq if marker is not None else 0
+
+    @database_sync_to_async
+    def store_acked_seq(self):
+        """Persist the acknowledged seq, never moving it backwards"""
+        markers = models.ThreadReadMarker.objects.filter(
+            thread=self.thread_obj, user=self.scope["user"]
+        )
+        if not markers.filter(delivered_seq__lt=self.acked_seq).update(
+            delivered_seq=self.acked_seq
+        ):
+            models.ThreadReadMarker.objects.get_or_create(
+                thread=self.thread_obj,
+                user=self.scope["user"],
+                defaults={"delivered_seq": self.acked_seq},
+            )
+
+    @database_sync_to_async
+    def save_message(self, message):
+        message.save()
+        # The sender's next history reads must see this message
+        pin_to_primary(message.sender)
+        recent_messages.append(
+            self.thread_obj.id, serialize_message(message, with_senders=False)
+        )
+
+
+class GroupChatConsumer(ChatConsumer):
+    """Chat consumer of a group thread, keyed by the thread id
+
+    Membership is checked once on connect and holds for the connection.
+    """
+
+    room_prefix = "group_thread"
+
+    @database_sync_to_async
+    def get_thread(self):
+        thread_id = self.scope["url_route"]["kwargs"]["thread_id"]
+        thread = models.Thread.objects.filter(
+            id=thread_id, thread_type="group", users=self.scope["user"]
+        ).first()
+        if thread is not None:
+            self.members = dict(thread.users.values_list("id", "username"))
+        return thread
@@ -0,0 +1,37 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from chats.archive import archive_messages
+from core.partitions import drop_empty_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    """Django command to move old messages into compressed archive blocks"""
+
+    help = (
+        "Move messages older than --days into compressed MessageArchive "
+        "blocks, which the history endpoint still serves, then drop the "
+        "message partitions left empty."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS
+        )
+        parser.add_argument(
+            "--block-size", type=int, default=settings.MESSAGE_ARCHIVE_BLOCK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        before = timezone.now() - datetime.timedelta(days=options["days"])
+        archived = archive_messages(before, options["block_size"])
+        self.stdout.write(f"Archived {archived} messages created before {before}")
+
+        if is_partitioned(connection):
+            for name in drop_empty_partitions(connection, before):
+                self.stdout.write(f"Dropped partition {name}")
@@ -0,0 +1,109 @@
+import json
+import random
+import time
+import zlib
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chats.codecs import CODECS, JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL
+
+WORDS = (
+    "hey how are you doing today did you see the game last night yes it was "
+    "great what time should we meet tomorrow lunch sounds good see you soon "
+    "thanks ok lol sure sorry running late be there in ten minutes"
+).split()
+
+
+def sample_frames(count, seed=0):
+    """JSON text of typical chat traffic, mostly messages with some typing
+    and presence events
+    """
+    rng = random.Random(seed)
+    usernames = [f"user_{i}" for i in range(2)]
+    frames = []
+    for seq in range(1, count + 1):
+        kind = rng.random()
+        username = rng.choice(usernames)
+        if kind < 0.7:
+            text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30)))
+            data = {"text": text, "username": username, "seq": seq}
+        elif kind < 0.9:
+            data = {"type": "typing", "username": username}
+        else:
+            data = {"type": "presence", "users": {username: rng.random() < 0.5}}
+        frames.append(json.dumps(data))
+    return frames
+
+
+def frame_header_size(payload_size):
+    """Bytes of an unmasked server to client websocket frame header"""
+    if payload_size < 126:
+        return 2
+    if payload_size < 65536:
+        return 4
+    return 10
+
+
+class Deflater:
+    """permessage-deflate of one connection with context takeover"""
+
+    def __init__(self):
+        self.compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION,
+            zlib.DEFLATED,
+            -settings.WEBSOCKET_COMPRESSION_WINDOW_BITS,
+            settings.WEBSOCKET_COMPRESSION_MEM_LEVEL,
+        )
+
+    def compress(self, payload):
+        data = self.compressor.compress(payload)
+        data += self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        # RFC 7692 drops the empty block closing every message
+        return data[:-4]
+
+
+class Command(BaseCommand):
+    """Django command comparing websocket frame encodings"""
+
+    help = (
+        "Encode a sample of typical chat frames as JSON text and MessagePack, "
+        "with and without permessage-deflate, and report bytes on the wire "
+        "and encode CPU per frame."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--frames", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        frames = sample_frames(options["frames"])
+        self.stdout.write(
+            f"{len(frames)} frames, window bits "
+            f"{settings.WEBSOCKET_COMPRESSION_WINDOW_BITS}, memory level "
+            f"{settings.WEBSOCKET_COMPRESSION_MEM_LEVEL}"
+        )
+        baseline = None
+        for subprotocol in (JSON_SUBPROTOCOL, MSGPACK_SUBPROTOCOL):
+            for deflate in (False, True):
+                total, seconds = self.measure(CODECS[subprotocol], frames, deflate)
+                baseline = baseline or total
+                name = subprotocol + (" + deflate" if deflate else "")
+                self.stdout.write(
+                    f"{name:<24} {total:>10} bytes "
+                    f"({total / len(frames):.1f}/frame, "
+                    f"{total / baseline:.0%} of JSON) - "
+                    f"{seconds / len(frames) * 1e6:.2f}us/frame"
+                )
+
+    def measure(self, codec, frames, deflate):
+        deflater = Deflater() if deflate else None
+        total = 0
+        started = time.perf_counter()
+        for text in frames:
+            event = codec.encode(text)
+            payload = event.get("bytes") or event["text"].encode("utf-8")
+            if deflater is not None:
+                payload = deflater.compress(payload)
+            total += frame_header_size(len(payload)) + len(payload)
+        return total, time.perf_counter() - started
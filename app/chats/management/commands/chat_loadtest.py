@@ -0,0 +1,204 @@
+import asyncio
+import json
+import time
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.routing import websocket_urlpatterns
+from chats.batching import room_batcher
+from core import models
+
+USERNAME_PREFIX = "loadtest_"
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+async def receive_message(communicator, timeout):
+    """Receive the next chat message, skipping typing and presence frames
+
+    Batch frames are unpacked, their messages returned by the next calls.
+    """
+    backlog = getattr(communicator, "backlog", None)
+    if backlog is None:
+        backlog = communicator.backlog = []
+    while True:
+        if backlog:
+            data = backlog.pop(0)
+        else:
+            data = json.loads(await communicator.receive_from(timeout=timeout))
+        if data.get("type") == "batch":
+            backlog[:0] = data["frames"]
+        elif "type" not in data:
+            return data
+
+
+class Command(BaseCommand):
+    """Django command to load test the chat websocket consumer in-process"""
+
+    help = (
+        "Open N concurrent chat sockets in pairs, send messages through the "
+        "channel layer and report connect time and fan-out latency. With "
+        "--group-size, connect every member of one group thread instead and "
+        "report broadcast latency to all members; --burst sends the group "
+        "messages back to back instead of one at a time. Batch sizes are "
+        "reported when CHAT_BATCH_WINDOW is set. Senders are subject to the "
+        "chat_socket and chat_user rate limits, set RATE_LIMIT_CHAT_SOCKET and "
+        "RATE_LIMIT_CHAT_USER to empty strings to send past them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=500)
+        parser.add_argument("--messages", type=int, default=5)
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--group-size", type=int, default=0)
+        parser.add_argument("--burst", action="store_true")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if options["group_size"]:
+            users = self.create_users(options["group_size"])
+            run = self.run_group(
+                users, options["messages"], options["timeout"], options["burst"]
+            )
+        else:
+            pairs = max(1, options["sockets"] // 2)
+            users = self.create_users(pairs * 2)
+            run = self.run(users, options["messages"], options["timeout"])
+        try:
+            asyncio.run(run)
+            if settings.CHAT_BATCH_WINDOW:
+                self.stdout.write(f"Room batches: {room_batcher.stats.summary()}")
+        finally:
+            models.Thread.objects.filter(users__in=users).delete()
+            models.User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def create_users(self, count):
+        models.User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        models.User.objects.bulk_create(
+            models.User(username=f"{USERNAME_PREFIX}{i}") for i in range(count)
+        )
+        return list(
+            models.User.objects.filter(username__startswith=USERNAME_PREFIX).order_by(
+                "id"
+            )
+        )
+
+    async def run(self, users, messages, timeout):
+        application = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for me, other in zip(users[0::2], users[1::2]):
+            for user, peer in ((me, other), (other, me)):
+                communicator = WebsocketCommunicator(
+                    application, f"ws/chat/{peer.username}/"
+                )
+                communicator.scope["user"] = user
+                communicators.append(communicator)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(c.connect(timeout=timeout) for c in communicators),
+            return_exceptions=True,
+        )
+        connect_seconds = time.perf_counter() - started
+        connected = [
+            not isinstance(result, Exception) and result[0] for result in results
+        ]
+        self.stdout.write(
+            f"Connected {sum(connected)}/{len(communicators)} sockets "
+            f"in {connect_seconds:.2f}s"
+        )
+
+        latencies = []
+
+        async def converse(sender, receiver):
+            for i in range(messages):
+                sent_at = time.perf_counter()
+                await sender.send_to(text_data=f"message {i}")
+                await receive_message(receiver, timeout)
+                latencies.append(time.perf_counter() - sent_at)
+                await receive_message(sender, timeout)
+
+        pairs = [
+            (communicators[i], communicators[i + 1])
+            for i in range(0, len(communicators), 2)
+            if connected[i] and connected[i + 1]
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(converse(s, r) for s, r in pairs))
+        elapsed = time.perf_counter() - started
+
+        await asyncio.gather(
+            *(c.disconnect() for c in communicators), return_exceptions=True
+        )
+
+        if latencies:
+            self.stdout.write(
+                f"Fan-out of {len(latencies)} messages in {elapsed:.2f}s - "
+                f"p50 {percentile(latencies, 50) * 1000:.1f}ms "
+                f"p99 {percentile(latencies, 99) * 1000:.1f}ms"
+            )
+
+    async def run_group(self, users, messages, timeout, burst):
+        thread = await database_sync_to_async(models.Thread.objects.create)(
+            name="loadtest", thread_type="group"
+        )
+        await database_sync_to_async(thread.users.add)(*users)
+
+        application = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for user in users:
+            communicator = WebsocketCommunicator(
+                application, f"ws/chat/group/{thread.id}/"
+            )
+            communicator.scope["user"] = user
+            communicators.append(communicator)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(c.connect(timeout=timeout) for c in communicators))
+        self.stdout.write(
+            f"Connected {len(communicators)} group members "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        latencies = []
+        sent_at = {}
+        delivered_at = {}
+
+        async def receive(communicator, count):
+            for _ in range(count):
+                text = (await receive_message(communicator, timeout))["text"]
+                now = time.perf_counter()
+                latencies.append(now - sent_at[text])
+                delivered_at[text] = max(delivered_at.get(text, 0), now)
+
+        if burst:
+            for i in range(messages):
+                sent_at[f"message {i}"] = time.perf_counter()
+                await communicators[0].send_to(text_data=f"message {i}")
+            await asyncio.gather(*(receive(c, messages) for c in communicators))
+        else:
+            for i in range(messages):
+                sent_at[f"message {i}"] = time.perf_counter()
+                await communicators[0].send_to(text_data=f"message {i}")
+                await asyncio.gather(*(receive(c, 1) for c in communicators))
+        broadcasts = [delivered_at[text] - sent_at[text] for text in sent_at]
+
+        await asyncio.gather(
+            *(c.disconnect() for c in communicators), return_exceptions=True
+        )
+
+        self.stdout.write(
+            f"Delivered {len(latencies)} frames - "
+            f"p50 {percentile(latencies, 50) * 1000:.1f}ms "
+            f"p99 {percentile(latencies, 99) * 1000:.1f}ms, "
+            f"full broadcast p99 {percentile(broadcasts, 99) * 1000:.1f}ms"
+        )
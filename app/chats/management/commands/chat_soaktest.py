@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+import psycopg2
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.routing import websocket_urlpatterns
+from chats.management.commands.chat_loadtest import (USERNAME_PREFIX,
+                                                     receive_message)
+from core import models
+
+COUNT_CONNECTIONS_SQL = """
+SELECT count(*) FROM pg_stat_activity
+WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+
+class ConnectionSampler(threading.Thread):
+    """Poll pg_stat_activity on a side connection and keep the peak count"""
+
+    def __init__(self, conn_params, interval):
+        super().__init__(daemon=True)
+        self.conn_params = conn_params
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = psycopg2.connect(**self.conn_params)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                while not self.stopped.is_set():
+                    cursor.execute(COUNT_CONNECTIONS_SQL)
+                    self.peak = max(self.peak, cursor.fetchone()[0])
+                    self.stopped.wait(self.interval)
+        finally:
+            conn.close()
+
+
+class Command(BaseCommand):
+    """Django command to soak test database connections under many sockets"""
+
+    help = (
+        "Hold N chat sockets open in pairs for a while, exchanging messages, "
+        "and report the peak number of Postgres connections seen in "
+        "pg_stat_activity. Fails when --max-connections is exceeded. "
+        "Requires PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=5000)
+        parser.add_argument("--duration", type=float, default=120)
+        parser.add_argument("--interval", type=float, default=30)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--timeout", type=float, default=120)
+        parser.add_argument("--max-connections", type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != "postgresql":
+            raise CommandError("The connection soak test needs PostgreSQL")
+
+        database = settings.DATABASES["default"]
+        self.stdout.write(
+            f"Engine {database['ENGINE']}, "
+            f"CONN_MAX_AGE {database['CONN_MAX_AGE']}, "
+            f"pool size {database.get('POOL', {}).get('MAX_SIZE', 0)}"
+        )
+
+        pairs = max(1, options["sockets"] // 2)
+        models.User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        models.User.objects.bulk_create(
+            models.User(username=f"{USERNAME_PREFIX}{i}") for i in range(pairs * 2)
+        )
+        users = list(
+            models.User.objects.filter(username__startswith=USERNAME_PREFIX).order_by(
+                "id"
+            )
+        )
+
+        sampler = ConnectionSampler(connection.get_connection_params(), 0.1)
+        connection.close()
+        sampler.start()
+        try:
+            asyncio.run(self.run(users, options))
+        finally:
+            sampler.stopped.set()
+            sampler.join()
+            models.Thread.objects.filter(users__in=users).delete()
+            models.User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        self.stdout.write(f"Peak Postgres connections: {sampler.peak}")
+        if options["max_connections"] and sampler.peak > options["max_connections"]:
+            raise CommandError(
+                f"{sampler.peak} connections exceed the limit of "
+                f"{options['max_connections']}"
+            )
+
+    async def run(self, users, options):
+        application = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for me, other in zip(users[0::2], users[1::2]):
+            for user, peer in ((me, other), (other, me)):
+                communicator = WebsocketCommunicator(
+                    application, f"ws/chat/{peer.username}/"
+                )
+                communicator.scope["user"] = user
+                communicators.append(communicator)
+
+        started = time.perf_counter()
+        batch_size = options["batch_size"]
+        for i in range(0, len(communicators), batch_size):
+            await asyncio.gather(
+                *(
+                    c.connect(timeout=options["timeout"])
+                    for c in communicators[i : i + batch_size]
+                )
+            )
+        self.stdout.write(
+            f"Connected {len(communicators)} sockets "
+            f"in {time.perf_counter() - started:.2f}s"
+        )
+
+        sent = 0
+        timed_out = 0
+        deadline = time.monotonic() + options["duration"]
+
+        async def converse(sender, receiver):
+            nonlocal sent, timed_out
+            while time.monotonic() < deadline:
+                await sender.send_to(text_data="soak")
+                try:
+                    await receive_message(receiver, options["timeout"])
+                    await receive_message(sender, options["timeout"])
+                except asyncio.TimeoutError:
+                    timed_out += 1
+                    return
+                sent += 1
+                await asyncio.sleep(options["interval"])
+
+        await asyncio.gather(
+            *(
+                converse(communicators[i], communicators[i + 1])
+                for i in range(0, len(communicators), 2)
+            )
+        )
+        await asyncio.gather(
+            *(c.disconnect() for c in communicators), return_exceptions=True
+        )
+        self.stdout.write(
+            f"Exchanged {sent} messages over {options['duration']}s, "
+            f"{timed_out} pairs timed out"
+        )
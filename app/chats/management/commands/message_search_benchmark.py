@@ -0,0 +1,90 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from chats.management.commands.chat_loadtest import USERNAME_PREFIX, percentile
+from chats.views import MessageSearchView
+from core import models
+
+VOCABULARY = (
+    "hello meeting lunch harbour project deadline coffee weekend invoice "
+    "travel design review release launch budget holiday report client "
+    "football concert dinner ticket office remote standup sprint bug fix "
+    "deploy server database message photo video call tomorrow tonight"
+).split()
+
+INSERT_CORPUS_SQL = """
+INSERT INTO core_message (thread_id, sender_id, text, is_bot, created_at, updated_at)
+SELECT %s, %s, array_to_string(ARRAY(
+    SELECT (%s::text[])[1 + floor(random() * %s)::int]
+    FROM generate_series(1, 12) WHERE g = g
+), ' '), false, now(), now()
+FROM generate_series(1, %s) AS g
+"""
+
+
+class Command(BaseCommand):
+    """Django command to benchmark message search over a synthetic corpus"""
+
+    help = (
+        "Insert a synthetic corpus of random word messages into one thread "
+        "(search_vector is filled by the database trigger), then report "
+        "search latency percentiles. Requires PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10_000_000)
+        parser.add_argument("--batch-size", type=int, default=100_000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if connection.vendor != "postgresql":
+            raise CommandError("Message search needs PostgreSQL")
+
+        user, _ = models.User.objects.get_or_create(username=f"{USERNAME_PREFIX}search")
+        thread = models.Thread.objects.create(
+            name="search benchmark", thread_type="group"
+        )
+        thread.users.add(user)
+        try:
+            self.insert_corpus(thread, user, options["messages"], options["batch_size"])
+            self.run_queries(user, options["queries"])
+        finally:
+            if not options["keep"]:
+                models.Thread.objects.filter(id=thread.id).delete()
+                user.delete()
+
+    def insert_corpus(self, thread, user, count, batch_size):
+        started = time.perf_counter()
+        inserted = 0
+        while inserted < count:
+            batch = min(batch_size, count - inserted)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    INSERT_CORPUS_SQL,
+                    [thread.id, user.id, VOCABULARY, len(VOCABULARY), batch],
+                )
+            inserted += batch
+            self.stdout.write(f"Inserted {inserted}/{count} messages")
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE core_message")
+        self.stdout.write(f"Corpus ready in {time.perf_counter() - started:.1f}s")
+
+    def run_queries(self, user, queries):
+        latencies = []
+        for _ in range(queries):
+            q = " ".join(random.sample(VOCABULARY, 2))
+            started = time.perf_counter()
+            list(MessageSearchView.search(user, q)[: MessageSearchView.default_limit])
+            latencies.append(time.perf_counter() - started)
+
+        self.stdout.write(
+            f"{queries} searches - "
+            f"p50 {percentile(latencies, 50) * 1000:.1f}ms "
+            f"p99 {percentile(latencies, 99) * 1000:.1f}ms"
+        )
@@ -1,15 +1,16 @@
-from urllib.parse import parse_qs
+import logging
 
 from channels.db import database_sync_to_async
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from django.db import close_old_connections
-from jwt import decode as jwt_decode
+from django.core.cache import caches
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import UntypedToken
 
 from core.models import User
 
+logger = logging.getLogger(__name__)
+
 
 def parse_bearer_token(headers):
     for key, value in headers:
@@ -19,14 +20,17 @@ def parse_bearer_token(headers):
             return auth_header[token_start_index:]
 
 
+def user_cache_key(user_id):
+    """Generate the cache key of a user resolved from a websocket token"""
+    return f"ws_user:{user_id}"
+
+
 class TokenAuthMiddleware:
     def __init__(self, inner):
         # Store the ASGI application we were passed
         self.inner = inner
 
     async def __call__(self, scope, receive, send):
-        close_old_connections()
-
         token = parse_bearer_token(scope["headers"])
         if not token:
             query_param = scope.get("query_string")
@@ -34,18 +38,28 @@ class TokenAuthMiddleware:
             token = byte_str.split("=")[-1]
 
         try:
-            UntypedToken(token)
-        except (InvalidToken, TokenError) as e:
-            print(e)
+            # UntypedToken verifies the signature and expiry while decoding
+            user_id = UntypedToken(token)[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, TokenError, KeyError) as e:
+            logger.info(f"Rejected websocket token - {e}")
+            return None
+
+        user = await self.get_user(id=user_id)
+        if user is None or not user.is_active:
+            logger.info(f"Rejected websocket of inactive user {user_id}")
             return None
-        else:
-            decoded_data = jwt_decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-            print(decoded_data)
-            user = await self.get_user(id=decoded_data["user_id"])
 
         scope["user"] = user
         return await self.inner(scope, receive, send)
 
     @database_sync_to_async
     def get_user(self, id):
-        return User.objects.get(id=id)
+        """Active or inactive user of a token, None once deleted"""
+        cache = caches[settings.WS_USER_CACHE]
+        key = user_cache_key(id)
+        user = cache.get(key)
+        if user is None:
+            user = User.objects.filter(id=id).first()
+            if user is not None:
+                cache.set(key, user, settings.WS_USER_CACHE_TIMEOUT)
+        return user
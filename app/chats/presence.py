@@ -0,0 +1,89 @@
+import logging
+import time
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PresenceStore:
+    """Redis store of which users have a live websocket
+
+    Each user is a sorted set of their connections' channel names scored by
+    the time the connection expires. Connections refresh their expiry with
+    heartbeats, so sockets of a crashed server drop out after
+    ``PRESENCE_TTL`` seconds without an explicit disconnect.
+    """
+
+    def __init__(self):
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(
+                settings.PRESENCE_REDIS_URL, decode_responses=True
+            )
+        return self._client
+
+    def key(self, user_id):
+        return f"presence:{user_id}"
+
+    def connect(self, user_id, channel_name):
+        """Register a connection, True when the user just came online"""
+        key = self.key(user_id)
+        now = time.time()
+        try:
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.zremrangebyscore(key, "-inf", now)
+            pipeline.zcard(key)
+            pipeline.zadd(key, {channel_name: now + settings.PRESENCE_TTL})
+            pipeline.expire(key, settings.PRESENCE_TTL)
+            _, connections, _, _ = pipeline.execute()
+        except redis.RedisError:
+            logger.exception(f"Failed to set presence of {user_id}")
+            return False
+        return connections == 0
+
+    def heartbeat(self, user_id, channel_name):
+        """Extend the expiry of a live connection"""
+        key = self.key(user_id)
+        try:
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.zadd(key, {channel_name: time.time() + settings.PRESENCE_TTL})
+            pipeline.expire(key, settings.PRESENCE_TTL)
+            pipeline.execute()
+        except redis.RedisError:
+            logger.exception(f"Failed to refresh presence of {user_id}")
+
+    def disconnect(self, user_id, channel_name):
+        """Remove a connection, True when the user has no connection left"""
+        key = self.key(user_id)
+        try:
+            pipeline = self.client.pipeline(transaction=True)
+            pipeline.zrem(key, channel_name)
+            pipeline.zremrangebyscore(key, "-inf", time.time())
+            pipeline.zcard(key)
+            _, _, connections = pipeline.execute()
+        except redis.RedisError:
+            logger.exception(f"Failed to clear presence of {user_id}")
+            return False
+        return connections == 0
+
+    def online(self, user_ids):
+        """Ids of the given users with at least one live connection"""
+        user_ids = list(user_ids)
+        now = time.time()
+        try:
+            pipeline = self.client.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipeline.zcount(self.key(user_id), now, "+inf")
+            counts = pipeline.execute()
+        except redis.RedisError:
+            logger.exception("Failed to read presence")
+            return set()
+        return {user_id for user_id, count in zip(user_ids, counts) if count}
+
+
+presence = PresenceStore()
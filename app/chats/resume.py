@@ -0,0 +1,38 @@
+from chats.caches import recent_messages
+from chats.serializers import MESSAGE_ROW_FIELDS, serialize_message_rows
+from core.models import Message
+
+
+def continues(messages, after_seq):
+    """Whether serialized messages are the gapless run right after a seq"""
+    return [message.get("seq") for message in messages] == list(
+        range(after_seq + 1, after_seq + 1 + len(messages))
+    )
+
+
+def missed_messages(thread_id, after_seq, limit):
+    """Serialized messages of a thread numbered after ``after_seq``
+
+    Served from the recent messages cache when it holds the whole delta,
+    from the database otherwise. Returns None when more than ``limit``
+    messages were missed or some were archived, the client then refetches
+    the history instead.
+    """
+    cached = recent_messages.get(thread_id)
+    if cached:
+        missed = sorted(
+            (message for message in cached if (message.get("seq") or 0) > after_seq),
+            key=lambda message: message["seq"],
+        )
+        if len(missed) <= limit and continues(missed, after_seq):
+            return missed
+
+    rows = (
+        Message.objects.filter(thread_id=thread_id, seq__gt=after_seq)
+        .order_by("seq")
+        .values(*MESSAGE_ROW_FIELDS)[: limit + 1]
+    )
+    missed = serialize_message_rows(rows)
+    if len(missed) > limit or not continues(missed, after_seq):
+        return None
+    return missed
@@ -0,0 +1,66 @@
+import redis
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from core import models
+
+# Increment the counter of a thread, seeding it first with ARGV[1]. Returns
+# nil when the counter is missing and no seed was given.
+NEXT_SEQ_SCRIPT = """
+if redis.call("exists", KEYS[1]) == 0 then
+    if ARGV[1] == "" then
+        return false
+    end
+    redis.call("set", KEYS[1], ARGV[1], "nx")
+end
+return redis.call("incr", KEYS[1])
+"""
+
+
+class MessageSeqCounter:
+    """Redis counters numbering the messages of write-behind mode
+
+    Messages get their seq when they are queued, so they can be sent right
+    away, and the flush persists it. A thread's counter is seeded from
+    ``Thread.last_seq`` the first time it is used, flushes keep
+    ``last_seq`` up to the counter. Counters have no expiry, a counter lost
+    while its messages are still buffered would hand their seqs out again.
+    Messages saved one by one, outside write-behind mode, move ``last_seq``
+    but not the counter.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._client = redis.Redis.from_url(settings.CHAT_SEQ_REDIS_URL)
+            self._script = self._client.register_script(NEXT_SEQ_SCRIPT)
+        return self._script
+
+    def key(self, thread_id):
+        return f"message_seq:{thread_id}"
+
+    def next(self, thread_id, seed=None):
+        """Next seq of a thread, None when unseeded and no seed is given"""
+        seq = self.script(
+            keys=[self.key(thread_id)], args=["" if seed is None else seed]
+        )
+        return None if seq is None else int(seq)
+
+    async def anext(self, thread_id):
+        """next() for async code, seeding the counter from the database"""
+        next_seq = sync_to_async(self.next, thread_sensitive=False)
+        seq = await next_seq(thread_id)
+        if seq is None:
+            last_seq = await database_sync_to_async(
+                models.Thread.objects.values_list("last_seq", flat=True).get
+            )(id=thread_id)
+            seq = await next_seq(thread_id, last_seq)
+        return seq
+
+
+message_seqs = MessageSeqCounter()
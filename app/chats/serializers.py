@@ -1,11 +1,40 @@
 import datetime
 
 from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
-from core.models import Message
+from core.models import Message, Thread, User
 from users.serializers import AllUserSerializer
 
+MESSAGE_ROW_FIELDS = (
+    "id",
+    "seq",
+    "thread_id",
+    "text",
+    "created_at",
+    "updated_at",
+    "is_bot",
+    "sender_id",
+    "sender__first_name",
+    "sender__last_name",
+    "sender__profile_picture",
+    "sender__profile_thumbnail_small",
+    "sender__profile_thumbnail_medium",
+    "sender__username",
+    "sender__created_on",
+)
+# Fields of a User serialized as a message sender
+SENDER_FIELDS = (
+    "first_name",
+    "last_name",
+    "profile_picture",
+    "profile_thumbnail_small",
+    "profile_thumbnail_medium",
+    "username",
+    "created_on",
+)
+
 
 class MessageSerializer(serializers.ModelSerializer):
     """Message model serializer"""
@@ -16,6 +45,7 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = (
             "id",
+            "seq",
             "thread",
             "sender",
             "text",
@@ -25,6 +55,7 @@ class MessageSerializer(serializers.ModelSerializer):
         )
         read_only_fields = (
             "id",
+            "seq",
             "thread",
             "sender",
             "text",
@@ -32,3 +63,144 @@ class MessageSerializer(serializers.ModelSerializer):
             "updated_at",
             "is_bot",
         )
+
+
+class ThreadSerializer(serializers.ModelSerializer):
+    """Inbox entry of a thread
+
+    Expects a queryset from ``Thread.objects.inbox`` and the fast path
+    serialized last messages keyed by id in the ``last_messages`` context.
+    """
+
+    users = AllUserSerializer(read_only=True, many=True)
+    last_message = serializers.SerializerMethodField()
+    unread_count = serializers.IntegerField(read_only=True)
+
+    class Meta(object):
+        model = Thread
+        fields = (
+            "id",
+            "name",
+            "thread_type",
+            "users",
+            "last_message",
+            "unread_count",
+            "created_at",
+        )
+        read_only_fields = fields
+
+    def get_last_message(self, obj):
+        return self.context["last_messages"].get(obj.last_message_id)
+
+
+def _file_url(name):
+    """Mirror the url representation of serializers.ImageField"""
+    if not name:
+        return None
+    return User._meta.get_field("profile_picture").storage.url(name)
+
+
+def _iso_datetime(value, tz):
+    """Mirror the ISO 8601 representation of serializers.DateTimeField"""
+    if not value:
+        return None
+    if tz is not None and timezone.is_aware(value):
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def serialize_message_rows(rows, with_senders=True):
+    """Read-only fast path producing the same data as MessageSerializer
+
+    ``rows`` are dicts from ``Message.objects.values(*MESSAGE_ROW_FIELDS)``,
+    which skips model instantiation and serializer field introspection.
+    Without senders the sender is left as its id, see attach_senders.
+    """
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    return [
+        {
+            "id": row["id"],
+            "seq": row["seq"],
+            "thread": row["thread_id"],
+            "sender": {
+                "first_name": row["sender__first_name"],
+                "last_name": row["sender__last_name"],
+                "profile_picture": _file_url(row["sender__profile_picture"]),
+                "profile_thumbnail_small": _file_url(
+                    row["sender__profile_thumbnail_small"]
+                ),
+                "profile_thumbnail_medium": _file_url(
+                    row["sender__profile_thumbnail_medium"]
+                ),
+                "username": row["sender__username"],
+                "created_on": _iso_datetime(row["sender__created_on"], tz),
+            }
+            if with_senders
+            else row["sender_id"],
+            "text": row["text"],
+            "created_at": _iso_datetime(row["created_at"], tz),
+            "updated_at": _iso_datetime(row["updated_at"], tz),
+            "is_bot": row["is_bot"],
+        }
+        for row in rows
+    ]
+
+
+def serialize_message(message, with_senders=True):
+    """Fast path serialization of a single saved Message instance"""
+    sender = message.sender
+    row = {
+        "id": message.id,
+        "seq": message.seq,
+        "thread_id": message.thread_id,
+        "text": message.text,
+        "created_at": message.created_at,
+        "updated_at": message.updated_at,
+        "is_bot": message.is_bot,
+        "sender_id": message.sender_id,
+        "sender__first_name": sender.first_name,
+        "sender__last_name": sender.last_name,
+        "sender__profile_picture": sender.profile_picture.name,
+        "sender__profile_thumbnail_small": sender.profile_thumbnail_small.name,
+        "sender__profile_thumbnail_medium": sender.profile_thumbnail_medium.name,
+        "sender__username": sender.username,
+        "sender__created_on": sender.created_on,
+    }
+    return serialize_message_rows([row], with_senders)[0]
+
+
+def attach_senders(messages_data):
+    """Fill in the senders of messages serialized without them
+
+    Senders are loaded in one query, messages of deleted senders dropped.
+    """
+    senders = User.objects.only(*SENDER_FIELDS).in_bulk(
+        {message_data["sender"] for message_data in messages_data}
+    )
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    senders_data = {
+        sender_id: {
+            "first_name": sender.first_name,
+            "last_name": sender.last_name,
+            "profile_picture": _file_url(sender.profile_picture.name),
+            "profile_thumbnail_small": _file_url(sender.profile_thumbnail_small.name),
+            "profile_thumbnail_medium": _file_url(sender.profile_thumbnail_medium.name),
+            "username": sender.username,
+            "created_on": _iso_datetime(sender.created_on, tz),
+        }
+        for sender_id, sender in senders.items()
+    }
+    return [
+        {**message_data, "sender": senders_data[message_data["sender"]]}
+        for message_data in messages_data
+        if message_data["sender"] in senders_data
+    ]
+
+
+class ThreadReadSerializer(serializers.Serializer):
+    """Body of a mark thread read request"""
+
+    message_id = serializers.IntegerField(required=False, min_value=1)
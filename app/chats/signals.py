@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from chats.middlewares import user_cache_key
+from core.models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the websocket auth cache entry of a saved or deleted user"""
+    caches[settings.WS_USER_CACHE].delete(user_cache_key(instance.id))
@@ -0,0 +1,97 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from chats.archive import archive_messages
+from core import models
+from core.helpers import sample_user
+from core.tests import utils
+
+CHATS_URL = reverse("chats:chats")
+
+
+class TestMessageArchive(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.client.force_authenticate(user=self.user_1)
+
+        first = utils.sample_create_message(user_1=self.user_1, user_2=self.user_2)
+        self.thread = first.thread
+        self.messages = [first] + [
+            models.Message.objects.create(
+                thread=self.thread,
+                sender=self.user_2 if i % 2 else self.user_1,
+                text=f"reply {i}",
+            )
+            for i in range(6)
+        ]
+        # The first four messages are a year old
+        old = timezone.now() - datetime.timedelta(days=365)
+        for i, message in enumerate(self.messages[:4]):
+            models.Message.objects.filter(id=message.id).update(
+                created_at=old + datetime.timedelta(minutes=i)
+            )
+        self.cutoff = timezone.now() - datetime.timedelta(days=30)
+
+    def get_history(self, **params):
+        response = self.client.get(
+            CHATS_URL, {"other_username": self.user_2.username, **params}
+        )
+        return response.data
+
+    def test_archive_moves_old_messages(self) -> None:
+        """Test archiving moves old messages into compressed blocks"""
+        archived = archive_messages(self.cutoff, block_size=3)
+
+        self.assertEqual(archived, 4)
+        self.assertEqual(
+            list(models.Message.objects.values_list("id", flat=True).order_by("id")),
+            [message.id for message in self.messages[4:]],
+        )
+        blocks = models.MessageArchive.objects.order_by("first_created_at")
+        self.assertEqual([block.message_count for block in blocks], [3, 1])
+        self.thread.refresh_from_db()
+        self.assertEqual(self.thread.archived_count, 4)
+
+    def test_history_skips_archive_of_threads_without_one(self) -> None:
+        """Test short pages of never archived threads don't query the archive"""
+        with CaptureQueriesContext(connection) as queries:
+            history = self.get_history(limit=10)
+
+        self.assertEqual(len(history), 7)
+        self.assertFalse(
+            any("core_messagearchive" in query["sql"] for query in queries)
+        )
+
+    def test_history_is_unchanged_by_archiving(self) -> None:
+        """Test the history endpoint serves archived messages as before"""
+        before_archiving = self.get_history(limit=10)
+
+        archive_messages(self.cutoff, block_size=3)
+
+        self.assertEqual(self.get_history(limit=10), before_archiving)
+        self.assertEqual(
+            [message["id"] for message in self.get_history(limit=4)],
+            [message.id for message in self.messages[3:]],
+        )
+
+    def test_cursors_page_through_archived_messages(self) -> None:
+        """Test before and after cursors work on archived messages"""
+        archive_messages(self.cutoff, block_size=3)
+        ids = [message.id for message in self.messages]
+
+        page = self.get_history(before=ids[5], limit=3)
+        self.assertEqual([message["id"] for message in page], ids[2:5])
+
+        page = self.get_history(before=ids[2], limit=3)
+        self.assertEqual([message["id"] for message in page], ids[:2])
+
+        page = self.get_history(after=ids[1], limit=3)
+        self.assertEqual([message["id"] for message in page], ids[2:5])
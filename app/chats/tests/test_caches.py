@@ -0,0 +1,127 @@
+import asyncio
+import unittest
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from chats.caches import recent_messages
+from chats.serializers import (MESSAGE_ROW_FIELDS, attach_senders,
+                               serialize_message_rows)
+from chats.tests.test_chats_api import CHATS_URL
+from chats.tests.test_consumers import (IN_MEMORY_CHANNEL_LAYERS,
+                                        get_communicator, receive_message,
+                                        redis_available)
+from core import models
+from core.helpers import sample_user
+
+
+@unittest.skipUnless(redis_available(), "Redis is not available")
+@override_settings(
+    CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, RECENT_MESSAGES_CACHE_SIZE=5
+)
+class TestRecentMessagesCache(TransactionTestCase):
+    def setUp(self) -> None:
+        self.clear_cache()
+        self.client = APIClient()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.client.force_authenticate(user=self.user_1)
+
+    def tearDown(self) -> None:
+        self.clear_cache()
+
+    def clear_cache(self):
+        for key in recent_messages.client.scan_iter(recent_messages.key("*")):
+            recent_messages.client.delete(key)
+
+    def get_db_messages(self, thread):
+        rows = (
+            models.Message.objects.filter(thread=thread)
+            .order_by("-created_at", "-id")
+            .values(*MESSAGE_ROW_FIELDS)[:5]
+        )
+        return serialize_message_rows(list(rows)[::-1])
+
+    def test_history_is_served_from_cache_after_a_miss(self) -> None:
+        """Test a second GET is served from the cache with the same data"""
+        params = {"other_username": self.user_2.username, "limit": 5}
+
+        self.client.post(CHATS_URL, {"other_username": self.user_2.username})
+        first_response = self.client.get(CHATS_URL, params)
+        thread = models.Thread.objects.get()
+        self.assertIsNotNone(recent_messages.get(thread.id))
+
+        # The senders are the only data read from the database
+        with self.assertNumQueries(4):
+            second_response = self.client.get(CHATS_URL, params)
+
+        self.assertEqual(first_response.data, second_response.data)
+        self.assertEqual(second_response.data, self.get_db_messages(thread))
+
+    def test_cached_history_shows_sender_changes(self) -> None:
+        """Test a sender's profile change shows in history served from cache"""
+        params = {"other_username": self.user_2.username, "limit": 5}
+        self.client.post(CHATS_URL, {"other_username": self.user_2.username})
+        self.client.get(CHATS_URL, params)
+
+        models.User.objects.filter(id=self.user_1.id).update(
+            first_name="Renamed", profile_thumbnail_small="thumbnails/new.jpg"
+        )
+        response = self.client.get(CHATS_URL, params)
+
+        sender = response.data[0]["sender"]
+        self.assertEqual(sender["first_name"], "Renamed")
+        self.assertTrue(
+            sender["profile_thumbnail_small"].endswith("thumbnails/new.jpg")
+        )
+        self.assertEqual(
+            response.data, self.get_db_messages(models.Thread.objects.get())
+        )
+
+    def test_cache_matches_database_after_concurrent_writes(self) -> None:
+        """Test the cached page equals the database after concurrent sends"""
+
+        async def run():
+            sockets = [
+                get_communicator(self.user_1, self.user_2.username),
+                get_communicator(self.user_2, self.user_1.username),
+            ]
+            for socket in sockets:
+                await socket.connect()
+
+            await asyncio.gather(
+                *(
+                    socket.send_to(text_data=f"message {i}")
+                    for i in range(10)
+                    for socket in sockets
+                )
+            )
+            for socket in sockets:
+                for _ in range(20):
+                    await receive_message(socket)
+                await socket.disconnect()
+
+        self.client.post(CHATS_URL, {"other_username": self.user_2.username})
+        self.client.get(CHATS_URL, {"other_username": self.user_2.username, "limit": 5})
+        async_to_sync(run)()
+
+        thread = models.Thread.objects.get()
+        self.assertEqual(models.Message.objects.filter(thread=thread).count(), 21)
+        self.assertEqual(
+            attach_senders(recent_messages.get(thread.id)), self.get_db_messages(thread)
+        )
+
+    def test_cache_is_trimmed_to_size(self) -> None:
+        """Test the cache only keeps the configured number of messages"""
+        thread, _ = models.Thread.objects.get_or_create_personal_thread(
+            self.user_1, self.user_2
+        )
+        recent_messages.fill(thread.id, [])
+        for i in range(8):
+            recent_messages.append(thread.id, {"id": i, "text": f"message {i}"})
+
+        self.assertEqual(
+            [message["id"] for message in recent_messages.get(thread.id)],
+            [3, 4, 5, 6, 7],
+        )
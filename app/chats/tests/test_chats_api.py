@@ -1,4 +1,8 @@
-from django.test import TestCase
+import unittest
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -6,9 +10,16 @@ from rest_framework.test import APIClient
 from chats.serializers import MessageSerializer
 from core import models
 from core.helpers import sample_user
+from core.ratelimit import rate_limiter
 from core.tests import utils
 
 CHATS_URL = reverse("chats:chats")
+THREADS_URL = reverse("chats:threads")
+SEARCH_URL = reverse("chats:search")
+
+
+def get_thread_read_url(id):
+    return reverse("chats:thread_read", args=[id])
 
 
 class TestChatView(TestCase):
@@ -34,3 +45,296 @@ class TestChatView(TestCase):
 
         self.assertEquals(response.status_code, status.HTTP_200_OK)
         self.assertEquals(response.data, serializer.data)
+
+    def test_get_unknown_thread_does_not_create_it(self) -> None:
+        """Test GET of a thread that does not exist is a 404 without writes"""
+        user_3 = sample_user(username="third_user")
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(CHATS_URL, {"other_username": user_3.username})
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEquals(models.Thread.objects.count(), 1)
+
+    def test_post_creates_thread_once(self) -> None:
+        """Test POST creates the thread with a bot message idempotently"""
+        user_3 = sample_user(username="third_user")
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.post(CHATS_URL, {"other_username": user_3.username})
+
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(len(response.data), 1)
+        self.assertTrue(response.data[0]["is_bot"])
+
+        response = self.client.post(CHATS_URL, {"other_username": user_3.username})
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.data), 1)
+        self.assertEquals(models.Thread.objects.count(), 2)
+
+    def test_get_honours_if_none_match(self) -> None:
+        """Test GET answers 304 until a new message changes the ETag"""
+        self.client.force_authenticate(user=self.user_1)
+        params = {"other_username": self.user_2.username}
+
+        response = self.client.get(CHATS_URL, params)
+        etag = response["ETag"]
+
+        response = self.client.get(CHATS_URL, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        models.Message.objects.create(
+            thread=self.message.thread, sender=self.user_2, text="news"
+        )
+        response = self.client.get(CHATS_URL, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotEquals(response["ETag"], etag)
+
+    def test_get_messages_returns_latest_page(self) -> None:
+        """Test GET returns only the latest `limit` messages in order"""
+        for i in range(5):
+            models.Message.objects.create(
+                thread=self.message.thread, sender=self.user_2, text=f"reply {i}"
+            )
+
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(
+            CHATS_URL, {"other_username": self.user_2.username, "limit": 3}
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [message["text"] for message in response.data],
+            ["reply 2", "reply 3", "reply 4"],
+        )
+
+    def test_get_messages_before_and_after_cursor(self) -> None:
+        """Test GET pages backwards with before and forwards with after"""
+        replies = [
+            models.Message.objects.create(
+                thread=self.message.thread, sender=self.user_2, text=f"reply {i}"
+            )
+            for i in range(4)
+        ]
+
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(
+            CHATS_URL,
+            {
+                "other_username": self.user_2.username,
+                "before": replies[2].id,
+                "limit": 2,
+            },
+        )
+        self.assertEquals(
+            [message["id"] for message in response.data],
+            [replies[0].id, replies[1].id],
+        )
+
+        response = self.client.get(
+            CHATS_URL,
+            {
+                "other_username": self.user_2.username,
+                "after": self.message.id,
+                "limit": 2,
+            },
+        )
+        self.assertEquals(
+            [message["id"] for message in response.data],
+            [replies[0].id, replies[1].id],
+        )
+
+    def test_get_messages_invalid_limit(self) -> None:
+        """Test GET with a non positive limit fails"""
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(
+            CHATS_URL, {"other_username": self.user_2.username, "limit": 0}
+        )
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_messages_query_count_is_constant(self) -> None:
+        """Test GET cost in queries does not grow with the number of messages"""
+        self.client.force_authenticate(user=self.user_1)
+        params = {"other_username": self.user_2.username}
+
+        with CaptureQueriesContext(connection) as single_message_queries:
+            self.client.get(CHATS_URL, params)
+
+        for i in range(10):
+            models.Message.objects.create(
+                thread=self.message.thread,
+                sender=self.user_2 if i % 2 else self.user_1,
+                text=f"reply {i}",
+            )
+
+        with CaptureQueriesContext(connection) as many_messages_queries:
+            response = self.client.get(CHATS_URL, params)
+
+        self.assertEquals(len(response.data), 11)
+        self.assertEquals(len(many_messages_queries), len(single_message_queries))
+
+    @override_settings(RATE_LIMITS={"chats": "1/2"})
+    def test_requests_over_rate_limit_are_throttled(self) -> None:
+        """Test a user past the chats limit gets a structured 429"""
+        rate_limiter.local.clear()
+        self.client.force_authenticate(user=self.user_1)
+        params = {"other_username": self.user_2.username}
+
+        for _ in range(2):
+            response = self.client.get(CHATS_URL, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(CHATS_URL, params)
+        rate_limiter.local.clear()
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response.data["code"], "throttled")
+        self.assertEqual(response.data["retry_after"], 1)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class TestThreadListView(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.user_3 = sample_user(username="third_user")
+        self.client.force_authenticate(user=self.user_1)
+
+        self.message = utils.sample_create_message(
+            user_1=self.user_1, user_2=self.user_2
+        )
+        self.reply = models.Message.objects.create(
+            thread=self.message.thread, sender=self.user_2, text="hi there"
+        )
+
+    def test_get_threads_with_last_message_and_unread_count(self) -> None:
+        """Test GET inbox returns threads with last message and unread count"""
+        response = self.client.get(THREADS_URL)
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.data), 1)
+        thread = response.data[0]
+        self.assertEquals(thread["id"], self.message.thread.id)
+        self.assertEquals(thread["last_message"]["id"], self.reply.id)
+        self.assertEquals(thread["last_message"]["text"], "hi there")
+        self.assertEquals(thread["unread_count"], 1)
+
+    def test_get_threads_query_count_is_constant(self) -> None:
+        """Test GET inbox cost in queries does not grow with the threads"""
+        with CaptureQueriesContext(connection) as single_thread_queries:
+            self.client.get(THREADS_URL)
+
+        other_message = utils.sample_create_message(
+            user_1=self.user_3, user_2=self.user_1
+        )
+
+        with CaptureQueriesContext(connection) as two_threads_queries:
+            response = self.client.get(THREADS_URL)
+
+        self.assertEquals(response.data[0]["id"], other_message.thread.id)
+        self.assertEquals(len(two_threads_queries), len(single_thread_queries))
+
+    def test_mark_thread_read_resets_unread_count(self) -> None:
+        """Test POST read marks the thread read up to the latest message"""
+        response = self.client.post(get_thread_read_url(self.message.thread.id))
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data["last_read_message"], self.reply.id)
+
+        response = self.client.get(THREADS_URL)
+        self.assertEquals(response.data[0]["unread_count"], 0)
+
+    def test_mark_thread_read_rejects_invalid_message_id(self) -> None:
+        """Test POST read with a message_id that is not an id returns 400"""
+        for message_id in ("latest", "1.5", -1):
+            response = self.client.post(
+                get_thread_read_url(self.message.thread.id),
+                {"message_id": message_id},
+            )
+
+            self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn("message_id", response.data)
+
+    def test_mark_thread_read_of_other_users_thread_fails(self) -> None:
+        """Test POST read on a thread the user is not in returns 404"""
+        other_message = utils.sample_create_message(
+            user_1=self.user_2, user_2=self.user_3
+        )
+
+        response = self.client.post(get_thread_read_url(other_message.thread.id))
+
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestMessageSearchView(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.user_3 = sample_user(username="third_user")
+        self.client.force_authenticate(user=self.user_1)
+
+        self.message = utils.sample_create_message(
+            user_1=self.user_1, user_2=self.user_2
+        )
+
+    def test_search_without_q_fails(self) -> None:
+        """Test GET search without q returns 400"""
+        response = self.client.get(SEARCH_URL)
+
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql", "Full-text search needs PostgreSQL"
+    )
+    def test_search_returns_ranked_hits_in_own_threads(self) -> None:
+        """Test GET search ranks hits and ignores threads of other users"""
+        thread = self.message.thread
+        models.Message.objects.create(
+            thread=thread, sender=self.user_2, text="Lunch at the harbour?"
+        )
+        best = models.Message.objects.create(
+            thread=thread, sender=self.user_1, text="Harbour lunch, harbour walk"
+        )
+        other_thread = utils.sample_create_thread(
+            user_1=self.user_2, user_2=self.user_3
+        )
+        models.Message.objects.create(
+            thread=other_thread, sender=self.user_3, text="harbour secrets"
+        )
+
+        response = self.client.get(SEARCH_URL, {"q": "harbours", "limit": 1})
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.data["next_offset"], 1)
+        hit = response.data["results"][0]
+        self.assertEquals(hit["id"], best.id)
+        self.assertIn("<b>Harbour</b>", hit["headline"])
+
+        response = self.client.get(SEARCH_URL, {"q": "harbours", "offset": 1})
+
+        self.assertEquals(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next_offset"])
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql", "Full-text search needs PostgreSQL"
+    )
+    def test_search_headline_escapes_message_html(self) -> None:
+        """Test markup written in a message never reaches the headline"""
+        models.Message.objects.create(
+            thread=self.message.thread,
+            sender=self.user_2,
+            text="harbour <img src=x onerror=alert(1)> a < b harbour",
+        )
+
+        response = self.client.get(SEARCH_URL, {"q": "harbour"})
+
+        headline = response.data["results"][0]["headline"]
+        self.assertNotIn("<img", headline)
+        self.assertIn("a &lt; b <b>harbour</b>", headline)
+        self.assertTrue(headline.startswith("<b>harbour</b>"))
@@ -0,0 +1,551 @@
+import json
+import unittest
+from unittest.mock import DEFAULT, AsyncMock, Mock, patch
+
+import msgpack
+import redis
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import OperationalError
+from django.test import TransactionTestCase, override_settings
+
+from app.routing import websocket_urlpatterns
+from chats.batching import room_batcher
+from chats.buffers import MessageWriteBuffer, message_buffer
+from chats.caches import recent_messages
+from chats.codecs import MSGPACK_SUBPROTOCOL, pack_frame
+from chats.sequences import message_seqs
+from core import models
+from core.helpers import sample_user
+from core.routers import is_pinned_to_primary, pin_cache
+
+IN_MEMORY_CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+}
+
+
+def get_communicator(user, other_username, query="", subprotocols=None):
+    """Build a websocket communicator with an already authenticated user"""
+    communicator = WebsocketCommunicator(
+        URLRouter(websocket_urlpatterns),
+        f"ws/chat/{other_username}/{query}",
+        subprotocols=subprotocols,
+    )
+    communicator.scope["user"] = user
+    return communicator
+
+
+def redis_available():
+    try:
+        return recent_messages.client.ping()
+    except redis.RedisError:
+        return False
+
+
+async def receive_message(communicator):
+    """Receive the next chat message, skipping typing and presence frames"""
+    while True:
+        data = json.loads(await communicator.receive_from())
+        if "type" not in data:
+            return data
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestChatConsumer(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+
+    def personal_thread(self):
+        """The thread of both users, with a fresh seq counter"""
+        thread, _ = models.Thread.objects.get_or_create_personal_thread(
+            self.user_1, self.user_2
+        )
+        message_seqs.script
+        message_seqs._client.delete(message_seqs.key(thread.id))
+        return thread
+
+    def unsaved_messages(self, *texts):
+        thread, _ = models.Thread.objects.get_or_create_personal_thread(
+            self.user_1, self.user_2
+        )
+        return [
+            models.Message(thread=thread, sender=self.user_1, text=text, seq=seq)
+            for seq, text in enumerate(texts, start=1)
+        ]
+
+    def test_message_is_broadcast_to_both_users_and_stored(self) -> None:
+        """Test a message sent by one user reaches both sockets and is stored"""
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            receiver = get_communicator(self.user_2, self.user_1.username)
+            connected, _ = await sender.connect()
+            self.assertTrue(connected)
+            connected, _ = await receiver.connect()
+            self.assertTrue(connected)
+
+            await sender.send_to(text_data="hello")
+
+            expected = {"text": "hello", "username": self.user_1.username, "seq": 1}
+            self.assertEqual(await receive_message(sender), expected)
+            self.assertEqual(await receive_message(receiver), expected)
+
+            await sender.disconnect()
+            await receiver.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(models.Thread.objects.count(), 1)
+        message = models.Message.objects.get()
+        self.assertEqual(message.text, "hello")
+        self.assertEqual(message.sender, self.user_1)
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    @override_settings(REPLICA_DATABASES=["replica_0"])
+    def test_sender_is_pinned_once_message_is_stored(self) -> None:
+        """Test senders read from the primary after storing a message"""
+        self.personal_thread()
+        for write_behind in (False, True):
+            pin_cache().clear()
+            with self.settings(
+                CHAT_WRITE_BEHIND=write_behind, CHAT_WRITE_BEHIND_BATCH_SIZE=1
+            ):
+
+                async def run():
+                    sender = get_communicator(self.user_1, self.user_2.username)
+                    await sender.connect()
+                    await sender.send_to(text_data="hello")
+                    await receive_message(sender)
+                    await sender.disconnect()
+
+                async_to_sync(run)()
+
+            self.assertTrue(is_pinned_to_primary(self.user_1))
+            self.assertFalse(is_pinned_to_primary(self.user_2))
+
+    def test_msgpack_subprotocol(self) -> None:
+        """Test a socket offering MessagePack sends and receives binary frames"""
+
+        async def run():
+            sender = get_communicator(
+                self.user_1, self.user_2.username, subprotocols=[MSGPACK_SUBPROTOCOL]
+            )
+            receiver = get_communicator(self.user_2, self.user_1.username)
+            connected, subprotocol = await sender.connect()
+            self.assertEqual(subprotocol, MSGPACK_SUBPROTOCOL)
+            await receiver.connect()
+
+            presence = msgpack.unpackb(await sender.receive_from())
+            self.assertEqual(presence["type"], "presence")
+            await sender.send_to(bytes_data=msgpack.packb("hello"))
+
+            expected = {"text": "hello", "username": self.user_1.username, "seq": 1}
+            self.assertEqual(await receive_message(receiver), expected)
+            while True:
+                data = msgpack.unpackb(await sender.receive_from())
+                if "type" not in data:
+                    break
+            self.assertEqual(data, expected)
+
+            await sender.disconnect()
+            await receiver.disconnect()
+
+        async_to_sync(run)()
+
+    def test_msgpack_frame_is_packed_once_for_all_sockets(self) -> None:
+        """Test a room frame is packed once however many sockets get it"""
+        pack_frame.cache_clear()
+        packb = Mock(wraps=msgpack.packb)
+
+        async def run():
+            sockets = [
+                get_communicator(
+                    user, other.username, subprotocols=[MSGPACK_SUBPROTOCOL]
+                )
+                for user, other in (
+                    (self.user_1, self.user_2),
+                    (self.user_2, self.user_1),
+                    (self.user_2, self.user_1),
+                )
+            ]
+            for socket in sockets:
+                await socket.connect()
+            await sockets[0].send_to(bytes_data=msgpack.packb("hello"))
+            for socket in sockets:
+                while "type" in msgpack.unpackb(await socket.receive_from()):
+                    pass
+                await socket.disconnect()
+
+        with patch("chats.codecs.msgpack.packb", packb):
+            async_to_sync(run)()
+
+        packed = [call.args[0] for call in packb.call_args_list]
+        self.assertEqual(
+            [data for data in packed if isinstance(data, dict) and "text" in data],
+            [{"text": "hello", "username": self.user_1.username, "seq": 1}],
+        )
+
+    @override_settings(CHAT_BATCH_WINDOW=0.2)
+    def test_frames_sent_close_together_are_batched(self) -> None:
+        """Test messages within the batch window reach sockets as one frame"""
+        room_batcher.pending.clear()
+        room_batcher.stats.reset()
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            await sender.connect()
+            for text in ("one", "two", "three"):
+                await sender.send_to(text_data=text)
+
+            while True:
+                data = json.loads(await sender.receive_from())
+                if data.get("type") == "batch":
+                    break
+            await sender.disconnect()
+            return data["frames"]
+
+        frames = async_to_sync(run)()
+
+        self.assertEqual(
+            [(frame["seq"], frame["text"]) for frame in frames],
+            [(1, "one"), (2, "two"), (3, "three")],
+        )
+        # The batch may also hold the presence event of the sender
+        self.assertEqual(room_batcher.stats.batches, 1)
+        self.assertGreaterEqual(room_batcher.stats.max_size, 3)
+
+    @override_settings(CHAT_BATCH_WINDOW=0.01)
+    def test_failed_batch_is_logged_and_not_counted(self) -> None:
+        """Test a batch the channel layer refuses is logged, not counted sent"""
+        room_batcher.pending.clear()
+        room_batcher.stats.reset()
+        channel_layer = Mock(group_send=AsyncMock(side_effect=ChannelFull))
+
+        async def run():
+            await room_batcher.send(channel_layer, "room", "one")
+            await room_batcher.timers["room"]
+
+        with self.assertLogs("chats.batching", "ERROR"):
+            async_to_sync(run)()
+
+        channel_layer.group_send.assert_awaited_once()
+        self.assertEqual(room_batcher.stats.batches, 0)
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    @override_settings(
+        CHAT_WRITE_BEHIND=True,
+        CHAT_WRITE_BEHIND_BATCH_SIZE=2,
+        CHAT_WRITE_BEHIND_FLUSH_INTERVAL=60,
+    )
+    def test_write_behind_sends_before_storing(self) -> None:
+        """Test write-behind mode sends messages at once and stores them in order"""
+        self.personal_thread()
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            receiver = get_communicator(self.user_2, self.user_1.username)
+            await sender.connect()
+            await receiver.connect()
+
+            await sender.send_to(text_data="one")
+            message = await receive_message(receiver)
+            self.assertEqual((message["text"], message["seq"]), ("one", 1))
+            self.assertFalse(
+                await database_sync_to_async(models.Message.objects.exists)()
+            )
+
+            for text, seq in (("two", 2), ("three", 3)):
+                await sender.send_to(text_data=text)
+                message = await receive_message(receiver)
+                self.assertEqual((message["text"], message["seq"]), (text, seq))
+            await sender.disconnect()
+            await receiver.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(
+            list(models.Message.objects.order_by("id").values_list("text", "seq")),
+            [("one", 1), ("two", 2), ("three", 3)],
+        )
+
+    @unittest.skipUnless(redis_available(), "Redis is not available")
+    def test_seq_counter_starts_after_last_seq(self) -> None:
+        """Test a thread's seq counter is seeded from its stored messages"""
+        thread = self.personal_thread()
+        models.Message.objects.create(thread=thread, sender=self.user_1, text="one")
+
+        seqs = [async_to_sync(message_seqs.anext)(thread.id) for _ in range(2)]
+
+        self.assertEqual(seqs, [2, 3])
+
+    @override_settings(CHAT_WRITE_BEHIND_FLUSH_INTERVAL=60)
+    def test_failed_flush_keeps_seqs(self) -> None:
+        """Test a retried flush stores the seqs the messages were sent with"""
+        buffer = MessageWriteBuffer()
+        bulk_create = Mock(
+            side_effect=[OperationalError, DEFAULT],
+            wraps=models.Message.objects.bulk_create,
+        )
+        messages = self.unsaved_messages("one", "two")
+
+        async def run():
+            for message in messages:
+                await buffer.add(message)
+            buffer._timer.cancel()
+            with self.assertRaises(OperationalError):
+                await buffer.flush()
+            await buffer.flush()
+
+        with patch.object(models.Message.objects, "bulk_create", bulk_create):
+            with self.assertLogs("chats.buffers", "ERROR"):
+                async_to_sync(run)()
+
+        self.assertEqual(
+            list(models.Message.objects.order_by("id").values_list("text", "seq")),
+            [("one", 1), ("two", 2)],
+        )
+        self.assertEqual(models.Thread.objects.get().last_seq, 2)
+
+    @override_settings(CHAT_WRITE_BEHIND_FLUSH_INTERVAL=0.01)
+    def test_failed_timed_flush_is_retried(self) -> None:
+        """Test a timed flush that fails is logged and retried later"""
+        buffer = MessageWriteBuffer()
+        bulk_create = Mock(side_effect=[OperationalError, OperationalError, []])
+        (message,) = self.unsaved_messages("one")
+
+        async def run():
+            await buffer.add(message)
+            await buffer._timer
+
+        with patch.object(models.Message.objects, "bulk_create", bulk_create):
+            with self.assertLogs("chats.buffers", "ERROR") as logs:
+                async_to_sync(run)()
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertEqual(buffer.pending, [])
+
+    @override_settings(
+        CHAT_WRITE_BEHIND_FLUSH_INTERVAL=60, CHAT_WRITE_BEHIND_MAX_PENDING=2
+    )
+    def test_full_buffer_flushes_before_queueing(self) -> None:
+        """Test senders get the flush error once too many messages are pending"""
+        buffer = MessageWriteBuffer()
+        bulk_create = Mock(side_effect=OperationalError)
+        messages = self.unsaved_messages("one", "two")
+
+        async def run():
+            for message in messages:
+                await buffer.add(message)
+            try:
+                with self.assertRaises(OperationalError):
+                    await buffer.wait_for_room()
+            finally:
+                buffer._timer.cancel()
+
+        with patch.object(models.Message.objects, "bulk_create", bulk_create):
+            with self.assertLogs("chats.buffers", "ERROR"):
+                async_to_sync(run)()
+
+        self.assertEqual([message.text for message in buffer.pending], ["one", "two"])
+
+    @override_settings(CHAT_WRITE_BEHIND=True, CHAT_WRITE_BEHIND_MAX_PENDING=1)
+    def test_message_not_stored_is_answered_with_error(self) -> None:
+        """Test a message the full buffer cannot take is refused, socket kept"""
+        bulk_create = Mock(side_effect=OperationalError)
+        message_buffer.pending[:] = self.unsaved_messages("queued")
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            await sender.connect()
+            await sender.send_to(text_data="hello")
+            self.assertEqual(
+                await receive_json(sender, "error"),
+                {"type": "error", "code": "not_stored"},
+            )
+            self.assertTrue(await sender.receive_nothing())
+            await sender.disconnect()
+
+        try:
+            with patch.object(models.Message.objects, "bulk_create", bulk_create):
+                with self.assertLogs("chats.buffers", "ERROR"):
+                    async_to_sync(run)()
+        finally:
+            message_buffer.pending.clear()
+
+        self.assertFalse(models.Message.objects.exists())
+
+    @override_settings(
+        RATE_LIMITS={"chat_socket": "1/2", "chat_user": ""},
+        CHAT_THROTTLE_CLOSE_AFTER=3,
+    )
+    def test_frames_over_rate_limit_are_dropped_then_socket_closed(self) -> None:
+        """Test throttled frames are reported once, dropped and end the socket"""
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            await sender.connect()
+            for text in ("one", "two"):
+                await sender.send_to(text_data=text)
+                await receive_message(sender)
+
+            await sender.send_to(text_data="three")
+            error = await receive_json(sender, "error")
+            self.assertEqual(error["code"], "throttled")
+            self.assertGreater(error["retry_after"], 0)
+
+            # Acks are never throttled nor counted
+            await sender.send_to(text_data=json.dumps({"type": "ack", "seq": 2}))
+            await sender.send_to(text_data="four")
+            self.assertTrue(await sender.receive_nothing())
+            await sender.send_to(text_data="five")
+            output = await sender.receive_output()
+            self.assertEqual(output, {"type": "websocket.close", "code": 1008})
+            await sender.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(
+            list(models.Message.objects.values_list("text", flat=True)),
+            ["one", "two"],
+        )
+
+
+async def receive_json(communicator, frame_type):
+    """Receive frames until one of the given control type"""
+    while True:
+        data = json.loads(await communicator.receive_from())
+        if data.get("type") == frame_type:
+            return data
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestResume(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+
+    async def send_messages(self, *texts):
+        sender = get_communicator(self.user_1, self.user_2.username)
+        await sender.connect()
+        for text in texts:
+            await sender.send_to(text_data=text)
+            await receive_message(sender)
+        await sender.disconnect()
+
+    async def replayed(self, query):
+        """Texts replayed to a reconnecting socket and its final control frame"""
+        communicator = get_communicator(self.user_2, self.user_1.username, query)
+        await communicator.connect()
+        texts = []
+        while True:
+            data = json.loads(await communicator.receive_from())
+            if data.get("type") in ("resumed", "resync"):
+                await communicator.disconnect()
+                return texts, data
+            if "type" not in data:
+                texts.append((data["seq"], data["text"]))
+
+    def test_resume_replays_missed_messages(self) -> None:
+        """Test reconnecting with resume replays only the missed delta"""
+
+        async def run():
+            await self.send_messages("one", "two", "three")
+            return await self.replayed("?resume=1")
+
+        texts, end = async_to_sync(run)()
+
+        self.assertEqual(texts, [(2, "two"), (3, "three")])
+        self.assertEqual(end, {"type": "resumed", "seq": 3})
+
+    @override_settings(CHAT_RESUME_MAX_MESSAGES=1)
+    def test_resume_far_behind_asks_to_resync(self) -> None:
+        """Test a client missing too many messages is told to refetch history"""
+
+        async def run():
+            await self.send_messages("one", "two", "three")
+            return await self.replayed("?resume=0")
+
+        texts, end = async_to_sync(run)()
+
+        self.assertEqual(texts, [])
+        self.assertEqual(end, {"type": "resync"})
+
+    def test_resume_after_acked_seq(self) -> None:
+        """Test acks are stored on disconnect and resumed from"""
+
+        async def run():
+            receiver = get_communicator(self.user_2, self.user_1.username)
+            await receiver.connect()
+            await self.send_messages("one", "two")
+            await receiver.send_to(text_data=json.dumps({"type": "ack", "seq": 2}))
+            await receiver.disconnect()
+
+            await self.send_messages("three")
+            return await self.replayed("?resume=acked")
+
+        texts, end = async_to_sync(run)()
+
+        self.assertEqual(texts, [(3, "three")])
+        self.assertEqual(end, {"type": "resumed", "seq": 3})
+        marker = models.ThreadReadMarker.objects.get(user=self.user_2)
+        self.assertEqual(marker.delivered_seq, 2)
+
+
+def get_group_communicator(user, thread):
+    """Build a group websocket communicator with an authenticated user"""
+    communicator = WebsocketCommunicator(
+        URLRouter(websocket_urlpatterns), f"ws/chat/group/{thread.id}/"
+    )
+    communicator.scope["user"] = user
+    return communicator
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestGroupChatConsumer(TransactionTestCase):
+    def setUp(self) -> None:
+        self.members = [sample_user(username=f"member_{i}") for i in range(3)]
+        self.outsider = sample_user(username="outsider")
+        self.thread = models.Thread.objects.create(name="team", thread_type="group")
+        self.thread.users.add(*self.members)
+
+    def test_message_is_broadcast_to_all_members(self) -> None:
+        """Test a group message reaches every connected member"""
+
+        async def run():
+            sockets = [
+                get_group_communicator(member, self.thread) for member in self.members
+            ]
+            for socket in sockets:
+                connected, _ = await socket.connect()
+                self.assertTrue(connected)
+
+            await sockets[0].send_to(text_data="hello team")
+
+            expected = {
+                "text": "hello team",
+                "username": self.members[0].username,
+                "seq": 1,
+            }
+            for socket in sockets:
+                self.assertEqual(await receive_message(socket), expected)
+                await socket.disconnect()
+
+        async_to_sync(run)()
+
+        message = models.Message.objects.get()
+        self.assertEqual(message.thread, self.thread)
+
+    def test_non_member_is_rejected(self) -> None:
+        """Test a user outside the group cannot connect"""
+
+        async def run():
+            socket = get_group_communicator(self.outsider, self.thread)
+            connected, _ = await socket.connect()
+            self.assertFalse(connected)
+
+        async_to_sync(run)()
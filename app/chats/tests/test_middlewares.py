@@ -0,0 +1,77 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app.routing import websocket_urlpatterns
+from chats.middlewares import TokenAuthMiddleware, user_cache_key
+from chats.tests.test_consumers import IN_MEMORY_CHANNEL_LAYERS
+from core.helpers import sample_user
+from core.models import User
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestTokenAuthMiddleware(TransactionTestCase):
+    def setUp(self) -> None:
+        cache.clear()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.middleware = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+    def connect(self, token):
+        async def run():
+            communicator = WebsocketCommunicator(
+                self.middleware, f"ws/chat/{self.user_2.username}/?token={token}"
+            )
+            connected, _ = await communicator.connect()
+            if connected:
+                await communicator.disconnect()
+            return connected
+
+        return async_to_sync(run)()
+
+    def test_valid_token_connects(self) -> None:
+        """Test a socket with a valid access token is accepted"""
+        self.assertTrue(self.connect(AccessToken.for_user(self.user_1)))
+
+    def test_invalid_token_is_rejected(self) -> None:
+        """Test a socket with an invalid token is never accepted"""
+        with self.assertRaises(asyncio.TimeoutError):
+            self.connect("invalid-token")
+
+    def test_user_is_cached_between_handshakes(self) -> None:
+        """Test resolving the same user twice only queries the database once"""
+        get_user = async_to_sync(self.middleware.get_user)
+
+        with self.assertNumQueries(1):
+            first = get_user(id=self.user_1.id)
+            second = get_user(id=self.user_1.id)
+
+        self.assertEqual(first, self.user_1)
+        self.assertEqual(second, self.user_1)
+
+    def test_saving_user_invalidates_cache(self) -> None:
+        """Test saving a user drops its cached websocket entry"""
+        async_to_sync(self.middleware.get_user)(id=self.user_1.id)
+        self.assertIsNotNone(cache.get(user_cache_key(self.user_1.id)))
+
+        self.user_1.is_active = False
+        self.user_1.save()
+
+        self.assertIsNone(cache.get(user_cache_key(self.user_1.id)))
+
+    def test_inactive_user_is_rejected(self) -> None:
+        """Test a deactivated user with a still valid token gets no socket"""
+        token = AccessToken.for_user(self.user_1)
+        self.assertTrue(self.connect(token))
+
+        # A queryset update skips the cache invalidation
+        User.objects.filter(id=self.user_1.id).update(is_active=False)
+        cache.clear()
+
+        with self.assertRaises(asyncio.TimeoutError):
+            self.connect(token)
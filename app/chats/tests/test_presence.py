@@ -0,0 +1,122 @@
+import json
+import unittest
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase, override_settings
+
+from chats.presence import presence
+from chats.tests.test_caches import redis_available
+from chats.tests.test_consumers import (IN_MEMORY_CHANNEL_LAYERS,
+                                        get_communicator, receive_message)
+from core import models
+from core.helpers import sample_user
+
+
+async def receive_frames_until_message(communicator):
+    """Collect control frames received before the next chat message"""
+    frames = []
+    while True:
+        data = json.loads(await communicator.receive_from())
+        if "type" not in data:
+            return frames
+        frames.append(data)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestTypingEvents(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+
+    def test_typing_is_throttled_relayed_and_not_stored(self) -> None:
+        """Test typing frames reach the other user once and are not stored"""
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            receiver = get_communicator(self.user_2, self.user_1.username)
+            await sender.connect()
+            await receiver.connect()
+
+            typing = json.dumps({"type": "typing"})
+            await sender.send_to(text_data=typing)
+            await sender.send_to(text_data=typing)
+            await sender.send_to(text_data="hello")
+
+            sender_frames = await receive_frames_until_message(sender)
+            receiver_frames = await receive_frames_until_message(receiver)
+            await sender.disconnect()
+            await receiver.disconnect()
+            return sender_frames, receiver_frames
+
+        sender_frames, receiver_frames = async_to_sync(run)()
+
+        typing_frames = [f for f in receiver_frames if f["type"] == "typing"]
+        self.assertEqual(typing_frames, [{"type": "typing", "username": "test_user"}])
+        self.assertNotIn("typing", [f["type"] for f in sender_frames])
+        self.assertEqual(
+            list(models.Message.objects.values_list("text", flat=True)), ["hello"]
+        )
+
+
+@unittest.skipUnless(redis_available(), "Redis is not available")
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestPresence(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        for user in (self.user_1, self.user_2):
+            presence.client.delete(presence.key(user.id))
+
+    def test_presence_follows_connect_and_disconnect(self) -> None:
+        """Test users see each other come online and go offline"""
+
+        async def run():
+            first = get_communicator(self.user_1, self.user_2.username)
+            await first.connect()
+            self.assertEqual(
+                json.loads(await first.receive_from()),
+                {
+                    "type": "presence",
+                    "users": {"test_user": True, "another_user": False},
+                },
+            )
+
+            second = get_communicator(self.user_2, self.user_1.username)
+            await second.connect()
+            self.assertEqual(
+                json.loads(await second.receive_from()),
+                {
+                    "type": "presence",
+                    "users": {"test_user": True, "another_user": True},
+                },
+            )
+            self.assertEqual(
+                json.loads(await first.receive_from()),
+                {"type": "presence", "users": {"another_user": True}},
+            )
+
+            await second.disconnect()
+            self.assertEqual(
+                json.loads(await first.receive_from()),
+                {"type": "presence", "users": {"another_user": False}},
+            )
+            await first.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(presence.online([self.user_1.id, self.user_2.id]), set())
+
+    def test_heartbeat_is_not_stored_as_message(self) -> None:
+        """Test heartbeat frames refresh presence without storing anything"""
+
+        async def run():
+            socket = get_communicator(self.user_1, self.user_2.username)
+            await socket.connect()
+            await socket.send_to(text_data=json.dumps({"type": "heartbeat"}))
+            await socket.send_to(text_data="hello")
+            await receive_message(socket)
+            await socket.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(models.Message.objects.count(), 1)
@@ -0,0 +1,80 @@
+import time
+
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from chats.serializers import (MESSAGE_ROW_FIELDS, MessageSerializer,
+                               serialize_message_rows)
+from core import models
+from core.helpers import sample_user
+from core.tests import utils
+
+
+def best_rate(serialize, count, repeat=3):
+    """Best rows/second of `serialize` over a few runs"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize()
+        timings.append(time.perf_counter() - started)
+    return count / min(timings)
+
+
+class TestSerializeMessageRows(TestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user", first_name="Jane")
+        models.User.objects.filter(id=self.user_2.id).update(
+            profile_picture="uploads/images/avatar.jpg", last_name=None
+        )
+
+        self.message = utils.sample_create_message(
+            user_1=self.user_1, user_2=self.user_2
+        )
+        models.Message.objects.create(
+            thread=self.message.thread,
+            sender=self.user_2,
+            text='héllo ❤ "quoted"',
+            is_bot=True,
+        )
+
+    def render_both(self, messages):
+        serializer_json = JSONRenderer().render(
+            MessageSerializer(messages.select_related("sender"), many=True).data
+        )
+        rows_json = JSONRenderer().render(
+            serialize_message_rows(messages.values(*MESSAGE_ROW_FIELDS))
+        )
+        return serializer_json, rows_json
+
+    def test_output_is_identical_to_message_serializer(self) -> None:
+        """Test the fast path renders byte-identical JSON to MessageSerializer"""
+        messages = models.Message.objects.filter(thread=self.message.thread)
+
+        serializer_json, rows_json = self.render_both(messages)
+
+        self.assertEqual(rows_json, serializer_json)
+
+    def test_fast_path_benchmark(self) -> None:
+        """Benchmark rows/second of the fast path against MessageSerializer"""
+        models.Message.objects.bulk_create(
+            models.Message(
+                thread=self.message.thread, sender=self.user_1, text=f"message {i}"
+            )
+            for i in range(500)
+        )
+        messages = models.Message.objects.filter(thread=self.message.thread)
+        rows = list(messages.values(*MESSAGE_ROW_FIELDS))
+        instances = list(messages.select_related("sender"))
+
+        serializer_rate = best_rate(
+            lambda: MessageSerializer(instances, many=True).data, len(instances)
+        )
+        rows_rate = best_rate(lambda: serialize_message_rows(rows), len(rows))
+
+        self.assertGreater(
+            rows_rate,
+            serializer_rate,
+            f"fast path {rows_rate:.0f} rows/s, "
+            f"MessageSerializer {serializer_rate:.0f} rows/s",
+        )
@@ -8,4 +8,7 @@ app_name = ChatsConfig.name
 
 urlpatterns = [
     path("", views.ChatView.as_view(), name="chats"),
+    path("search/", views.MessageSearchView.as_view(), name="search"),
+    path("threads/", views.ThreadListView.as_view(), name="threads"),
+    path("threads/<int:pk>/read/", views.ThreadReadView.as_view(), name="thread_read"),
 ]
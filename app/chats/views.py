@@ -1,19 +1,41 @@
 import logging
+from html import escape
 
-from rest_framework import permissions, status
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Func, Q, TextField, Value
+from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
+from rest_framework import generics, permissions, status
 from rest_framework.decorators import APIView
 from rest_framework.response import Response
 
-from chats.serializers import MessageSerializer
+from chats.archive import archived_message_rows, find_archived_message
+from chats.caches import recent_messages
+from chats.serializers import (MESSAGE_ROW_FIELDS, ThreadReadSerializer,
+                               ThreadSerializer, attach_senders,
+                               serialize_message, serialize_message_rows)
 from core import models
+from core.mixins import ReplicaReadMixin
+from core.throttling import ChatRateThrottle
 
 logger = logging.getLogger(__name__)
 
 
-class ChatView(APIView):
-    """Chat api endpoint"""
+class ChatView(ReplicaReadMixin, APIView):
+    """Chat api endpoint
+
+    GET reads the history of the personal thread with ``other_username``
+    without writing anything, answering 304 when the ``If-None-Match`` ETag
+    still matches the thread's latest message. POST creates the thread,
+    idempotently, and returns its history.
+    """
 
     permission_classes = (permissions.IsAuthenticated,)
+    throttle_classes = (ChatRateThrottle,)
+    default_limit = 50
+    max_limit = 200
 
     def get(self, request):
         try:
@@ -24,22 +46,312 @@ class ChatView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            me = self.request.user
             other_user = models.User.objects.get(username=other_username)
-            thread_obj = models.Thread.objects.get_or_create_personal_thread(
-                me, other_user
-            )
-            messages = models.Message.objects.filter(thread=thread_obj.id)
+            thread_obj = models.Thread.objects.filter(
+                personal_key=models.personal_thread_key(request.user, other_user)
+            ).first()
+            if thread_obj is None:
+                return Response(
+                    "Thread not found, create it with a POST request",
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            etag = self.get_etag(thread_obj)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                response = not_modified
+            else:
+                response = Response(
+                    self.get_messages_data(thread_obj), status=status.HTTP_200_OK
+                )
+            response["ETag"] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        except Exception as error:
+            return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
+
+    def post(self, request):
+        try:
+            other_username = request.data.get("other_username", None)
+            if other_username is None:
+                return Response(
+                    "Please provide other_username",
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
 
-            if not messages.exists():
-                models.Message.objects.create(
-                    sender=self.request.user,
+            other_user = models.User.objects.get(username=other_username)
+            thread_obj, created = models.Thread.objects.get_or_create_personal_thread(
+                request.user, other_user
+            )
+            if created:
+                message = models.Message.objects.create(
+                    sender=request.user,
                     text="This is the start of a new message",
                     thread=thread_obj,
                     is_bot=True,
                 )
-            messages = models.Message.objects.filter(thread=thread_obj.id)
-            serializer = MessageSerializer(messages, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+                recent_messages.append(
+                    thread_obj.id, serialize_message(message, with_senders=False)
+                )
+
+            return Response(
+                self.get_messages_data(thread_obj),
+                status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+            )
+        except Exception as error:
+            return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
+
+    def get_etag(self, thread_obj):
+        """Quoted ETag of a thread's history, changing with its latest message"""
+        latest_id = (
+            models.Message.objects.filter(thread=thread_obj.id)
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        return quote_etag(f"{thread_obj.id}-{latest_id or 0}")
+
+    def get_limit(self):
+        limit = int(self.request.query_params.get("limit", self.default_limit))
+        if limit < 1:
+            raise ValueError("limit must be a positive integer")
+        return min(limit, self.max_limit)
+
+    def get_messages_data(self, thread_obj):
+        """Serialize the requested page, serving the latest page from cache"""
+        limit = self.get_limit()
+        messages = models.Message.objects.filter(thread=thread_obj.id).values(
+            *MESSAGE_ROW_FIELDS
+        )
+
+        is_latest_page = not (
+            "before" in self.request.query_params
+            or "after" in self.request.query_params
+        )
+        if (
+            not is_latest_page
+            or not recent_messages.enabled
+            or limit > settings.RECENT_MESSAGES_CACHE_SIZE
+        ):
+            return serialize_message_rows(
+                self.paginate_messages(thread_obj, messages, limit)
+            )
+
+        data = recent_messages.get(thread_obj.id)
+        if data is not None:
+            return attach_senders(data[-limit:])
+        rows = self.paginate_messages(
+            thread_obj, messages, settings.RECENT_MESSAGES_CACHE_SIZE
+        )
+        recent_messages.fill(
+            thread_obj.id, serialize_message_rows(rows, with_senders=False)
+        )
+        return serialize_message_rows(rows[-limit:])
+
+    def paginate_messages(self, thread_obj, messages, limit):
+        """Keyset paginate messages on (created_at, id) using message id cursors
+
+        Without a cursor the latest ``limit`` messages are returned. ``before``
+        pages backwards from a message and ``after`` pages forwards from one;
+        results are always in chronological order. Archived messages, all
+        older than the live ones, continue the history past the oldest live
+        message.
+        """
+        before = self.request.query_params.get("before", None)
+        after = self.request.query_params.get("after", None)
+
+        if after is not None:
+            cursor, archived = self.get_cursor(thread_obj, messages, after)
+            rows = []
+            if archived:
+                rows = archived_message_rows(thread_obj.id, limit, after=cursor)
+            return rows + list(
+                messages.filter(
+                    Q(created_at__gt=cursor[0])
+                    | Q(created_at=cursor[0], id__gt=cursor[1])
+                ).order_by("created_at", "id")[: limit - len(rows)]
+            )
+
+        cursor = archived = None
+        if before is not None:
+            cursor, archived = self.get_cursor(thread_obj, messages, before)
+        rows = []
+        if not archived:
+            if cursor is not None:
+                messages = messages.filter(
+                    Q(created_at__lt=cursor[0])
+                    | Q(created_at=cursor[0], id__lt=cursor[1])
+                )
+            rows = list(messages.order_by("-created_at", "-id")[:limit])[::-1]
+        if len(rows) < limit and thread_obj.archived_count:
+            rows = (
+                archived_message_rows(
+                    thread_obj.id,
+                    limit - len(rows),
+                    before=cursor if archived else None,
+                )
+                + rows
+            )
+        return rows
+
+    def get_cursor(self, thread_obj, messages, message_id):
+        """(created_at, id) key of a cursor message and whether it is archived"""
+        try:
+            cursor = messages.values("created_at", "id").get(id=message_id)
+            return (cursor["created_at"], cursor["id"]), False
+        except models.Message.DoesNotExist:
+            if not thread_obj.archived_count:
+                raise
+            cursor = find_archived_message(thread_obj.id, message_id)
+            if cursor is None:
+                raise
+            return cursor, True
+
+
+class ThreadListView(ReplicaReadMixin, generics.ListAPIView):
+    """Inbox of the authenticated user's threads, most recently active first"""
+
+    serializer_class = ThreadSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get_queryset(self):
+        return models.Thread.objects.inbox(self.request.user).prefetch_related("users")
+
+    def list(self, request, *args, **kwargs):
+        threads = list(self.get_queryset())
+        rows = models.Message.objects.filter(
+            id__in=[thread.last_message_id for thread in threads]
+        ).values(*MESSAGE_ROW_FIELDS)
+        self.last_messages = {
+            message["id"]: message for message in serialize_message_rows(rows)
+        }
+
+        serializer = self.get_serializer(threads, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["last_messages"] = getattr(self, "last_messages", {})
+        return context
+
+
+class ThreadReadView(ReplicaReadMixin, APIView):
+    """Mark a thread read up to a message, the latest one by default"""
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, pk):
+        serializer = ThreadReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        thread_obj = get_object_or_404(
+            models.Thread.objects.by_user(request.user), pk=pk
+        )
+        messages = models.Message.objects.filter(thread=thread_obj)
+        message_id = serializer.validated_data.get("message_id")
+        if message_id is not None:
+            messages = messages.filter(id=message_id)
+        message = messages.order_by("-created_at", "-id").first()
+        if message is None:
+            return Response(
+                "Message not found in thread", status=status.HTTP_400_BAD_REQUEST
+            )
+
+        marker, _ = models.ThreadReadMarker.objects.get_or_create(
+            thread=thread_obj, user=request.user
+        )
+        # Never move the marker backwards
+        if (
+            marker.last_read_message_id is None
+            or marker.last_read_message_id < message.id
+        ):
+            marker.last_read_message = message
+            marker.save(update_fields=["last_read_message", "updated_at"])
+
+        return Response(
+            {"last_read_message": marker.last_read_message_id},
+            status=status.HTTP_200_OK,
+        )
+
+
+class MessageSearchView(ReplicaReadMixin, APIView):
+    """Full-text search of messages in the authenticated user's threads
+
+    Hits are ranked by relevance and paginated with ``limit``/``offset``.
+    Each hit is a message with its ``rank`` and a ``headline`` snippet,
+    HTML escaped with the matched terms in ``<b>`` tags.
+    """
+
+    permission_classes = (permissions.IsAuthenticated,)
+    default_limit = 20
+    max_limit = 100
+    # Private use characters marking matches until the snippet is escaped
+    highlight_start = "\ue000"
+    highlight_stop = "\ue001"
+    headline_options = (
+        f"StartSel={highlight_start}, StopSel={highlight_stop}, MaxFragments=2"
+    )
+
+    @classmethod
+    def search(cls, user, q):
+        """Ranked message rows of the user's threads matching q"""
+        query = SearchQuery(q, config=models.MESSAGE_SEARCH_CONFIG)
+        return (
+            models.Message.objects.filter(thread__users=user, search_vector=query)
+            .annotate(
+                rank=SearchRank(F("search_vector"), query),
+                headline=Func(
+                    Value(models.MESSAGE_SEARCH_CONFIG),
+                    F("text"),
+                    query,
+                    Value(cls.headline_options),
+                    function="ts_headline",
+                    output_field=TextField(),
+                ),
+            )
+            .order_by("-rank", "-id")
+            .values(*MESSAGE_ROW_FIELDS, "rank", "headline")
+        )
+
+    @classmethod
+    def highlight(cls, headline):
+        """Escape a ts_headline snippet, then turn its markers into <b> tags"""
+        return (
+            escape(headline)
+            .replace(cls.highlight_start, "<b>")
+            .replace(cls.highlight_stop, "</b>")
+        )
+
+    def get(self, request):
+        try:
+            q = self.request.query_params.get("q", "").strip()
+            if not q:
+                return Response(
+                    "Please provide q query param",
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            limit = int(self.request.query_params.get("limit", self.default_limit))
+            offset = int(self.request.query_params.get("offset", 0))
+            if limit < 1 or offset < 0:
+                raise ValueError("limit and offset must be positive integers")
+            limit = min(limit, self.max_limit)
+
+            rows = list(self.search(self.request.user, q)[offset : offset + limit + 1])
+
+            # One extra row tells whether another page exists without a COUNT
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            results = serialize_message_rows(rows)
+            for result, row in zip(results, rows):
+                result["rank"] = row["rank"]
+                result["headline"] = self.highlight(row["headline"])
+
+            return Response(
+                {
+                    "next_offset": offset + limit if has_next else None,
+                    "results": results,
+                },
+                status=status.HTTP_200_OK,
+            )
         except Exception as error:
             return Response(str(error), status=status.HTTP_400_BAD_REQUEST)
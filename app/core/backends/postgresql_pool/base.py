@@ -0,0 +1,149 @@
+import threading
+import time
+from functools import partial
+
+import psycopg2
+from django.db.backends.postgresql import base, creation
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No pooled connection was released within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread safe pool of open psycopg2 connections
+
+    At most ``max_size`` connections are checked out at once; further
+    callers wait up to ``timeout`` seconds for one to be returned. A
+    connection idle for longer than ``health_check_interval`` seconds is
+    pinged before it is handed out and replaced when the ping fails.
+    """
+
+    def __init__(self, max_size, timeout=10, health_check_interval=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []
+
+    def getconn(self, connect):
+        """Check out an idle connection, or open one with ``connect()``"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f"No database connection released within {self.timeout}s "
+                f"(pool size {self.max_size})"
+            )
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, released_at = self._idle.pop()
+                if self.is_usable(connection, released_at):
+                    return connection
+                self.discard(connection)
+            return connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        """Return a checked out connection, closing it when unusable"""
+        try:
+            if not close and not connection.closed:
+                if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+                return
+        except psycopg2.Error:
+            pass
+        finally:
+            self._slots.release()
+        self.discard(connection)
+
+    def is_usable(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+        return True
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(conn_params, options):
+    """Process-wide pool of the connections opened with ``conn_params``"""
+    key = tuple(sorted(conn_params.items()))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                max_size=options.get("MAX_SIZE", 20),
+                timeout=options.get("TIMEOUT", 10),
+                health_check_interval=options.get("HEALTH_CHECK_INTERVAL", 30),
+            )
+        return _pools[key]
+
+
+def close_idle_connections():
+    """Close the idle connections of every pool in this process"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would block DROP DATABASE
+        close_idle_connections()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend borrowing its connections from a ConnectionPool
+
+    Closing the Django connection, which channels does around every
+    ``database_sync_to_async`` call and Django does at the end of every
+    request when ``CONN_MAX_AGE`` is 0, hands the connection back to the
+    pool instead of tearing it down. The pool is configured by the
+    ``POOL`` dict of the database settings.
+    """
+
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(conn_params, self.settings_dict.get("POOL", {}))
+        connection = self.pool.getconn(partial(super().get_new_connection, conn_params))
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # A connection closed inside atomic() stays referenced by this
+                # wrapper until the block exits, so it can't be shared
+                self.pool.putconn(self.connection, close=self.in_atomic_block)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    """Django command to create the upcoming monthly message partitions"""
+
+    help = (
+        "Create the monthly partitions of core_message from the current month "
+        "to --months ahead. Run it periodically, e.g. daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        if not is_partitioned(connection):
+            raise CommandError("core_message is not partitioned")
+
+        created = ensure_partitions(connection, options["months"])
+        for name in created:
+            self.stdout.write(f"Created partition {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created"))
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import redis
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from chats.consumers import ChatConsumer
+from core.ratelimit import RateLimiter, TokenBucket
+
+# High enough that every benchmarked call takes the allowed path
+LIMIT = "1000000/1000000"
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the rate limiter"""
+
+    help = (
+        "Time N rate limit checks of a bare token bucket, of the in-process "
+        "limiter and of the Redis limiter when Redis is reachable, then the "
+        "check every websocket frame goes through, and report microseconds "
+        "per call."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=100000)
+        parser.add_argument("--users", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        calls, users = options["calls"], options["users"]
+        limits = {"bench": LIMIT, "chat_socket": LIMIT, "chat_user": LIMIT}
+        with override_settings(RATE_LIMITS=limits, RATE_LIMIT_BACKEND="local"):
+            bucket = TokenBucket(1000000, 1000000)
+            self.report("token bucket", self.measure(lambda i: bucket.consume(), calls))
+            limiter = RateLimiter()
+            self.report(
+                "local limiter",
+                self.measure(lambda i: limiter.consume("bench", i % users), calls),
+            )
+            self.report("local frame check", self.measure_frames(calls, users))
+
+        with override_settings(RATE_LIMITS=limits, RATE_LIMIT_BACKEND="redis"):
+            limiter = RateLimiter()
+            try:
+                limiter.script.registered_client.ping()
+            except redis.RedisError:
+                self.stdout.write("Redis is not reachable, skipping the shared mode")
+                return
+            redis_calls = max(1, calls // 20)
+            self.report(
+                "redis limiter",
+                self.measure(
+                    lambda i: limiter.consume("bench", i % users), redis_calls
+                ),
+            )
+            self.report("redis frame check", self.measure_frames(redis_calls, users))
+
+    def report(self, name, result):
+        calls, seconds = result
+        self.stdout.write(
+            f"{name:<20} {calls:>8} calls in {seconds:.3f}s - "
+            f"{seconds / calls * 1e6:.2f}us/call"
+        )
+
+    def measure(self, check, calls):
+        started = time.perf_counter()
+        for i in range(calls):
+            check(i)
+        return calls, time.perf_counter() - started
+
+    def measure_frames(self, calls, users):
+        """Time ChatConsumer.get_throttle_wait of sockets of many users"""
+        consumers = []
+        for user_id in range(users):
+            consumer = ChatConsumer()
+            consumer.scope = {"user": type("User", (), {"id": user_id})}
+            consumer.rate_bucket = TokenBucket(1000000, 1000000)
+            consumers.append(consumer)
+
+        async def run():
+            started = time.perf_counter()
+            for i in range(calls):
+                await consumers[i % users].get_throttle_wait()
+            return time.perf_counter() - started
+
+        return calls, asyncio.run(run())
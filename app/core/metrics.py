@@ -0,0 +1,152 @@
+import os
+import time
+from contextlib import ExitStack
+
+from channels.layers import channel_layers
+from django.db import connections
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
+
+# Methods labelled as is, anything else a client sends counts as "other"
+HTTP_METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by view",
+    ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+REQUESTS = Counter(
+    "http_requests",
+    "Requests answered, by view and status",
+    ["view", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run by a request, by view",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time a request spent in the database, by view",
+    ["view"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+# Gauges are summed over the live processes in multiprocess mode
+WEBSOCKETS = Gauge(
+    "chat_websockets",
+    "Open chat websockets",
+    ["consumer"],
+    multiprocess_mode="livesum",
+)
+WEBSOCKET_FRAMES = Counter(
+    "chat_websocket_frames", "Chat websocket frames, in or out", ["direction"]
+)
+GROUP_SEND_LATENCY = Histogram(
+    "chat_group_send_seconds",
+    "Time of a group_send to a room on the channel layer",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+CHANNEL_LAYER_DEPTH = Gauge(
+    "channel_layer_queue_depth",
+    "Messages queued in the server processes for their consumers",
+    ["layer"],
+    multiprocess_mode="livesum",
+)
+
+
+def mark_process_dead():
+    """Drop the live gauges of this process as it exits, in multiprocess mode
+
+    Registered as a worker exit hook by app.wsgi and app.server.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def method_label(method):
+    return method if method in HTTP_METHODS else "other"
+
+
+def view_label(view_func):
+    """Class name of a class based view, function name otherwise"""
+    view_class = getattr(view_func, "cls", None) or getattr(
+        view_func, "view_class", None
+    )
+    return (view_class or view_func).__name__
+
+
+class QueryStats:
+    """Database execute wrapper counting and timing queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record the latency and database work of requests by view
+
+    Requests that resolve to no view are labelled "none".
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = getattr(request, "metrics_view", "none")
+        method = method_label(request.method)
+        REQUEST_LATENCY.labels(view, method).observe(elapsed)
+        REQUESTS.labels(view, method, response.status_code).inc()
+        REQUEST_DB_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_SECONDS.labels(view).observe(queries.seconds)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_label(view_func)
+
+
+class ChannelLayerSampler:
+    """Sample the queues of the channel layers of this process into a gauge
+
+    Reads the layers already in use: the receive buffer of channels_redis,
+    the channels of the in-memory layer. Samples taken less than
+    ``interval`` seconds after the previous one are skipped, so it is cheap
+    enough to call on every frame.
+    """
+
+    def __init__(self, interval=1):
+        self.interval = interval
+        self.sampled_at = None
+
+    def sample(self):
+        now = time.monotonic()
+        if self.sampled_at is not None and now - self.sampled_at < self.interval:
+            return
+        self.sampled_at = now
+        for alias, layer in list(channel_layers.backends.items()):
+            queues = getattr(layer, "receive_buffer", None)
+            if queues is None:
+                queues = getattr(layer, "channels", {})
+            CHANNEL_LAYER_DEPTH.labels(alias).set(
+                sum(queue.qsize() for queue in list(queues.values()))
+            )
+
+
+channel_layer_sampler = ChannelLayerSampler()
@@ -0,0 +1,48 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:56
+
+from django.db import migrations, models
+
+
+def backfill_personal_keys(apps, schema_editor):
+    """Set personal_key on personal threads, merging duplicate threads"""
+    Thread = apps.get_model("core", "Thread")
+    Message = apps.get_model("core", "Message")
+
+    threads_by_key = {}
+    threads = (
+        Thread.objects.filter(thread_type="personal")
+        .prefetch_related("users")
+        .order_by("id")
+    )
+    for thread in threads:
+        user_ids = sorted(user.id for user in thread.users.all())
+        if len(user_ids) != 2:
+            continue
+
+        key = "{}:{}".format(*user_ids)
+        if key in threads_by_key:
+            Message.objects.filter(thread=thread).update(thread=threads_by_key[key])
+            thread.delete()
+        else:
+            threads_by_key[key] = thread
+
+    for key, thread in threads_by_key.items():
+        Thread.objects.filter(id=thread.id).update(personal_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_message_is_bot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="personal_key",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(backfill_personal_keys, migrations.RunPython.noop),
+    ]
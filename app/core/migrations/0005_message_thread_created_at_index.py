@@ -0,0 +1,20 @@
+# Generated by Django 3.0.14 on 2026-10-18 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_thread_personal_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["thread", "created_at", "id"],
+                name="core_messag_thread__a5f674_idx",
+            ),
+        ),
+    ]
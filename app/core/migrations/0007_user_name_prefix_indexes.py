@@ -0,0 +1,35 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:10
+
+from django.db import migrations
+
+# Django 3.0 has no functional indexes, so the expression indexes matching the
+# UPPER(col::text) LIKE 'Q%' lookups of istartswith are created with raw SQL.
+PREFIX_INDEXED_COLUMNS = ("username", "first_name", "last_name")
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in PREFIX_INDEXED_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS core_user_{column}_upper_like "
+            f'ON core_user (UPPER("{column}"::text) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for column in PREFIX_INDEXED_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS core_user_{column}_upper_like")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_threadreadmarker"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
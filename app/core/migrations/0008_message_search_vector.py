@@ -0,0 +1,51 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:07
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The GIN index and the trigger keeping search_vector in sync with text on
+# every insert and update are PostgreSQL only.
+CREATE_SEARCH_SQL = """
+CREATE INDEX IF NOT EXISTS core_message_search_vector_gin
+    ON core_message USING gin (search_vector);
+
+CREATE TRIGGER core_message_search_vector_update
+    BEFORE INSERT OR UPDATE OF text ON core_message
+    FOR EACH ROW EXECUTE PROCEDURE
+    tsvector_update_trigger(search_vector, 'pg_catalog.english', text);
+
+UPDATE core_message SET search_vector = to_tsvector('pg_catalog.english', text);
+"""
+
+DROP_SEARCH_SQL = """
+DROP TRIGGER IF EXISTS core_message_search_vector_update ON core_message;
+DROP INDEX IF EXISTS core_message_search_vector_gin;
+"""
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_SEARCH_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_SEARCH_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_user_name_prefix_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
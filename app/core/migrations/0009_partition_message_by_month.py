@@ -0,0 +1,106 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.partitions import (DEFAULT_PARTITION, MESSAGE_TABLE,
+                             ensure_partitions, supports_partitioning)
+
+# Months of partitions created ahead of the current one, afterwards they are
+# created by the create_message_partitions command
+MONTHS_AHEAD = 3
+
+
+def table_definitions(cursor):
+    """Indexes, foreign keys and triggers of the message table as SQL"""
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+        [MESSAGE_TABLE, f"{MESSAGE_TABLE}_pkey"],
+    )
+    statements = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [MESSAGE_TABLE],
+    )
+    statements += [
+        f"ALTER TABLE {MESSAGE_TABLE} ADD CONSTRAINT {name} {definition}"
+        for name, definition in cursor.fetchall()
+    ]
+    cursor.execute(
+        "SELECT pg_get_triggerdef(oid) FROM pg_trigger "
+        "WHERE tgrelid = %s::regclass AND NOT tgisinternal",
+        [MESSAGE_TABLE],
+    )
+    statements += [row[0] for row in cursor.fetchall()]
+    return statements
+
+
+def rebuild_message_table(schema_editor, partitioned):
+    """Copy core_message into a new partitioned or plain table
+
+    The indexes, foreign keys and search trigger are recreated under their
+    original names once the rows are copied. Partitioned tables need the
+    partition key in their primary key, so it becomes (id, created_at).
+    """
+    connection = schema_editor.connection
+    old_table = f"{MESSAGE_TABLE}_old"
+    with connection.cursor() as cursor:
+        definitions = table_definitions(cursor)
+        cursor.execute(f"ALTER TABLE {MESSAGE_TABLE} RENAME TO {old_table}")
+        cursor.execute(
+            f"CREATE TABLE {MESSAGE_TABLE} (LIKE {old_table} INCLUDING DEFAULTS)"
+            + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+        )
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old_table])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {MESSAGE_TABLE}.id")
+
+        if partitioned:
+            cursor.execute(
+                f"CREATE TABLE {DEFAULT_PARTITION} "
+                f"PARTITION OF {MESSAGE_TABLE} DEFAULT"
+            )
+            cursor.execute(f"SELECT min(created_at) FROM {old_table}")
+            ensure_partitions(connection, MONTHS_AHEAD, since=cursor.fetchone()[0])
+
+        cursor.execute(f"INSERT INTO {MESSAGE_TABLE} SELECT * FROM {old_table}")
+        cursor.execute(f"DROP TABLE {old_table}")
+        cursor.execute(
+            f"ALTER TABLE {MESSAGE_TABLE} ADD PRIMARY KEY "
+            + ("(id, created_at)" if partitioned else "(id)")
+        )
+        for statement in definitions:
+            cursor.execute(statement)
+
+
+def partition_messages(apps, schema_editor):
+    if supports_partitioning(schema_editor.connection):
+        rebuild_message_table(schema_editor, partitioned=True)
+
+
+def unpartition_messages(apps, schema_editor):
+    if supports_partitioning(schema_editor.connection):
+        rebuild_message_table(schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_message_search_vector"),
+    ]
+
+    operations = [
+        # A partitioned table can't be referenced by a foreign key on id alone
+        migrations.AlterField(
+            model_name="threadreadmarker",
+            name="last_read_message",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+",
+                to="core.Message",
+            ),
+        ),
+        migrations.RunPython(partition_messages, unpartition_messages),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:07
+
+from django.db import migrations, models
+
+import core.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_messagearchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="profile_thumbnail_medium",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                upload_to=core.models.image_file_path,
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="profile_thumbnail_small",
+            field=models.ImageField(
+                blank=True,
+                editable=False,
+                null=True,
+                upload_to=core.models.image_file_path,
+            ),
+        ),
+    ]
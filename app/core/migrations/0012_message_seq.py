@@ -0,0 +1,79 @@
+# Generated by Django 3.0.14 on 2026-10-18 16:20
+
+import json
+import zlib
+
+from django.db import migrations, models
+
+
+def number_messages(apps, schema_editor):
+    """Number the archived then the live messages of every thread in order"""
+    Thread = apps.get_model("core", "Thread")
+    MessageArchive = apps.get_model("core", "MessageArchive")
+
+    archived_counts = {}
+    blocks = MessageArchive.objects.order_by(
+        "thread_id", "first_created_at", "first_message_id"
+    )
+    for block in blocks.iterator():
+        seq = archived_counts.get(block.thread_id, 0)
+        rows = json.loads(zlib.decompress(block.data))
+        for row in rows:
+            seq += 1
+            row["seq"] = seq
+        block.data = zlib.compress(json.dumps(rows).encode())
+        block.save(update_fields=["data"])
+        archived_counts[block.thread_id] = seq
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE core_message SET seq = numbered.seq FROM ("
+            " SELECT m.id, row_number() OVER ("
+            "  PARTITION BY m.thread_id ORDER BY m.created_at, m.id"
+            " ) + coalesce(("
+            "  SELECT sum(a.message_count) FROM core_messagearchive a"
+            "  WHERE a.thread_id = m.thread_id"
+            " ), 0) AS seq"
+            " FROM core_message m"
+            ") AS numbered WHERE core_message.id = numbered.id"
+        )
+        cursor.execute(
+            "UPDATE core_thread SET last_seq = coalesce(("
+            " SELECT max(seq) FROM core_message"
+            " WHERE core_message.thread_id = core_thread.id"
+            "), 0)"
+        )
+    for thread_id, count in archived_counts.items():
+        Thread.objects.filter(id=thread_id, last_seq=0).update(last_seq=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_user_profile_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="seq",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="thread",
+            name="last_seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="threadreadmarker",
+            name="delivered_seq",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(number_messages, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["thread", "seq"], name="core_messag_thread__1dfe41_idx"
+            ),
+        ),
+    ]
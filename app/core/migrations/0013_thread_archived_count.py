@@ -0,0 +1,33 @@
+# Generated by Django 3.0.14 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def count_archived_messages(apps, schema_editor):
+    Thread = apps.get_model("core", "Thread")
+    MessageArchive = apps.get_model("core", "MessageArchive")
+
+    counts = (
+        MessageArchive.objects.order_by()
+        .values("thread_id")
+        .annotate(count=Sum("message_count"))
+    )
+    for row in counts.iterator():
+        Thread.objects.filter(id=row["thread_id"]).update(archived_count=row["count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_message_seq"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="thread",
+            name="archived_count",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_archived_messages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from core.routers import pin_to_primary, read_from_replica
+
+
+class ReplicaReadMixin:
+    """Serve the safe requests of an API view from a read replica
+
+    Unsafe requests pin the user to the primary so their next reads see
+    what they just wrote.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self.replica_reads = read_from_replica(request.user)
+            self.replica_reads.__enter__()
+        else:
+            pin_to_primary(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_reads = getattr(self, "replica_reads", None)
+        if replica_reads is not None:
+            self.replica_reads = None
+            replica_reads.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -4,12 +4,17 @@ import uuid
 
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
-from django.db import models
-from django.db.models import Count
+from django.contrib.postgres.search import SearchVectorField
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
+# Text search configuration of Message.search_vector, kept in sync by a trigger
+MESSAGE_SEARCH_CONFIG = "english"
+
 
 def image_file_path(instance, filename):
     """Generate file path for new image"""
@@ -19,6 +24,11 @@ def image_file_path(instance, filename):
     return os.path.join(os.environ.get("IMAGE_PATH"), filename)
 
 
+def personal_thread_key(user1, user2):
+    """Generate the canonical key of the personal thread between two users"""
+    return "{}:{}".format(*sorted((user1.id, user2.id)))
+
+
 class UserManager(BaseUserManager):
     """Custom User model manager"""
 
@@ -70,6 +80,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     profile_picture = models.ImageField(
         upload_to=image_file_path, blank=True, null=True
     )
+    # Square thumbnails of profile_picture rendered by users.thumbnails
+    profile_thumbnail_small = models.ImageField(
+        upload_to=image_file_path, blank=True, null=True, editable=False
+    )
+    profile_thumbnail_medium = models.ImageField(
+        upload_to=image_file_path, blank=True, null=True, editable=False
+    )
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     created_on = models.DateTimeField(auto_now_add=True, blank=True, null=True)
@@ -84,21 +101,77 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 class ThreadManager(models.Manager):
     def get_or_create_personal_thread(self, user1, user2):
-        threads = self.get_queryset().filter(thread_type="personal")
-        threads = threads.filter(users__in=[user1, user2]).distinct()
-        threads = threads.annotate(u_count=Count("users")).filter(u_count=2)
-        if threads.exists():
-            return threads.first()
-        else:
-            thread = self.create(thread_type="personal")
-            thread.users.add(user1)
-            thread.users.add(user2)
-
-            return thread
+        """Personal thread of two users and whether it was just created"""
+        key = personal_thread_key(user1, user2)
+        try:
+            return self.get(personal_key=key), False
+        except self.model.DoesNotExist:
+            pass
+
+        try:
+            with transaction.atomic():
+                thread = self.create(thread_type="personal", personal_key=key)
+                thread.users.add(user1, user2)
+        except IntegrityError:
+            # Another connection created the thread first, read it from the
+            # primary as a replica may not have it yet
+            thread = self.db_manager(router.db_for_write(self.model)).get(
+                personal_key=key
+            )
+            return thread, False
+
+        return thread, True
 
     def by_user(self, user):
         return self.get_queryset().filter(users__in=[user])
 
+    def allocate_seqs(self, thread_id, count=1):
+        """Reserve the next ``count`` message sequence numbers of a thread
+
+        Returns the last reserved number. The thread row stays locked until
+        the surrounding transaction ends, so numbers are never handed out
+        twice.
+        """
+        db = router.db_for_write(self.model)
+        with transaction.atomic(using=db):
+            threads = self.db_manager(db).filter(id=thread_id)
+            threads.update(last_seq=F("last_seq") + count)
+            return threads.values_list("last_seq", flat=True).get()
+
+    def inbox(self, user):
+        """Threads of a user annotated with their last message and unread count"""
+        latest_messages = Message.objects.filter(thread=OuterRef("pk")).order_by(
+            "-created_at", "-id"
+        )
+        last_read_message = ThreadReadMarker.objects.filter(
+            thread=OuterRef(OuterRef("pk")), user=user
+        ).values("last_read_message_id")[:1]
+        unread_messages = (
+            Message.objects.filter(
+                thread=OuterRef("pk"),
+                id__gt=Coalesce(
+                    Subquery(last_read_message),
+                    0,
+                    output_field=models.BigIntegerField(),
+                ),
+            )
+            .exclude(sender=user)
+            .order_by()
+            .values("thread")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+
+        return (
+            self.by_user(user)
+            .annotate(
+                last_message_id=Subquery(latest_messages.values("id")[:1]),
+                last_message_at=Subquery(latest_messages.values("created_at")[:1]),
+                unread_count=Coalesce(Subquery(unread_messages), 0),
+            )
+            .order_by(F("last_message_at").desc(nulls_last=True), "-id")
+        )
+
 
 class Thread(models.Model):
     THREAD_TYPE = (("personal", "Personal"), ("group", "Group"))
@@ -108,6 +181,13 @@ class Thread(models.Model):
         max_length=15, choices=THREAD_TYPE, default="personal"
     )
     users = models.ManyToManyField(User)
+    personal_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
+    # Sequence number of the latest message, see Message.seq
+    last_seq = models.BigIntegerField(default=0, editable=False)
+    # Messages moved to MessageArchive blocks, see chats.archive
+    archived_count = models.BigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -120,12 +200,90 @@ class Thread(models.Model):
 
 
 class Message(models.Model):
+    """Chat message
+
+    On PostgreSQL 13+ the table is range partitioned by month of
+    ``created_at`` (see core.partitions), with (id, created_at) as its
+    primary key in the database.
+
+    ``seq`` numbers the messages of a thread 1, 2, 3... without gaps so
+    clients can tell which ones they missed. It is reserved from
+    ``Thread.last_seq`` when a new message is saved, or beforehand by code
+    creating messages in bulk.
+    """
+
     thread = models.ForeignKey(Thread, on_delete=models.CASCADE)
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField(blank=False, null=False)
     is_bot = models.BooleanField(default=False)
+    seq = models.BigIntegerField(null=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["thread", "created_at", "id"]),
+            models.Index(fields=["thread", "seq"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.seq is not None:
+            return super().save(*args, **kwargs)
+        # Reserve the number and insert in one transaction, a failed insert
+        # must not leave a gap
+        with transaction.atomic(using=router.db_for_write(Message)):
+            self.seq = Thread.objects.allocate_seqs(self.thread_id)
+            super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         return f"From <Thread - {self.thread}>"
+
+
+class ThreadReadMarker(models.Model):
+    """Last message of a thread a member has read"""
+
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Without a database constraint, as the partitioned message table can't
+    # be referenced, and kept when its message is archived
+    last_read_message = models.ForeignKey(
+        Message,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    # Highest message seq the user acknowledged receiving over a websocket
+    delivered_seq = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("thread", "user")
+
+    def __str__(self) -> str:
+        return f"{self.user} read <Thread - {self.thread}>"
+
+
+class MessageArchive(models.Model):
+    """Compressed block of old messages of a thread moved out of Message
+
+    ``data`` is the zlib compressed JSON list of the archived rows in
+    chronological order, written and read by chats.archive.
+    """
+
+    thread = models.ForeignKey(Thread, on_delete=models.CASCADE)
+    first_message_id = models.BigIntegerField()
+    last_message_id = models.BigIntegerField()
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["thread", "last_created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.message_count} archived messages of <Thread - {self.thread}>"
@@ -0,0 +1,121 @@
+import datetime
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+# Messages are range partitioned by month of created_at on PostgreSQL 13+,
+# which can clone row triggers to partitions. Rows outside every monthly
+# partition land in the default partition until their month is created.
+MESSAGE_TABLE = "core_message"
+DEFAULT_PARTITION = f"{MESSAGE_TABLE}_default"
+PARTITION_NAME_RE = re.compile(rf"^{MESSAGE_TABLE}_p(\d{{4}})(\d{{2}})$")
+MIN_SERVER_VERSION = 130000
+
+
+def month_start(value):
+    """First instant of the UTC month of a datetime"""
+    value = value.astimezone(datetime.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_name(month):
+    return f"{MESSAGE_TABLE}_p{month:%Y%m}"
+
+
+def supports_partitioning(connection):
+    return (
+        connection.vendor == "postgresql"
+        and connection.pg_version >= MIN_SERVER_VERSION
+    )
+
+
+def is_partitioned(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass",
+            [MESSAGE_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def month_partitions(connection):
+    """Months having a partition, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = %s::regclass",
+            [MESSAGE_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            year, month = map(int, match.groups())
+            months.append(
+                datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc)
+            )
+    return sorted(months)
+
+
+def create_month_partition(connection, month):
+    """Create and attach the partition of a month
+
+    Rows of that month already stored in the default partition are moved
+    into the new partition before it is attached.
+    """
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {name} (LIKE {MESSAGE_TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {MESSAGE_TABLE} ATTACH PARTITION {name} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return name
+
+
+def ensure_partitions(connection, months_ahead, since=None):
+    """Create the missing partitions from ``since`` to ``months_ahead`` months
+    past the current one, returning the names of the created partitions
+    """
+    existing = set(month_partitions(connection))
+    month = month_start(since or timezone.now())
+    last = add_months(month_start(timezone.now()), months_ahead)
+    created = []
+    while month <= last:
+        if month not in existing:
+            created.append(create_month_partition(connection, month))
+        month = add_months(month, 1)
+    return created
+
+
+def drop_empty_partitions(connection, before):
+    """Drop the empty partitions of months ending at or before ``before``"""
+    dropped = []
+    with connection.cursor() as cursor:
+        for month in month_partitions(connection):
+            if add_months(month, 1) > before:
+                break
+            name = partition_name(month)
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {name})")
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+    return dropped
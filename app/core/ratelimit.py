@@ -0,0 +1,165 @@
+import functools
+import logging
+import threading
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Buckets kept by the in-process limiter before full ones are dropped
+MAX_LOCAL_BUCKETS = 100000
+
+# Token bucket in a Redis hash, clocked by the Redis server so every app
+# server shares one time source. Returns the seconds to wait as a string,
+# "0" when the tokens were taken.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """(tokens per second, burst) of a "rate/burst" limit, None when empty"""
+    if not rate:
+        return None
+    tokens_per_second, burst = rate.split("/")
+    return float(tokens_per_second), int(burst)
+
+
+def get_limit(scope):
+    return parse_rate(settings.RATE_LIMITS.get(scope))
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``burst``
+
+    Not thread safe, used as is for a single websocket and under the lock
+    of LocalRateLimiter otherwise.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refilled(self, now):
+        elapsed = max(0, now - self.updated)
+        return min(self.burst, self.tokens + elapsed * self.rate)
+
+    def consume(self, cost=1, now=None):
+        """Take tokens, returns 0 or the seconds until enough are available"""
+        now = time.monotonic() if now is None else now
+        self.tokens = self.refilled(now)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / self.rate
+
+
+class LocalRateLimiter:
+    """Token buckets of this process keyed by name"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1):
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= MAX_LOCAL_BUCKETS:
+                    self.prune(now)
+                bucket = self.buckets[key] = TokenBucket(rate, burst)
+            return bucket.consume(cost, now)
+
+    def prune(self, now):
+        """Drop full buckets, a new bucket behaves the same"""
+        self.buckets = {
+            key: bucket
+            for key, bucket in self.buckets.items()
+            if bucket.refilled(now) < bucket.burst
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class RateLimiter:
+    """Token bucket rate limits of the RATE_LIMITS scopes
+
+    Buckets live in this process unless RATE_LIMIT_BACKEND is "redis", which
+    shares them between servers. When Redis fails the process falls back to
+    its own buckets rather than letting every request through.
+    """
+
+    def __init__(self):
+        self.local = LocalRateLimiter()
+        self._client = None
+        self._script = None
+
+    @property
+    def shared(self):
+        return settings.RATE_LIMIT_BACKEND == "redis"
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._client = redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL)
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def consume(self, scope, ident, cost=1):
+        """Take tokens from the bucket of an identity in a scope
+
+        Returns 0 when allowed, otherwise the seconds to wait. Scopes without
+        a limit always allow.
+        """
+        limit = get_limit(scope)
+        if limit is None:
+            return 0
+        key = f"{scope}:{ident}"
+        if self.shared:
+            try:
+                return float(
+                    self.script(keys=[f"ratelimit:{key}"], args=[*limit, cost])
+                )
+            except redis.RedisError:
+                logger.exception(f"Failed to check the rate limit of {key}")
+        return self.local.consume(key, *limit, cost)
+
+    async def aconsume(self, scope, ident, cost=1):
+        """consume() for async code, off the event loop in shared mode"""
+        if not self.shared:
+            return self.consume(scope, ident, cost)
+        return await sync_to_async(self.consume, thread_sensitive=False)(
+            scope, ident, cost
+        )
+
+
+rate_limiter = RateLimiter()
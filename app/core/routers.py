@@ -0,0 +1,102 @@
+import functools
+import logging
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+# Alias reads are sent to, None for the primary
+_read_database = ContextVar("read_database", default=None)
+
+
+def primary_pin_key(user_id):
+    """Generate the cache key marking a user's reads as pinned to the primary"""
+    return f"primary_pin:{user_id}"
+
+
+def pin_cache():
+    return caches[settings.REPLICA_PIN_CACHE]
+
+
+def pins_are_shared():
+    """Whether pins set by this process are seen by the others"""
+    return not isinstance(pin_cache(), (LocMemCache, DummyCache))
+
+
+@functools.lru_cache(maxsize=None)
+def warn_pins_not_shared(alias):
+    logger.warning(
+        f"Reading from the primary only, the replica pin cache {alias} is "
+        "process local"
+    )
+
+
+def pin_to_primary(user):
+    """Read from the primary for a while so the user sees their own writes
+
+    Does nothing without replicas. The pin cache may be Redis, so call it
+    from synchronous code, not from the event loop.
+    """
+    if not settings.REPLICA_DATABASES:
+        return
+    pin_cache().set(primary_pin_key(user.id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return pin_cache().get(primary_pin_key(user.id)) is not None
+
+
+def may_read_from_replica(user):
+    if not pins_are_shared():
+        warn_pins_not_shared(settings.REPLICA_PIN_CACHE)
+        return False
+    return not (
+        user is not None and user.is_authenticated and is_pinned_to_primary(user)
+    )
+
+
+@contextmanager
+def read_from_replica(user=None):
+    """Route reads in the block to a random replica
+
+    Reads stay on the primary when no replica is configured, when the user
+    wrote within the last ``REPLICA_PIN_SECONDS`` or when pins are not
+    shared between processes, as another process may have served the write.
+    """
+    alias = None
+    if settings.REPLICA_DATABASES and may_read_from_replica(user):
+        alias = random.choice(settings.REPLICA_DATABASES)
+    token = _read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_database.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads inside read_from_replica() to a replica, all else to default"""
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica must still be saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
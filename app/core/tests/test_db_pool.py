@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+import psycopg2
+from django.test import SimpleTestCase
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_INERROR)
+
+from core.backends.postgresql_pool.base import ConnectionPool, PoolTimeout
+
+
+def fake_connection():
+    connection = MagicMock(closed=0)
+    connection.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+    return connection
+
+
+class TestConnectionPool(SimpleTestCase):
+    def test_released_connection_is_reused(self) -> None:
+        """Test a returned connection is handed out again without reconnecting"""
+        pool = ConnectionPool(max_size=2)
+        connect = MagicMock(side_effect=fake_connection)
+
+        connection = pool.getconn(connect)
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(connect), connection)
+        self.assertEqual(connect.call_count, 1)
+
+    def test_checkouts_are_bounded_by_max_size(self) -> None:
+        """Test checking out more than max_size connections times out"""
+        pool = ConnectionPool(max_size=2, timeout=0.01)
+        pool.getconn(fake_connection)
+        pool.getconn(fake_connection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(fake_connection)
+
+    def test_connection_left_in_transaction_is_rolled_back(self) -> None:
+        """Test a connection returned mid transaction is rolled back"""
+        pool = ConnectionPool(max_size=1)
+        connection = pool.getconn(fake_connection)
+        connection.get_transaction_status.return_value = TRANSACTION_STATUS_INERROR
+
+        pool.putconn(connection)
+
+        connection.rollback.assert_called_once()
+        self.assertIs(pool.getconn(fake_connection), connection)
+
+    def test_failed_health_check_replaces_connection(self) -> None:
+        """Test a stale connection failing its ping is closed and replaced"""
+        pool = ConnectionPool(max_size=1, health_check_interval=0)
+        stale = pool.getconn(fake_connection)
+        stale.cursor.return_value.__enter__.return_value.execute.side_effect = (
+            psycopg2.OperationalError
+        )
+        pool.putconn(stale)
+
+        fresh = pool.getconn(fake_connection)
+
+        self.assertIsNot(fresh, stale)
+        stale.close.assert_called_once()
+
+    def test_closed_connection_frees_its_slot(self) -> None:
+        """Test returning a closed connection lets another one be opened"""
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        connection = pool.getconn(fake_connection)
+        connection.closed = 1
+        pool.putconn(connection)
+
+        self.assertIsNot(pool.getconn(fake_connection), connection)
@@ -0,0 +1,173 @@
+import os
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY, Counter, Gauge, values
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from chats.tests.test_chats_api import CHATS_URL
+from chats.tests.test_consumers import (IN_MEMORY_CHANNEL_LAYERS,
+                                        get_communicator, receive_message)
+from core.helpers import sample_user
+from core.metrics import mark_process_dead
+
+METRICS_URL = reverse("metrics")
+METRICS_TOKEN = "scrape-secret"
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(METRICS_TOKEN=METRICS_TOKEN)
+class TestMetrics(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+        self.client.force_authenticate(user=self.user_1)
+
+    def test_requests_are_recorded_by_view(self) -> None:
+        """Test latency, status and database queries are recorded per view"""
+        labels = {"view": "ChatView", "method": "POST"}
+        requests = sample_value("http_request_duration_seconds_count", **labels)
+        created = sample_value("http_requests_total", status="201", **labels)
+        queries = sample_value("http_request_db_queries_sum", view="ChatView")
+
+        response = self.client.post(CHATS_URL, {"other_username": self.user_2.username})
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sample_value("http_request_duration_seconds_count", **labels),
+            requests + 1,
+        )
+        self.assertEqual(
+            sample_value("http_requests_total", status="201", **labels), created + 1
+        )
+        self.assertGreater(
+            sample_value("http_request_db_queries_sum", view="ChatView"), queries
+        )
+
+    def test_metrics_endpoint_exposes_all_metrics(self) -> None:
+        """Test /metrics serves the text exposition format"""
+        self.client.get(CHATS_URL, {"other_username": self.user_2.username})
+
+        response = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION=f"Bearer {METRICS_TOKEN}"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        for name in (
+            "http_request_duration_seconds_bucket",
+            "http_request_db_seconds_sum",
+            "chat_websockets",
+            "chat_group_send_seconds_count",
+            "chat_room_batch_frames_bucket",
+            "channel_layer_queue_depth",
+        ):
+            self.assertIn(name, body)
+
+    def test_metrics_token_is_required(self) -> None:
+        """Test scrapers without the token are refused"""
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION="Bearer another-secret"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(METRICS_TOKEN="")
+    def test_metrics_are_not_served_without_a_token(self) -> None:
+        """Test /metrics is closed until a token is configured"""
+        response = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_of_all_workers_are_merged_in_multiprocess_mode(self) -> None:
+        """Test values written by other worker processes are served"""
+        with tempfile.TemporaryDirectory() as path, mock.patch.dict(
+            os.environ, {"PROMETHEUS_MULTIPROC_DIR": path}
+        ):
+            for pid in (101, 102):
+                with mock.patch.object(
+                    values, "ValueClass", values.MultiProcessValue(lambda: pid)
+                ):
+                    Counter("worker_jobs", "Jobs", registry=None).inc(pid)
+
+            response = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION=f"Bearer {METRICS_TOKEN}"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("worker_jobs_total 203.0", response.content.decode())
+
+    def test_gauges_of_exited_workers_are_dropped(self) -> None:
+        """Test a worker's live gauges stop counting once it marks itself dead"""
+        with tempfile.TemporaryDirectory() as path, mock.patch.dict(
+            os.environ, {"PROMETHEUS_MULTIPROC_DIR": path}
+        ):
+            for pid in (101, 102):
+                with mock.patch.object(
+                    values, "ValueClass", values.MultiProcessValue(lambda: pid)
+                ):
+                    Gauge(
+                        "worker_sockets",
+                        "Sockets",
+                        registry=None,
+                        multiprocess_mode="livesum",
+                    ).set(pid)
+
+            with mock.patch("os.getpid", return_value=101):
+                mark_process_dead()
+            response = self.client.get(
+                METRICS_URL, HTTP_AUTHORIZATION=f"Bearer {METRICS_TOKEN}"
+            )
+
+        self.assertIn("worker_sockets 102.0", response.content.decode())
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class TestWebsocketMetrics(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user_1 = sample_user()
+        self.user_2 = sample_user(username="another_user")
+
+    def test_sockets_and_frames_are_counted(self) -> None:
+        """Test open sockets, frames and group sends are recorded"""
+        sockets = sample_value("chat_websockets", consumer="ChatConsumer")
+        frames_in = sample_value("chat_websocket_frames_total", direction="in")
+        frames_out = sample_value("chat_websocket_frames_total", direction="out")
+        group_sends = sample_value("chat_group_send_seconds_count")
+
+        async def run():
+            sender = get_communicator(self.user_1, self.user_2.username)
+            await sender.connect()
+            self.assertEqual(
+                sample_value("chat_websockets", consumer="ChatConsumer"), sockets + 1
+            )
+            await sender.send_to(text_data="hello")
+            await receive_message(sender)
+            await sender.disconnect()
+
+        async_to_sync(run)()
+
+        self.assertEqual(
+            sample_value("chat_websockets", consumer="ChatConsumer"), sockets
+        )
+        self.assertEqual(
+            sample_value("chat_websocket_frames_total", direction="in"), frames_in + 1
+        )
+        # The presence frame and the message
+        self.assertEqual(
+            sample_value("chat_websocket_frames_total", direction="out"),
+            frames_out + 2,
+        )
+        self.assertGreaterEqual(
+            sample_value("chat_group_send_seconds_count"), group_sends + 1
+        )
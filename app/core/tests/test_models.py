@@ -84,6 +84,32 @@ class TestThreadModel(TestCase):
 
         self.assertEqual(str(thread), str(thread_query))
 
+    def test_get_or_create_personal_thread_creates_thread(self) -> None:
+        """Test a personal thread is created with both users and its key"""
+        thread, created = models.Thread.objects.get_or_create_personal_thread(
+            self.user_1, self.user_2
+        )
+
+        self.assertTrue(created)
+        self.assertEqual(thread.thread_type, "personal")
+        self.assertEqual(thread.personal_key, f"{self.user_1.id}:{self.user_2.id}")
+        self.assertEqual(set(thread.users.all()), {self.user_1, self.user_2})
+
+    def test_get_or_create_personal_thread_is_order_independent(self) -> None:
+        """Test both users resolve the same personal thread in one query"""
+        thread, _ = models.Thread.objects.get_or_create_personal_thread(
+            self.user_1, self.user_2
+        )
+
+        with self.assertNumQueries(1):
+            other_thread, created = models.Thread.objects.get_or_create_personal_thread(
+                self.user_2, self.user_1
+            )
+
+        self.assertFalse(created)
+        self.assertEqual(thread, other_thread)
+        self.assertEqual(models.Thread.objects.count(), 1)
+
 
 class TestMessageModel(TestCase):
     def setUp(self) -> None:
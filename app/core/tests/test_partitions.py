@@ -0,0 +1,48 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+
+from core import models, partitions
+from core.helpers import sample_user
+from core.tests import utils
+
+
+class TestMessagePartitions(TestCase):
+    def setUp(self) -> None:
+        if not partitions.supports_partitioning(connection):
+            self.skipTest("Needs PostgreSQL 13 or later")
+        self.message = utils.sample_create_message(
+            user_1=sample_user(), user_2=sample_user(username="another_user")
+        )
+
+    def test_messages_table_is_partitioned(self) -> None:
+        """Test migrations partition messages by month up to months ahead"""
+        self.assertTrue(partitions.is_partitioned(connection))
+        current = partitions.month_start(self.message.created_at)
+        self.assertIn(current, partitions.month_partitions(connection))
+
+    def test_new_partition_takes_rows_from_default_partition(self) -> None:
+        """Test creating a partition moves its month out of the default one"""
+        month = datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc)
+        models.Message.objects.filter(id=self.message.id).update(
+            created_at=month + datetime.timedelta(days=3)
+        )
+
+        name = partitions.create_month_partition(connection, month)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {name}")
+            self.assertEqual(cursor.fetchall(), [(self.message.id,)])
+        self.assertTrue(models.Message.objects.filter(search_vector="hello").exists())
+
+    def test_drop_empty_partitions(self) -> None:
+        """Test only empty partitions of past months are dropped"""
+        month = datetime.datetime(1999, 1, 1, tzinfo=datetime.timezone.utc)
+        partitions.create_month_partition(connection, month)
+
+        dropped = partitions.drop_empty_partitions(
+            connection, partitions.add_months(month, 1)
+        )
+
+        self.assertEqual(dropped, [partitions.partition_name(month)])
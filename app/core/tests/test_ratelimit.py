@@ -0,0 +1,85 @@
+from unittest.mock import Mock
+
+import redis
+from django.test import SimpleTestCase, override_settings
+
+from core.ratelimit import RateLimiter, TokenBucket
+
+
+class TestTokenBucket(SimpleTestCase):
+    def test_burst_then_refill(self) -> None:
+        """Test a bucket allows its burst then refills at its rate"""
+        bucket = TokenBucket(rate=2, burst=3)
+        now = bucket.updated
+
+        self.assertEqual([bucket.consume(now=now) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.consume(now=now), 0.5)
+        self.assertEqual(bucket.consume(now=now + 0.5), 0)
+        self.assertAlmostEqual(bucket.consume(now=now + 0.5), 0.5)
+
+    def test_refill_is_capped_at_burst(self) -> None:
+        """Test an idle bucket never holds more than its burst"""
+        bucket = TokenBucket(rate=10, burst=2)
+        now = bucket.updated + 60
+
+        self.assertEqual([bucket.consume(now=now) for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.consume(now=now), 0)
+
+
+@override_settings(RATE_LIMITS={"test": "1/2", "off": ""})
+class TestRateLimiter(SimpleTestCase):
+    def test_local_limits_each_identity(self) -> None:
+        """Test identities of a scope have their own buckets"""
+        limiter = RateLimiter()
+
+        self.assertEqual([limiter.consume("test", 1) for _ in range(2)], [0, 0])
+        self.assertGreater(limiter.consume("test", 1), 0)
+        self.assertEqual(limiter.consume("test", 2), 0)
+
+    def test_scope_without_limit_always_allows(self) -> None:
+        """Test an empty or unknown limit lets everything through"""
+        limiter = RateLimiter()
+
+        self.assertEqual({limiter.consume("off", 1) for _ in range(10)}, {0})
+        self.assertEqual(limiter.consume("unknown", 1), 0)
+
+    @override_settings(RATE_LIMIT_BACKEND="redis")
+    def test_redis_failure_falls_back_to_local_buckets(self) -> None:
+        """Test limits still apply in this process while Redis is down"""
+        limiter = RateLimiter()
+        limiter._script = Mock(side_effect=redis.ConnectionError)
+
+        with self.assertLogs("core.ratelimit", "ERROR"):
+            waits = [limiter.consume("test", 1) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertGreater(waits[2], 0)
+
+
+@override_settings(RATE_LIMITS={"test": "1/2"}, RATE_LIMIT_BACKEND="redis")
+class TestSharedRateLimiter(SimpleTestCase):
+    def setUp(self) -> None:
+        self.limiter = RateLimiter()
+        try:
+            self.limiter.script.registered_client.delete("ratelimit:test:1")
+        except redis.RedisError:
+            self.skipTest("Redis is not available")
+
+    def test_buckets_are_shared_between_processes(self) -> None:
+        """Test limiters of two processes take from the same bucket"""
+        other = RateLimiter()
+
+        self.assertEqual(self.limiter.consume("test", 1), 0)
+        self.assertEqual(other.consume("test", 1), 0)
+        wait = self.limiter.consume("test", 1)
+
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+        self.assertEqual(self.limiter.local.buckets, {})
+
+    def test_bucket_key_expires(self) -> None:
+        """Test idle buckets do not stay in Redis"""
+        self.limiter.consume("test", 1)
+        client = self.limiter.script.registered_client
+
+        self.assertGreater(client.ttl("ratelimit:test:1"), 0)
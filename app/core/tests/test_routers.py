@@ -0,0 +1,97 @@
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import models
+from core.helpers import sample_user
+from core.routers import (ReplicaRouter, is_pinned_to_primary, pin_cache,
+                          pin_to_primary, read_from_replica,
+                          warn_pins_not_shared)
+from core.tests import utils
+
+# A cache every process of a host sees, standing in for Redis
+SHARED_CACHES = {
+    **settings.CACHES,
+    "pins": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.gettempdir() + "/replica_pins",
+    },
+}
+
+
+@override_settings(
+    REPLICA_DATABASES=["replica_0"],
+    REPLICA_PIN_SECONDS=5,
+    CACHES=SHARED_CACHES,
+    REPLICA_PIN_CACHE="pins",
+)
+class TestReplicaRouter(TestCase):
+    def setUp(self) -> None:
+        pin_cache().clear()
+        self.router = ReplicaRouter()
+        self.user = sample_user()
+
+    def test_reads_go_to_primary_by_default(self) -> None:
+        """Test reads outside read_from_replica use the default database"""
+        self.assertIsNone(self.router.db_for_read(models.Message))
+
+    def test_reads_in_replica_block_go_to_replica(self) -> None:
+        """Test reads inside read_from_replica go to a replica"""
+        with read_from_replica(self.user):
+            self.assertEqual(self.router.db_for_read(models.Message), "replica_0")
+        self.assertIsNone(self.router.db_for_read(models.Message))
+
+    def test_writes_always_go_to_primary(self) -> None:
+        """Test writes inside read_from_replica still go to default"""
+        with read_from_replica(self.user):
+            self.assertEqual(self.router.db_for_write(models.Message), "default")
+
+    def test_pinned_user_reads_from_primary(self) -> None:
+        """Test a user who just wrote keeps reading from the primary"""
+        pin_to_primary(self.user)
+
+        with read_from_replica(self.user):
+            self.assertIsNone(self.router.db_for_read(models.Message))
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas_skips_pins(self) -> None:
+        """Test nothing is pinned when there is no replica to avoid"""
+        pin_to_primary(self.user)
+
+        self.assertFalse(is_pinned_to_primary(self.user))
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas_reads_from_primary(self) -> None:
+        """Test reads stay on the primary when no replica is configured"""
+        with read_from_replica(self.user):
+            self.assertIsNone(self.router.db_for_read(models.Message))
+
+    @override_settings(REPLICA_PIN_CACHE="default")
+    def test_process_local_pins_keep_reads_on_primary(self) -> None:
+        """Test replicas are not read while pins cannot reach other processes"""
+        warn_pins_not_shared.cache_clear()
+        with self.assertLogs("core.routers", "WARNING"):
+            with read_from_replica(self.user):
+                self.assertIsNone(self.router.db_for_read(models.Message))
+
+    def test_replicas_are_not_migrated(self) -> None:
+        """Test migrations only run against the primary"""
+        self.assertFalse(self.router.allow_migrate("replica_0", "core"))
+        self.assertIsNone(self.router.allow_migrate("default", "core"))
+
+    def test_unsafe_request_pins_user(self) -> None:
+        """Test marking a thread read pins the user to the primary"""
+        other_user = sample_user(username="another_user")
+        message = utils.sample_create_message(user_1=self.user, user_2=other_user)
+        client = APIClient()
+        client.force_authenticate(user=other_user)
+
+        res = client.post(reverse("chats:thread_read", args=[message.thread.id]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(is_pinned_to_primary(other_user))
+        self.assertFalse(is_pinned_to_primary(self.user))
@@ -0,0 +1,42 @@
+from autobahn.websocket.compress import (PerMessageDeflateOffer,
+                                         PerMessageDeflateOfferAccept)
+from django.test import SimpleTestCase, override_settings
+
+from app.server import accept_deflate
+
+
+def deflate_offer(request_max_window_bits=0):
+    return PerMessageDeflateOffer(
+        accept_no_context_takeover=True,
+        accept_max_window_bits=True,
+        request_no_context_takeover=False,
+        request_max_window_bits=request_max_window_bits,
+    )
+
+
+@override_settings(
+    WEBSOCKET_COMPRESSION_WINDOW_BITS=11, WEBSOCKET_COMPRESSION_MEM_LEVEL=4
+)
+class TestAcceptDeflate(SimpleTestCase):
+    def test_offer_is_accepted_with_configured_window(self) -> None:
+        """Test the server window and memory level come from settings"""
+        accept = accept_deflate([deflate_offer()])
+
+        self.assertIsInstance(accept, PerMessageDeflateOfferAccept)
+        self.assertEqual((accept.window_bits, accept.mem_level), (11, 4))
+
+    def test_smaller_window_requested_by_client_is_used(self) -> None:
+        """Test a client asking for a smaller window gets it"""
+        accept = accept_deflate([deflate_offer(request_max_window_bits=9)])
+
+        self.assertEqual((accept.window_bits, accept.mem_level), (9, 4))
+
+    def test_other_offers_are_declined(self) -> None:
+        """Test no extension is accepted without a permessage-deflate offer"""
+        self.assertIsNone(accept_deflate([object()]))
+
+    @override_settings(WEBSOCKET_COMPRESSION_WINDOW_BITS=20)
+    def test_invalid_settings_are_not_hidden(self) -> None:
+        """Test a window autobahn does not support fails the handshake"""
+        with self.assertRaises(Exception):
+            accept_deflate([deflate_offer()])
@@ -5,6 +5,7 @@ def sample_create_thread(user_1: models.User, user_2: models.User) -> models.Thr
     """Create Thread model object"""
     thread = models.Thread.objects.create(
         name="new_thread",
+        personal_key=models.personal_thread_key(user_1, user_2),
     )
 
     thread.users.add(user_1)
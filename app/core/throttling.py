@@ -0,0 +1,52 @@
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from core.ratelimit import rate_limiter
+
+
+def client_address(forwarded_for, remote_addr):
+    """Address of a client behind the NUM_PROXIES trusted proxies
+
+    Only the X-Forwarded-For entry appended by the outermost trusted proxy
+    is used, the entries before it are whatever the client sent.
+    """
+    num_proxies = api_settings.NUM_PROXIES
+    if not num_proxies or not forwarded_for:
+        return remote_addr
+    addrs = forwarded_for.split(",")
+    return addrs[-min(num_proxies, len(addrs))].strip()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle API requests with a RATE_LIMITS token bucket"""
+
+    scope = None
+
+    def get_ident_key(self, request):
+        return client_address(
+            request.META.get("HTTP_X_FORWARDED_FOR"), request.META.get("REMOTE_ADDR")
+        )
+
+    def allow_request(self, request, view):
+        self.retry_after = rate_limiter.consume(self.scope, self.get_ident_key(request))
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class ChatRateThrottle(TokenBucketThrottle):
+    """Requests of an authenticated user"""
+
+    scope = "chats"
+
+    def get_ident_key(self, request):
+        if request.user.is_authenticated:
+            return request.user.pk
+        return super().get_ident_key(request)
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    """Token requests of a client address"""
+
+    scope = "login"
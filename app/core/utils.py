@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from rest_framework import status
+from rest_framework.exceptions import Throttled
 from rest_framework.views import Response, exception_handler
 
 
@@ -12,7 +13,11 @@ def custom_exception_handler(message, context):
 
     response = exception_handler(message, context)
 
-    if isinstance(message, IntegrityError) and not response:
+    if isinstance(message, Throttled) and response:
+        # a structured error clients can back off with
+        response.data = throttled_error(message)
+
+    elif isinstance(message, IntegrityError) and not response:
         # if there is an IntegrityError and the error response
         # hasn't already been generated
         response = Response(
@@ -29,6 +34,13 @@ def custom_exception_handler(message, context):
     return response
 
 
+def throttled_error(exc):
+    """
+    body of a throttled request
+    """
+    return {"detail": str(exc.detail), "code": "throttled", "retry_after": exc.wait}
+
+
 def validation_error(message, code=None, field="__all__", params=None):
     """
     standardizes validation errors
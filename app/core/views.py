@@ -0,0 +1,41 @@
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, generate_latest,
+                               multiprocess)
+
+from core.metrics import channel_layer_sampler
+
+
+def metrics_registry():
+    """Registry merging the metrics of every worker in multiprocess mode
+
+    Multiprocess mode is on when PROMETHEUS_MULTIPROC_DIR is set in the
+    environment of the server before it starts.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics(request):
+    """Prometheus metrics of the server
+
+    Only served when METRICS_TOKEN is set, scrapers must send it as a bearer
+    token.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not constant_time_compare(
+        request.META.get("HTTP_AUTHORIZATION", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+    channel_layer_sampler.sample()
+    return HttpResponse(
+        generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.models import update_last_login
+from rest_framework_simplejwt.settings import api_settings
+
+from core.models import User
+
+_executor = None
+_waiting = 0
+
+
+class HashQueueFull(Exception):
+    """Raised when too many logins are waiting for the hashing executor"""
+
+
+def get_login_user(username):
+    """Fetch the user logging in with a single query, None when unknown"""
+    if not username:
+        return None
+    return User.objects.filter(username=username).first()
+
+
+def check_login_password(user, password):
+    """Check the password of a user logging in
+
+    Returns whether it is valid and the new hash when the stored one uses
+    outdated hasher settings. Unknown users still run the hasher so timing
+    does not reveal which usernames exist.
+    """
+    if user is None or not password:
+        hashers.make_password(password)
+        return False, None
+    upgraded = []
+    valid = hashers.check_password(
+        password,
+        user.password,
+        setter=lambda raw_password: upgraded.append(
+            hashers.make_password(raw_password)
+        ),
+    )
+    return valid and user.is_active, upgraded[0] if upgraded else None
+
+
+def complete_login(user, upgraded_password, token_serializer):
+    """Store an upgraded password hash and return the token pair of a user"""
+    if upgraded_password is not None:
+        user.password = upgraded_password
+        User.objects.filter(id=user.id).update(password=upgraded_password)
+    refresh = token_serializer.get_token(user)
+    if api_settings.UPDATE_LAST_LOGIN:
+        update_last_login(None, user)
+    return {"refresh": str(refresh), "access": str(refresh.access_token)}
+
+
+def get_hash_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.LOGIN_HASH_THREADS, thread_name_prefix="login-hash"
+        )
+    return _executor
+
+
+async def run_hash(func, *args):
+    """Run a password hash off the event loop in the bounded executor
+
+    hashlib releases the GIL while hashing, so the threads hash in parallel
+    while the loop keeps serving other requests. Raises HashQueueFull
+    instead of queueing more than LOGIN_HASH_QUEUE_SIZE hashes.
+    """
+    global _waiting
+    if _waiting >= settings.LOGIN_HASH_QUEUE_SIZE:
+        raise HashQueueFull
+    _waiting += 1
+    try:
+        return await asyncio.get_event_loop().run_in_executor(
+            get_hash_executor(), partial(func, *args)
+        )
+    finally:
+        _waiting -= 1
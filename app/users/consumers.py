@@ -0,0 +1,114 @@
+import json
+import time
+
+from channels.consumer import SyncConsumer
+from channels.db import database_sync_to_async
+from channels.generic.http import AsyncHttpConsumer
+from django.http import QueryDict
+from rest_framework.exceptions import Throttled
+
+from core.metrics import REQUEST_LATENCY, REQUESTS, method_label
+from core.ratelimit import rate_limiter
+from core.throttling import client_address
+from core.utils import throttled_error
+from users.auth import (HashQueueFull, check_login_password, complete_login,
+                        get_login_user, run_hash)
+from users.serializers import LoginSerializer
+from users.thumbnails import generate_thumbnails
+
+
+class ThumbnailConsumer(SyncConsumer):
+    """Worker rendering profile picture thumbnails
+
+    Run with ``python manage.py runworker thumbnails`` and THUMBNAIL_WORKER
+    set, otherwise thumbnails are rendered by a local thread pool.
+    """
+
+    def thumbnails_generate(self, message):
+        generate_thumbnails(message["user_id"], message["picture_name"])
+
+
+class LoginConsumer(AsyncHttpConsumer):
+    """Async token endpoint, served at ``v1/users/token/async/`` over ASGI
+
+    Takes the same JSON or form body and returns the same tokens and errors
+    as ``v1/users/token/``. The password hash runs in the bounded login
+    hash executor so slow hashes do not hold up other requests; when its
+    queue is full the endpoint answers 503 right away. Client addresses
+    share the "login" rate limit of the sync endpoint.
+    """
+
+    async def handle(self, body):
+        self.started = time.perf_counter()
+        if self.scope["method"] != "POST":
+            await self.send_json(
+                405, {"detail": f'Method "{self.scope["method"]}" not allowed.'}
+            )
+            return
+        try:
+            data = self.parse_body(body)
+        except ValueError:
+            await self.send_json(400, {"detail": "Malformed request."})
+            return
+        wait = await rate_limiter.aconsume("login", self.client_address())
+        if wait:
+            throttled = Throttled(wait)
+            await self.send_json(
+                429,
+                throttled_error(throttled),
+                headers=[(b"Retry-After", str(throttled.wait).encode())],
+            )
+            return
+
+        user = await database_sync_to_async(get_login_user)(data.get("username"))
+        try:
+            valid, upgraded_password = await run_hash(
+                check_login_password, user, data.get("password")
+            )
+        except HashQueueFull:
+            await self.send_json(
+                503,
+                {"detail": "Too many logins, try again shortly."},
+                headers=[(b"Retry-After", b"1")],
+            )
+            return
+        if not valid:
+            await self.send_json(
+                401,
+                {"detail": str(LoginSerializer.login_failed().detail)},
+                headers=[(b"WWW-Authenticate", b'Bearer realm="api"')],
+            )
+            return
+        tokens = await database_sync_to_async(complete_login)(
+            user, upgraded_password, LoginSerializer
+        )
+        await self.send_json(200, tokens)
+
+    def parse_body(self, body):
+        headers = dict(self.scope["headers"])
+        content_type = headers.get(b"content-type", b"").decode("latin1")
+        if content_type.startswith("application/json"):
+            data = json.loads(body or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+            return data
+        return QueryDict(body.decode("utf-8"))
+
+    async def send_json(self, status, data, headers=()):
+        method = method_label(self.scope["method"])
+        REQUEST_LATENCY.labels("LoginConsumer", method).observe(
+            time.perf_counter() - self.started
+        )
+        REQUESTS.labels("LoginConsumer", method, status).inc()
+        await self.send_response(
+            status,
+            json.dumps(data).encode("utf-8"),
+            headers=[(b"Content-Type", b"application/json"), *headers],
+        )
+
+    def client_address(self):
+        client = self.scope.get("client")
+        forwarded_for = dict(self.scope["headers"]).get(b"x-forwarded-for", b"")
+        return client_address(
+            forwarded_for.decode("latin1"), client[0] if client else ""
+        )
@@ -0,0 +1,75 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import User
+from users.management.commands.import_users import (IMPORTED_FIELDS,
+                                                    file_format_of)
+
+
+class Command(BaseCommand):
+    """Django command to bulk export users to a CSV or JSON lines file"""
+
+    help = (
+        "Stream every user, ordered by id, to a CSV or JSON lines file that "
+        "import_users reads back. Pass - as the path to write to stdout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "jsonl"))
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--password-hashes",
+            action="store_true",
+            help="Include password hashes so imported users keep their password",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        to_stdout = options["path"] == "-"
+        file_format = (
+            options["format"] or "jsonl"
+            if to_stdout
+            else file_format_of(options["path"], options["format"])
+        )
+        fields = IMPORTED_FIELDS
+        created_on = fields.index("created_on")
+        columns, selected = fields, fields
+        if options["password_hashes"]:
+            columns, selected = fields + ("password_hash",), fields + ("password",)
+        queryset = User.objects.order_by("id").values_list(*selected)
+
+        started = time.perf_counter()
+        count = 0
+        file = (
+            sys.stdout
+            if to_stdout
+            else open(options["path"], "w", newline="", encoding="utf-8")
+        )
+        try:
+            writer = csv.writer(file) if file_format == "csv" else None
+            if writer is not None:
+                writer.writerow(columns)
+            # iterator() streams from a server-side cursor on PostgreSQL
+            for row in queryset.iterator(chunk_size=options["batch_size"]):
+                row = list(row)
+                if row[created_on] is not None:
+                    row[created_on] = row[created_on].isoformat()
+                if writer is not None:
+                    writer.writerow(row)
+                else:
+                    file.write(json.dumps(dict(zip(columns, row))) + "\n")
+                count += 1
+        finally:
+            if not to_stdout:
+                file.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f"Exported {count} users in {elapsed:.2f}s "
+            f"({count / elapsed if elapsed else 0:.0f} rows/s)"
+        )
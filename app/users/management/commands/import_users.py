@@ -0,0 +1,222 @@
+import csv
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import (UNUSABLE_PASSWORD_PREFIX,
+                                         identify_hasher, make_password)
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Case, Value, When
+from django.utils.dateparse import parse_datetime
+
+from core.models import User
+
+IMPORTED_FIELDS = ("username", "first_name", "last_name", "is_active", "created_on")
+NAME_FIELDS = ("first_name", "last_name")
+
+
+def read_rows(file, file_format):
+    """Stream dict rows from a CSV (with header) or JSON lines file"""
+    if file_format == "csv":
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def parse_is_active(value):
+    """True, False, or None when the value is not a boolean"""
+    if value is None or value == "":
+        return True
+    if isinstance(value, bool):
+        return value
+    return {"true": True, "1": True, "false": False, "0": False}.get(str(value).lower())
+
+
+def hash_passwords(passwords):
+    return [make_password(password) for password in passwords]
+
+
+def file_format_of(path, file_format):
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in ("csv", "jsonl"):
+        raise CommandError("Use a .csv or .jsonl file, or pass --format")
+    return file_format
+
+
+class Command(BaseCommand):
+    """Django command to bulk import users from a CSV or JSON lines file"""
+
+    help = (
+        "Stream users from a CSV or JSON lines file with a username and "
+        "optional first_name, last_name, is_active, created_on and password "
+        "or password_hash. "
+        "Passwords are hashed in a process pool and users inserted with "
+        "bulk_create in batches; existing usernames are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "jsonl"))
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Password hashing processes, 0 hashes in this process",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        file_format = file_format_of(options["path"], options["format"])
+        self.processes = options["processes"]
+        self.pool = ProcessPoolExecutor(self.processes) if self.processes else None
+        self.created = self.skipped = self.invalid = 0
+
+        started = time.perf_counter()
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as file:
+                rows = read_rows(file, file_format)
+                # Hash the next batch in the pool while inserting the current one
+                pending = None
+                while True:
+                    batch = list(islice(rows, options["batch_size"]))
+                    hashing = self.start_hashing(batch) if batch else None
+                    if pending is not None:
+                        self.insert(*pending)
+                    if not batch:
+                        break
+                    pending = (batch, hashing)
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        total = self.created + self.skipped + self.invalid
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {self.created} users, skipped {self.skipped} existing "
+                f"and {self.invalid} invalid rows in {elapsed:.2f}s "
+                f"({total / elapsed if elapsed else 0:.0f} rows/s)"
+            )
+        )
+
+    def start_hashing(self, batch):
+        """Start hashing the plain passwords of a batch, returns a callable
+        giving the hashes in batch order once they are ready
+        """
+        passwords = [row.get("password") or None for row in batch]
+        to_hash = [password for password in passwords if password]
+        if self.pool is None:
+            hashes = iter(hash_passwords(to_hash))
+            return lambda: [
+                next(hashes) if password else None for password in passwords
+            ]
+
+        chunk_size = max(1, math.ceil(len(to_hash) / (self.processes * 4)))
+        futures = [
+            self.pool.submit(hash_passwords, to_hash[i : i + chunk_size])
+            for i in range(0, len(to_hash), chunk_size)
+        ]
+
+        def result():
+            hashes = iter(
+                password_hash for future in futures for password_hash in future.result()
+            )
+            return [next(hashes) if password else None for password in passwords]
+
+        return result
+
+    def insert(self, batch, hashing):
+        users = {}
+        for row, password_hash in zip(batch, hashing()):
+            user = self.build_user(row, password_hash)
+            if user is None:
+                self.invalid += 1
+            elif user.username in users:
+                self.skipped += 1
+            else:
+                users[user.username] = user
+
+        # bulk_create stamps created_on with the current time
+        created_on = {
+            user.username: user.created_on
+            for user in users.values()
+            if user.created_on is not None
+        }
+        # Usernames taken before or during the insert are skipped by the
+        # database, so concurrent signups cannot fail the batch
+        User.objects.bulk_create(users.values(), ignore_conflicts=True)
+        created = self.created_usernames(users.values())
+        self.restore_created_on(
+            {
+                username: date
+                for username, date in created_on.items()
+                if username in created
+            }
+        )
+        self.created += len(created)
+        self.skipped += len(users) - len(created)
+
+    def created_usernames(self, users):
+        """Usernames of the users bulk_create inserted, by their created_on
+
+        Rows that already existed kept their own creation date.
+        """
+        stamps = {user.username: user.created_on for user in users}
+        return {
+            username
+            for username, created_on in User.objects.filter(
+                username__in=stamps
+            ).values_list("username", "created_on")
+            if created_on == stamps[username]
+        }
+
+    def restore_created_on(self, created_on):
+        """Set the imported creation dates, by username"""
+        if created_on:
+            User.objects.filter(username__in=created_on).update(
+                created_on=Case(
+                    *(
+                        When(username=username, then=Value(date))
+                        for username, date in created_on.items()
+                    )
+                )
+            )
+
+    def build_user(self, row, password_hash):
+        username = (row.get("username") or "").strip()
+        if not username:
+            return None
+        is_active = parse_is_active(row.get("is_active"))
+        if is_active is None:
+            return None
+        created_on = row.get("created_on") or None
+        if created_on is not None:
+            try:
+                created_on = parse_datetime(created_on)
+            except ValueError:
+                created_on = None
+            if created_on is None:
+                return None
+        password_hash = password_hash or row.get("password_hash") or None
+        if password_hash is not None and not password_hash.startswith(
+            UNUSABLE_PASSWORD_PREFIX
+        ):
+            try:
+                identify_hasher(password_hash)
+            except ValueError:
+                return None
+        user = User(
+            **{field: row.get(field) or None for field in NAME_FIELDS},
+            username=username,
+            is_active=is_active,
+            created_on=created_on,
+        )
+        # make_password(None) sets an unusable password
+        user.password = password_hash or make_password(None)
+        return user
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import time
+
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from app.routing import http_urlpatterns
+from chats.management.commands.chat_loadtest import percentile
+from core.models import User
+from users.views import LoginView
+
+USERNAME_PREFIX = "logintest_"
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the sync and async token endpoints"""
+
+    help = (
+        "Log N users in through the sync token view, one at a time as a "
+        "single worker would, then through the async token endpoint with "
+        "--concurrency logins in flight. Reports logins/s, latency, and how "
+        "long a concurrent request waits on the event loop during the storm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        self.create_users(options["logins"])
+        try:
+            self.run_sync(options["logins"])
+            asyncio.run(self.run_async(options["logins"], options["concurrency"]))
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def create_users(self, count):
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            User(username=f"{USERNAME_PREFIX}{i}", password=password)
+            for i in range(count)
+        )
+
+    def report(self, name, latencies, elapsed):
+        self.stdout.write(
+            f"{name}: {len(latencies)} logins in {elapsed:.2f}s "
+            f"({len(latencies) / elapsed:.1f} logins/s) - "
+            f"p50 {percentile(latencies, 50) * 1000:.1f}ms "
+            f"p99 {percentile(latencies, 99) * 1000:.1f}ms"
+        )
+
+    def run_sync(self, logins):
+        view = LoginView.as_view()
+        factory = APIRequestFactory()
+        latencies = []
+        started = time.perf_counter()
+        for i in range(logins):
+            sent_at = time.perf_counter()
+            request = factory.post(
+                "/v1/users/token/",
+                {"username": f"{USERNAME_PREFIX}{i}", "password": PASSWORD},
+                format="json",
+            )
+            response = view(request)
+            assert response.status_code == 200, response.data
+            latencies.append(time.perf_counter() - sent_at)
+        self.report("sync", latencies, time.perf_counter() - started)
+
+    async def run_async(self, logins, concurrency):
+        application = URLRouter(http_urlpatterns)
+        latencies = []
+        statuses = {}
+        next_login = iter(range(logins))
+
+        async def login_worker():
+            for i in next_login:
+                body = json.dumps(
+                    {"username": f"{USERNAME_PREFIX}{i}", "password": PASSWORD}
+                )
+                communicator = HttpCommunicator(
+                    application,
+                    "POST",
+                    "/v1/users/token/async/",
+                    body=body.encode(),
+                    headers=[(b"content-type", b"application/json")],
+                )
+                sent_at = time.perf_counter()
+                response = await communicator.get_response(timeout=60)
+                latencies.append(time.perf_counter() - sent_at)
+                statuses[response["status"]] = statuses.get(response["status"], 0) + 1
+
+        # Measures how late a 10ms timer fires while logins are hashed
+        lags = []
+        storm = asyncio.gather(*(login_worker() for _ in range(concurrency)))
+
+        async def probe():
+            while not storm.done():
+                scheduled = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - scheduled - 0.01)
+
+        started = time.perf_counter()
+        await asyncio.gather(storm, probe())
+        self.report("async", latencies, time.perf_counter() - started)
+        self.stdout.write(
+            f"Responses by status {statuses} - event loop lag "
+            f"p50 {percentile(lags, 50) * 1000:.1f}ms "
+            f"p99 {percentile(lags, 99) * 1000:.1f}ms"
+        )
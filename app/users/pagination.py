@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """Cursor pagination of the user directory ordered by the unique username"""
+
+    ordering = "username"
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
@@ -6,6 +6,8 @@ from rest_framework import exceptions, serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 from core.models import User
+from users.auth import check_login_password, complete_login, get_login_user
+from users.thumbnails import schedule_thumbnails
 from users.utils.whitelist import is_list_allowed
 
 
@@ -16,16 +18,12 @@ class AllUserSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "profile_picture",
+            "profile_thumbnail_small",
+            "profile_thumbnail_medium",
             "username",
             "created_on",
         )
-        read_only_fields = (
-            "first_name",
-            "last_name",
-            "profile_picture",
-            "username",
-            "created_on",
-        )
+        read_only_fields = fields
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -48,7 +46,10 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """Create a new user with encrypted password and return it"""
-        return get_user_model().objects.create_user(**validated_data)
+        user = get_user_model().objects.create_user(**validated_data)
+        if user.profile_picture:
+            schedule_thumbnails(user)
+        return user
 
     def update(self, instance, validated_data):
         """Update a user, setting the password correctly and return it"""
@@ -56,7 +57,10 @@ class UserSerializer(serializers.ModelSerializer):
         if password:
             instance.set_password(password)
             instance.save()
-        return super().update(instance, validated_data)
+        user = super().update(instance, validated_data)
+        if "profile_picture" in validated_data:
+            schedule_thumbnails(user)
+        return user
 
     def validate(self, data):
         # here data has all the fields which have validated values
@@ -96,31 +100,20 @@ class LoginSerializer(TokenObtainPairSerializer):
         )
 
     def validate(self, attrs):
-        # implement your logic here
-        try:
-            user_query = get_user_model().objects.filter(username=attrs["username"])
-
-            if user_query.exists():
-                if user_query.last().is_active:
-                    attrs["username"] = user_query.last().username
-                    data = super().validate(attrs)
-                    return data
-                else:
-                    raise exceptions.AuthenticationFailed(
-                        "This account is not active",
-                        "inactive_account",
-                    )
-
-            else:
-                raise exceptions.AuthenticationFailed(
-                    "Account not found",
-                    "account_not_found",
-                )
-        except Exception:
-            raise exceptions.AuthenticationFailed(
-                "Account not found",
-                "account_not_found",
-            )
+        """Authenticate with a single user fetch and return a token pair"""
+        user = get_login_user(attrs.get(self.username_field))
+        valid, upgraded_password = check_login_password(user, attrs.get("password"))
+        if not valid:
+            raise self.login_failed()
+        self.user = user
+        return complete_login(user, upgraded_password, self)
+
+    @staticmethod
+    def login_failed():
+        return exceptions.AuthenticationFailed(
+            "Account not found",
+            "account_not_found",
+        )
 
 
 class UserUpdateSerializer(serializers.ModelSerializer):
@@ -137,10 +130,18 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "profile_picture",
+            "profile_thumbnail_small",
+            "profile_thumbnail_medium",
+            "username",
+            "created_on",
+        )
+        read_only_fields = (
+            "id",
+            "profile_thumbnail_small",
+            "profile_thumbnail_medium",
             "username",
             "created_on",
         )
-        read_only_fields = ("id", "username", "created_on")
         extra_kwargs = {
             "password": {
                 "required": False,
@@ -165,7 +166,10 @@ class UserUpdateSerializer(serializers.ModelSerializer):
             instance.set_password(password)
             instance.save()
 
-        return super().update(instance, validated_data)
+        user = super().update(instance, validated_data)
+        if "profile_picture" in validated_data:
+            schedule_thumbnails(user)
+        return user
 
     def _isValidPassword(self, password):
         return self.context.get("request").user.check_password(password)
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from core.helpers import sample_user
+from core.models import User
+
+
+class TestUserImportExport(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def import_users(self, path, **options):
+        out = io.StringIO()
+        call_command("import_users", path, processes=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_csv(self) -> None:
+        """Test users are imported from a CSV file in batches"""
+        path = self.write_file(
+            "users.csv",
+            "username,first_name,password\n"
+            "ada,Ada,secret-1\n"
+            "grace,Grace,\n"
+            ",Nobody,secret-2\n",
+        )
+
+        output = self.import_users(path, batch_size=2)
+
+        self.assertIn("Created 2 users, skipped 0 existing and 1 invalid", output)
+        ada = User.objects.get(username="ada")
+        self.assertEqual(ada.first_name, "Ada")
+        self.assertTrue(ada.check_password("secret-1"))
+        self.assertFalse(User.objects.get(username="grace").has_usable_password())
+
+    def test_import_jsonl_skips_existing_usernames(self) -> None:
+        """Test existing and repeated usernames are skipped"""
+        sample_user(username="ada")
+        path = self.write_file(
+            "users.jsonl",
+            "\n".join(
+                json.dumps({"username": username, "password": "secret-1"})
+                for username in ("ada", "grace", "grace")
+            ),
+        )
+
+        output = self.import_users(path)
+
+        self.assertIn("Created 1 users, skipped 2 existing", output)
+        self.assertEqual(User.objects.filter(username="grace").count(), 1)
+
+    def test_import_leaves_taken_usernames_untouched(self) -> None:
+        """Test an imported username already taken keeps its user as is"""
+        ada = sample_user(username="ada")
+        path = self.write_file(
+            "users.csv",
+            "username,first_name,created_on\n"
+            "ada,Imported,2019-05-04T03:02:01+00:00\n"
+            "grace,Grace,2020-01-02T03:04:05+00:00\n",
+        )
+
+        output = self.import_users(path)
+
+        self.assertIn("Created 1 users, skipped 1 existing", output)
+        self.assertEqual(
+            User.objects.filter(username="ada")
+            .values_list("first_name", "created_on")
+            .get(),
+            (ada.first_name, ada.created_on),
+        )
+        self.assertEqual(
+            User.objects.get(username="grace").created_on,
+            datetime(2020, 1, 2, 3, 4, 5, tzinfo=utc),
+        )
+
+    def test_export_import_round_trip(self) -> None:
+        """Test exported password hashes still log users in once imported"""
+        sample_user(username="ada", password="secret-1")
+        grace = sample_user(username="grace")
+        grace.set_unusable_password()
+        grace.save()
+        path = os.path.join(self.directory, "users.csv")
+        call_command("export_users", path, password_hashes=True, stderr=io.StringIO())
+
+        with open(path, newline="", encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["username"] for row in rows], ["ada", "grace"])
+        User.objects.all().delete()
+
+        output = self.import_users(path)
+
+        self.assertIn("Created 2 users", output)
+        self.assertTrue(User.objects.get(username="ada").check_password("secret-1"))
+        self.assertFalse(User.objects.get(username="grace").has_usable_password())
+
+    def test_export_import_keeps_activity_and_creation_date(self) -> None:
+        """Test inactive users and creation dates survive a round trip"""
+        sample_user(username="ada")
+        grace = sample_user(username="grace")
+        User.objects.filter(id=grace.id).update(
+            is_active=False, created_on=datetime(2019, 5, 4, 3, 2, 1, tzinfo=utc)
+        )
+        expected = list(
+            User.objects.order_by("id").values_list(
+                "username", "is_active", "created_on"
+            )
+        )
+        for file_format in ("csv", "jsonl"):
+            path = os.path.join(self.directory, f"users.{file_format}")
+            call_command("export_users", path, stderr=io.StringIO())
+            User.objects.all().delete()
+
+            output = self.import_users(path)
+
+            self.assertIn("Created 2 users", output)
+            self.assertEqual(
+                list(
+                    User.objects.order_by("username").values_list(
+                        "username", "is_active", "created_on"
+                    )
+                ),
+                expected,
+            )
+
+    def test_import_rejects_invalid_activity_and_dates(self) -> None:
+        """Test rows with an unreadable is_active or created_on are invalid"""
+        path = self.write_file(
+            "users.csv",
+            "username,is_active,created_on\n"
+            "ada,maybe,\n"
+            "grace,False,yesterday\n"
+            "linus,0,2020-01-02T03:04:05+00:00\n",
+        )
+
+        output = self.import_users(path)
+
+        self.assertIn("Created 1 users, skipped 0 existing and 2 invalid", output)
+        linus = User.objects.get(username="linus")
+        self.assertFalse(linus.is_active)
+        self.assertEqual(linus.created_on, datetime(2020, 1, 2, 3, 4, 5, tzinfo=utc))
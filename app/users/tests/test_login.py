@@ -0,0 +1,191 @@
+import json
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import HttpCommunicator
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from app.routing import http_urlpatterns
+from core.helpers import sample_user
+from core.models import User
+from core.ratelimit import rate_limiter
+
+TOKEN_URL = reverse("users:token_obtain_pair")
+ASYNC_TOKEN_URL = "/v1/users/token/async/"
+
+
+def post_async_login(
+    payload, content_type=b"application/json", headers=(), client=None
+):
+    """POST to the async token endpoint, returns the status and JSON body"""
+    body = (
+        json.dumps(payload).encode()
+        if content_type == b"application/json"
+        else payload.encode()
+    )
+    communicator = HttpCommunicator(
+        URLRouter(http_urlpatterns),
+        "POST",
+        ASYNC_TOKEN_URL,
+        body=body,
+        headers=[(b"content-type", content_type), *headers],
+    )
+    if client is not None:
+        communicator.scope["client"] = [client, 50000]
+    response = async_to_sync(communicator.get_response)()
+    return response["status"], json.loads(response["body"])
+
+
+class TestLogin(TestCase):
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.user = sample_user(password="testpass001")
+
+    def test_login_fetches_the_user_once(self) -> None:
+        """Test a login runs a single query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                TOKEN_URL, {"username": "test_user", "password": "testpass001"}
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+
+    def test_inactive_user_cannot_login(self) -> None:
+        """Test an inactive account gets no token"""
+        User.objects.filter(id=self.user.id).update(is_active=False)
+
+        response = self.client.post(
+            TOKEN_URL, {"username": "test_user", "password": "testpass001"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data["detail"].code, "account_not_found")
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_work_factor_is_configurable(self) -> None:
+        """Test hashes use the configured iterations and upgrade on login"""
+        self.assertTrue(make_password("secret").startswith("pbkdf2_sha256$1000$"))
+
+        response = self.client.post(
+            TOKEN_URL, {"username": "test_user", "password": "testpass001"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+
+    @override_settings(RATE_LIMITS={"login": "1/1"})
+    def test_logins_over_rate_limit_are_throttled(self) -> None:
+        """Test a client address past the login limit gets a structured 429"""
+        rate_limiter.local.clear()
+        payload = {"username": "test_user", "password": "wrong"}
+
+        first = self.client.post(TOKEN_URL, payload)
+        second = self.client.post(TOKEN_URL, payload)
+        rate_limiter.local.clear()
+
+        self.assertEqual(first.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(second.data["code"], "throttled")
+        self.assertEqual(second.data["retry_after"], 1)
+
+    @override_settings(RATE_LIMITS={"login": "1/1"})
+    def test_spoofed_forwarded_for_does_not_escape_rate_limit(self) -> None:
+        """Test a client cannot get new login buckets by varying X-Forwarded-For"""
+        rate_limiter.local.clear()
+        payload = {"username": "test_user", "password": "wrong"}
+
+        first = self.client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR="1.1.1.1")
+        second = self.client.post(TOKEN_URL, payload, HTTP_X_FORWARDED_FOR="2.2.2.2")
+        rate_limiter.local.clear()
+
+        self.assertEqual(first.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(second.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+class TestAsyncLogin(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user = sample_user(password="testpass001")
+
+    def test_async_login_returns_tokens(self) -> None:
+        """Test the async endpoint returns a token pair for JSON and forms"""
+        code, data = post_async_login(
+            {"username": "test_user", "password": "testpass001"}
+        )
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertIn("refresh", data)
+        self.assertIn("access", data)
+
+        code, data = post_async_login(
+            "username=test_user&password=testpass001",
+            content_type=b"application/x-www-form-urlencoded",
+        )
+        self.assertEqual(code, status.HTTP_200_OK)
+
+    def test_async_login_rejects_wrong_password(self) -> None:
+        """Test the async endpoint answers like the sync one on bad credentials"""
+        code, data = post_async_login({"username": "test_user", "password": "wrong"})
+
+        self.assertEqual(code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(data, {"detail": "Account not found"})
+
+    @override_settings(LOGIN_HASH_QUEUE_SIZE=0)
+    def test_async_login_sheds_load_when_queue_is_full(self) -> None:
+        """Test logins are refused instead of queued past the limit"""
+        with patch("users.consumers.check_login_password") as check:
+            code, _ = post_async_login(
+                {"username": "test_user", "password": "testpass001"}
+            )
+
+        self.assertEqual(code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        check.assert_not_called()
+
+    @override_settings(RATE_LIMITS={"login": "1/1"})
+    def test_async_login_shares_the_rate_limit(self) -> None:
+        """Test the async endpoint throttles like the sync one"""
+        rate_limiter.local.clear()
+        payload = {"username": "test_user", "password": "wrong"}
+
+        first, _ = post_async_login(payload)
+        second, data = post_async_login(payload)
+        rate_limiter.local.clear()
+
+        self.assertEqual(first, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(second, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(data["code"], "throttled")
+        self.assertEqual(data["retry_after"], 1)
+
+    @override_settings(
+        RATE_LIMITS={"login": "1/1"},
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1},
+    )
+    def test_async_login_keys_on_address_seen_by_the_proxy(self) -> None:
+        """Test clients behind a proxy get their own bucket, spoofed or not"""
+        rate_limiter.local.clear()
+        payload = {"username": "test_user", "password": "wrong"}
+
+        def login(forwarded_for):
+            code, _ = post_async_login(
+                payload,
+                headers=[(b"x-forwarded-for", forwarded_for)],
+                client="10.0.0.1",
+            )
+            return code
+
+        first = login(b"1.1.1.1")
+        other_client = login(b"3.3.3.3")
+        spoofed = login(b"2.2.2.2, 1.1.1.1")
+        rate_limiter.local.clear()
+
+        self.assertEqual(first, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(other_client, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(spoofed, status.HTTP_429_TOO_MANY_REQUESTS)
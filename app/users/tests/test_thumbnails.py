@@ -0,0 +1,71 @@
+import io
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from chats.tests.test_consumers import IN_MEMORY_CHANNEL_LAYERS
+from core.helpers import sample_user
+from users.serializers import AllUserSerializer
+from users.thumbnails import (THUMBNAIL_CHANNEL, THUMBNAIL_SIZES,
+                              enqueue_thumbnails, generate_thumbnails,
+                              thumbnail_format)
+
+
+def sample_image(size=(800, 600)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, "JPEG")
+    return SimpleUploadedFile("avatar.jpg", buffer.getvalue(), "image/jpeg")
+
+
+class TestThumbnails(TestCase):
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = sample_user()
+        self.user.profile_picture = sample_image()
+        self.user.save()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_generate_thumbnails_renders_fixed_sizes(self) -> None:
+        """Test square thumbnails of every size are stored on the user"""
+        generate_thumbnails(self.user.id, self.user.profile_picture.name)
+
+        self.user.refresh_from_db()
+        image_format, extension = thumbnail_format()
+        for field_name, size in THUMBNAIL_SIZES.items():
+            thumbnail = getattr(self.user, field_name)
+            self.assertTrue(thumbnail.name.endswith(f".{extension}"))
+            with thumbnail.open("rb"), Image.open(thumbnail) as image:
+                self.assertEqual(image.size, (size, size))
+                self.assertEqual(image.format, image_format)
+
+        data = AllUserSerializer(self.user).data
+        self.assertEqual(
+            data["profile_thumbnail_small"], self.user.profile_thumbnail_small.url
+        )
+
+    def test_outdated_job_is_skipped(self) -> None:
+        """Test a job queued for a replaced picture renders nothing"""
+        generate_thumbnails(self.user.id, "uploads/images/replaced.jpg")
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.profile_thumbnail_small)
+        self.assertFalse(self.user.profile_thumbnail_medium)
+
+    @override_settings(THUMBNAIL_WORKER=True, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+    def test_jobs_go_to_the_worker_channel(self) -> None:
+        """Test jobs are sent to the thumbnail channel when workers are used"""
+        enqueue_thumbnails(self.user.id, self.user.profile_picture.name)
+
+        message = async_to_sync(get_channel_layer().receive)(THUMBNAIL_CHANNEL)
+        self.assertEqual(message["type"], "thumbnails.generate")
+        self.assertEqual(message["user_id"], self.user.id)
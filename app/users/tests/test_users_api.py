@@ -203,13 +203,54 @@ class TestAllUserViewset(TestCase):
         self.client.force_authenticate(user=self.user_1)
 
         response = self.client.get(GET_ALL_USERS_URL)
-        all_users = models.User.objects.all().exclude(id=self.user_1.id)
+        all_users = (
+            models.User.objects.all().exclude(id=self.user_1.id).order_by("username")
+        )
         serializer = AllUserSerializer(all_users, many=True)
 
         self.assertEquals(response.status_code, status.HTTP_200_OK)
-        self.assertEquals(response.data, serializer.data)
+        self.assertEquals(response.data["results"], serializer.data)
         self.assertEquals(all_users.count(), 2)
 
+    def test_get_all_users_is_cursor_paginated(
+        self,
+    ) -> None:
+        """Test GET all users pages through users by cursor"""
+
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(GET_ALL_USERS_URL, {"limit": 1})
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [user["username"] for user in response.data["results"]],
+            [self.user_2.username],
+        )
+
+        response = self.client.get(response.data["next"])
+
+        self.assertEquals(
+            [user["username"] for user in response.data["results"]],
+            [self.normal_user.username],
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_search_users_by_prefix(
+        self,
+    ) -> None:
+        """Test GET all users with q filters by name prefix"""
+
+        sample_user(username="zed", first_name="Normand", last_name="Smith")
+        self.client.force_authenticate(user=self.user_1)
+
+        response = self.client.get(GET_ALL_USERS_URL, {"q": "NORM"})
+
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [user["username"] for user in response.data["results"]],
+            ["normal_user", "zed"],
+        )
+
     def test_retrieve(
         self,
     ) -> None:
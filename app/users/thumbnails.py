@@ -0,0 +1,121 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+
+from core.models import User
+
+logger = logging.getLogger(__name__)
+
+# Channel consumed by `manage.py runworker thumbnails`
+THUMBNAIL_CHANNEL = "thumbnails"
+
+# Square size in pixels of each thumbnail field
+THUMBNAIL_SIZES = {
+    "profile_thumbnail_small": 64,
+    "profile_thumbnail_medium": 256,
+}
+
+_executor = None
+
+
+def thumbnail_format():
+    """Pillow format and extension of thumbnails, WebP when available"""
+    if features.check("webp"):
+        return "WEBP", "webp"
+    return "JPEG", "jpg"
+
+
+def render_thumbnail(image, size, image_format):
+    """Encode a center cropped square thumbnail of an image"""
+    thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    if thumbnail.mode != "RGB" and not (
+        image_format == "WEBP" and thumbnail.mode == "RGBA"
+    ):
+        thumbnail = thumbnail.convert("RGB")
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, image_format, quality=settings.THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(user_id, picture_name):
+    """Render and store the thumbnails of a user's profile picture
+
+    Does nothing when the picture was replaced since the job was queued,
+    the job of the newer upload renders it. Thumbnails of a removed picture
+    are cleared.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None or (user.profile_picture.name or "") != picture_name:
+        return
+
+    thumbnails = dict.fromkeys(THUMBNAIL_SIZES)
+    if picture_name:
+        image_format, extension = thumbnail_format()
+        with user.profile_picture.open("rb") as picture:
+            image = Image.open(picture)
+            # Let JPEG decode at a reduced scale close to the largest size
+            largest = max(THUMBNAIL_SIZES.values())
+            image.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(image)
+        for field_name, size in THUMBNAIL_SIZES.items():
+            field = User._meta.get_field(field_name)
+            thumbnails[field_name] = field.storage.save(
+                field.generate_filename(user, f"thumbnail.{extension}"),
+                ContentFile(render_thumbnail(image, size, image_format)),
+            )
+
+    users = User.objects.filter(id=user_id)
+    if picture_name:
+        users = users.filter(profile_picture=picture_name)
+    else:
+        users = users.filter(Q(profile_picture="") | Q(profile_picture__isnull=True))
+    if users.update(**thumbnails):
+        stale = [getattr(user, field_name).name for field_name in THUMBNAIL_SIZES]
+    else:
+        # The picture changed while rendering, drop our thumbnails
+        stale = list(thumbnails.values())
+    for name in filter(None, stale):
+        user.profile_picture.storage.delete(name)
+
+
+def run_locally(user_id, picture_name):
+    try:
+        generate_thumbnails(user_id, picture_name)
+    except Exception:
+        logger.exception(f"Rendering the thumbnails of user {user_id} failed")
+    finally:
+        close_old_connections()
+
+
+def enqueue_thumbnails(user_id, picture_name):
+    """Queue a thumbnail job on the worker channel or the local executor"""
+    global _executor
+    if settings.THUMBNAIL_WORKER:
+        async_to_sync(get_channel_layer().send)(
+            THUMBNAIL_CHANNEL,
+            {
+                "type": "thumbnails.generate",
+                "user_id": user_id,
+                "picture_name": picture_name,
+            },
+        )
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_THREADS, thread_name_prefix="thumbnails"
+        )
+    _executor.submit(run_locally, user_id, picture_name)
+
+
+def schedule_thumbnails(user):
+    """Render the thumbnails of a user off the request once it commits"""
+    picture_name = user.profile_picture.name or ""
+    transaction.on_commit(lambda: enqueue_thumbnails(user.id, picture_name))
@@ -1,9 +1,13 @@
 from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import generics, mixins, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from core.mixins import ReplicaReadMixin
 from core.models import User
+from core.throttling import LoginRateThrottle
+from users.pagination import UserCursorPagination
 from users.serializers import (AllUserSerializer, LoginSerializer,
                                UserSerializer, UserUpdateSerializer)
 
@@ -16,9 +20,10 @@ class CreateUserView(generics.CreateAPIView):
 
 class LoginView(TokenObtainPairView):
     serializer_class = LoginSerializer
+    throttle_classes = (LoginRateThrottle,)
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
 
     serializer_class = UserUpdateSerializer
@@ -47,16 +52,31 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
 
 
 class AllUserViewset(
+    ReplicaReadMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
 ):
-    """Get All Users endpoint"""
+    """Get All Users endpoint
+
+    Paginated by username cursor. The ``q`` query param filters users whose
+    username, first name or last name starts with it, case-insensitively.
+    """
 
     serializer_class = AllUserSerializer
     queryset = User.objects.all()
+    pagination_class = UserCursorPagination
 
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        return User.objects.all().exclude(id=self.request.user.id)
+        queryset = User.objects.all().exclude(id=self.request.user.id)
+
+        q = self.request.query_params.get("q", None)
+        if q:
+            queryset = queryset.filter(
+                Q(username__istartswith=q)
+                | Q(first_name__istartswith=q)
+                | Q(last_name__istartswith=q)
+            )
+        return queryset